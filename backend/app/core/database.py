@@ -1,3 +1,4 @@
+from sqlalchemy import Engine, inspect, text
 from sqlmodel import Session, SQLModel, create_engine
 
 from .config import Settings
@@ -6,9 +7,44 @@ from .config import Settings
 settings = Settings()  # pyright: ignore[reportCallIssue]
 engine = create_engine(settings.get_connection_string(), echo=True)
 
+# Columns added to tables of existing databases, create_all never alters a table.
+# Every column is added with its definition unless the table already has it.
+ADDED_COLUMNS: dict[str, dict[str, str]] = {
+    "szkola": {
+        "wersja": "INTEGER NOT NULL DEFAULT 0",
+        "wersja_utworzenia": "INTEGER NOT NULL DEFAULT 0",
+        "zaktualizowano": "TIMESTAMP WITHOUT TIME ZONE",
+        "hash_danych": "VARCHAR",
+    },
+}
+ADDED_INDEXES: dict[str, str] = {
+    "ix_szkola_wersja": "szkola (wersja)",
+    "ix_szkola_wersja_utworzenia": "szkola (wersja_utworzenia)",
+}
+
+
+def add_missing_columns(db_engine: Engine = engine) -> None:
+    """ALTER TABLE ... ADD COLUMN for columns which the tables of an older database lack"""
+    with db_engine.begin() as connection:
+        inspector = inspect(connection)
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue  # created by create_all with all its columns
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, definition in columns.items():
+                if name not in existing:
+                    _ = connection.execute(
+                        text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                    )
+        for index, target in ADDED_INDEXES.items():
+            _ = connection.execute(
+                text(f"CREATE INDEX IF NOT EXISTS {index} ON {target}")
+            )
+
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
 
 
 def get_session():
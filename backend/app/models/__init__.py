@@ -1,3 +1,3 @@
-from . import exam_results, locations, schools
+from . import exam_results, locations, schools, sync
 
-__all__ = ["exam_results", "locations", "schools"]
+__all__ = ["exam_results", "locations", "schools", "sync"]
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import TYPE_CHECKING, Optional  # pyright: ignore[reportDeprecated]
 
 from sqlmodel import Field, Relationship, SQLModel
@@ -141,6 +142,13 @@ class SzkolaAllData(SzkolaExtendedData):
 class Szkola(SzkolaAllData, table=True):
     id: int | None = Field(default=None, primary_key=True)
 
+    # Dataset versions (see WersjaDanych) used by the delta-sync endpoint
+    wersja: int = Field(default=0, index=True)  # last version that changed the row
+    wersja_utworzenia: int = Field(default=0, index=True)
+    zaktualizowano: datetime | None = Field(default=None)
+    # sha256 of the validated API payload, an upsert skips schools with an unchanged hash
+    hash_danych: str | None = Field(default=None)
+
     # Relationships - many-to-one
     typ: TypSzkoly = Relationship(back_populates="szkoly")  # pyright: ignore [reportAny]
     status_publicznoprawny: StatusPublicznoprawny = Relationship(  # pyright: ignore [reportAny]
@@ -172,3 +180,12 @@ class SzkolaPublicShort(SzkolaBase):
     score: float
     typ: TypSzkolyPublic
     status_publicznoprawny: StatusPublicznoprawnyPublic
+
+
+class SzkolaZmiany(SQLModel):
+    """Changes of schools since a given dataset version"""
+
+    wersja: int
+    dodane: list[SzkolaPublicShort]
+    zmienione: list[SzkolaPublicShort]
+    usuniete: list[int]
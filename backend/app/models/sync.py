@@ -0,0 +1,51 @@
+from datetime import UTC, datetime
+
+from sqlmodel import Field, SQLModel, UniqueConstraint
+
+
+def utc_now() -> datetime:
+    return datetime.now(UTC)
+
+
+class WersjaDanych(SQLModel, table=True):
+    """
+    Monotonically increasing dataset version.
+    Every import/scoring run opens a new version and closes it when finished,
+    rows written during the run are stamped with its id.
+    """
+
+    __tablename__: str = "wersja_danych"  # pyright: ignore[reportIncompatibleVariableOverride]
+
+    id: int | None = Field(default=None, primary_key=True)
+    zrodlo: str  # which process opened the version, e.g. "decomposer" or "scorer"
+    utworzono: datetime = Field(default_factory=utc_now)
+    zakonczono: datetime | None = Field(default=None, index=True)
+
+
+class UsunietaSzkola(SQLModel, table=True):
+    """Tombstone of a removed school, so that clients can drop it from their cache"""
+
+    __tablename__: str = "usunieta_szkola"  # pyright: ignore[reportIncompatibleVariableOverride]
+
+    szkola_id: int = Field(primary_key=True)
+    numer_rspo: int = Field(index=True)
+    wersja: int = Field(index=True)
+
+
+class ZaimportowanyPlik(SQLModel, table=True):
+    """Manifest of an imported exam results file, unchanged files are skipped by later imports"""
+
+    __tablename__: str = "zaimportowany_plik"  # pyright: ignore[reportIncompatibleVariableOverride]
+    __table_args__: tuple[UniqueConstraint] = (
+        UniqueConstraint("typ_egzaminu", "rok", name="uq_zaimportowany_plik_typ_rok"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    typ_egzaminu: str  # ExamType name, E8 or EM
+    rok: int
+    hash_pliku: str  # sha256 of the file content
+    liczba_wierszy: int  # rows of the SAS sheet
+    liczba_wynikow: int  # results written or already up to date
+    liczba_nieznanych_szkol: int = 0  # RSPO numbers without a school in the database
+    wersja_szkol: int = 0  # dataset version which added the newest school at that time
+    zaimportowano: datetime = Field(default_factory=utc_now)
@@ -1,11 +1,12 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from sqlmodel import Session, col, func, select
 
 from app.core.database import get_session
 from app.models.locations import Gmina, Miejscowosc, Powiat
-from app.models.schools import Szkola, SzkolaPublic, SzkolaPublicShort
+from app.models.schools import Szkola, SzkolaPublic, SzkolaPublicShort, SzkolaZmiany
+from app.models.sync import UsunietaSzkola, WersjaDanych
 
 SessionDep = Annotated[Session, Depends(get_session)]
 
@@ -15,6 +16,42 @@ router = APIRouter(
 )
 
 
+def get_dataset_version(session: Session) -> int:
+    """
+    Latest dataset version whose changes are completely visible.
+    Versions still being written (import in progress) are not reported yet,
+    so clients will ask for them again on the next sync.
+    Versions of killed runs are closed by the importer on its next start.
+    """
+    oldest_open = session.exec(
+        select(func.min(col(WersjaDanych.id))).where(
+            col(WersjaDanych.zakonczono).is_(None)
+        )
+    ).one()
+    if oldest_open is not None:
+        return oldest_open - 1
+    return session.exec(select(func.max(col(WersjaDanych.id)))).one() or 0
+
+
+@router.get("/changes", response_model=SzkolaZmiany)
+async def read_school_changes(
+    session: SessionDep,
+    since: Annotated[int, Query(ge=0)] = 0,
+):
+    # read the version first - rows written meanwhile will be sent again next time
+    version = get_dataset_version(session)
+    changed = session.exec(select(Szkola).where(Szkola.wersja > since)).all()
+    deleted = session.exec(
+        select(UsunietaSzkola.szkola_id).where(UsunietaSzkola.wersja > since)
+    ).all()
+    return SzkolaZmiany(
+        wersja=version,
+        dodane=[s for s in changed if s.wersja_utworzenia > since],  # pyright: ignore[reportArgumentType]
+        zmienione=[s for s in changed if s.wersja_utworzenia <= since],  # pyright: ignore[reportArgumentType]
+        usuniete=list(deleted),
+    )
+
+
 @router.get("/{school_id}", response_model=SzkolaPublic)
 async def read_school(school_id: int, session: SessionDep) -> Szkola:
     school = session.get(Szkola, school_id)
@@ -0,0 +1,88 @@
+# pyright: reportUnknownParameterType = false
+# pyright: reportUnknownMemberType = false
+# pyright: reportUnknownVariableType = false
+# pyright: reportMissingTypeArgument = false
+# pyright: reportUnknownArgumentType = false
+"""
+Throughput of turning a parsed results sheet into result rows, in results per second.
+
+Compares the former per-row path of TableSplitter (iterrows, to_dict,
+clean_column_name per key and a Pydantic validation per subject) with
+TableSplitter.result_frame, which reshapes the whole sheet at once.
+Only the transformation is measured, no database is used.
+
+    python -m benchmarks.exam_results
+    python -m benchmarks.exam_results --exam EM --year 2023
+"""
+
+import argparse
+import time
+
+import pandas as pd
+from pydantic import ValidationError
+
+from app.models.exam_results import WynikE8Extra, WynikEMExtra
+from data_import.core.config import ExamType
+from data_import.excel.db.table_splitter import TableSplitter
+from data_import.excel.reader import ExcelReader
+from data_import.utils.clean_column_names import clean_column_name
+
+
+def enough_data(result: WynikE8Extra | WynikEMExtra) -> bool:
+    """Students and a score, as checked by the masks of result_frame"""
+    average_score = (
+        result.sredni_wynik if isinstance(result, WynikEMExtra) else result.wynik_sredni
+    )
+    if not result.liczba_zdajacych:
+        return False
+    return average_score is not None or result.mediana is not None
+
+
+def per_row(splitter: TableSplitter) -> int:
+    base, _ = splitter._result_models()  # pyright: ignore[reportPrivateUsage]
+    results = 0
+    for _, school_exam_data in splitter.exam_data.iterrows():
+        if pd.isna(school_exam_data.at[splitter.rspo_col_name]):
+            continue
+        for subject_name in splitter.unique_subjects:
+            _ = clean_column_name(subject_name)
+            subject_exam_result = {
+                clean_column_name(k): (v if pd.notna(v) else None)
+                for k, v in school_exam_data.loc[subject_name].to_dict().items()
+            }
+            try:
+                result = base.model_validate(subject_exam_result)
+            except ValidationError:
+                continue
+            if enough_data(result):
+                results += 1
+    return results
+
+
+def vectorized(splitter: TableSplitter) -> int:
+    return len(splitter.result_frame(splitter.rspo_numbers()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--exam", choices=[e.name for e in ExamType], default="E8")
+    _ = parser.add_argument("--year", type=int, default=2024)
+    args = parser.parse_args()
+
+    exam_type = ExamType[args.exam]  # pyright: ignore[reportAny]
+    exam_data = dict(ExcelReader().load_files(exam_type))[args.year]  # pyright: ignore[reportAny]
+    print(f"{exam_type.name} {args.year}: {len(exam_data)} schools")  # pyright: ignore[reportAny]
+
+    for name, build in (("per row", per_row), ("vectorized", vectorized)):
+        splitter = TableSplitter(exam_data, exam_type, args.year)  # pyright: ignore[reportAny]
+        assert splitter.initialize()
+        start = time.perf_counter()
+        results = build(splitter)
+        seconds = time.perf_counter() - start
+        print(
+            f"{name:<12} {results:>7} results {seconds:>7.2f}s {results / seconds:>10,.0f} results/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Wall time of parsing exam result files sequentially and in worker processes.
+
+Builds a directory with ten years of E8 and EM files (copies of the files in
+data_import/excel) and parses it with ExcelReader.load_files_parallel
+for every worker count. The parse cache is disabled, so every file is parsed.
+
+    python -m benchmarks.excel_loading
+    python -m benchmarks.excel_loading --years 10 --workers 1 2 4 8
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from data_import.core.config import ExamType, ExcelFile
+from data_import.excel.reader import ExcelReader
+
+DATA_DIR = Path(__file__).parents[1] / "data_import" / "excel"
+
+
+def build_data_dir(target: Path, years: int) -> int:
+    """Copy the available files of every exam type to years consecutive years"""
+    files = 0
+    for exam_type in ExamType:
+        sources = sorted((DATA_DIR / exam_type.directory_name).glob("*.xlsx"))
+        directory = target / exam_type.directory_name
+        directory.mkdir(parents=True)
+        for index in range(years):
+            source = sources[index % len(sources)]
+            _ = shutil.copy(source, directory / f"{2015 + index}.xlsx")
+            files += 1
+    return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--years", type=int, default=10)
+    _ = parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, ExcelFile.WORKERS]
+    )
+    args = parser.parse_args()
+
+    ExcelFile.CACHE_PARSED = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = build_data_dir(Path(tmp_dir), args.years)  # pyright: ignore[reportAny]
+        print(f"{files} files, engine {ExcelFile.ENGINE}")
+        for workers in args.workers:  # pyright: ignore[reportAny]
+            reader = ExcelReader(Path(tmp_dir))
+            start = time.perf_counter()
+            rows = sum(
+                len(df)
+                for _, _, df in reader.load_files_parallel(workers=workers)  # pyright: ignore[reportAny]
+            )
+            seconds = time.perf_counter() - start
+            print(
+                f"{workers:>2} workers {seconds:>8.1f}s {files / seconds:>6.2f} files/s ({rows} rows)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Peak memory of reading an exam results file whole and in chunks.
+
+Every mode runs in its own process and reports how much the process' peak RSS grew,
+so memory held by openpyxl and pandas is counted, not only Python objects.
+The parse cache is not used.
+
+    python -m benchmarks.excel_memory
+    python -m benchmarks.excel_memory --exam EM --year 2023
+"""
+
+import argparse
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from data_import.core.config import ExamType, ExcelFile
+from data_import.excel.db.table_splitter import TableSplitter
+from data_import.excel.reader import ExcelReader
+
+
+def peak_rss(
+    mode: str, file_path: Path, exam_type: ExamType
+) -> tuple[float, float, int]:
+    """Seconds, growth of the peak RSS in MiB and rows read by the mode"""
+    ExcelFile.CACHE_PARSED = False
+    reader = ExcelReader()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "whole":
+        rows = len(reader.read_file(file_path, exam_type))
+    else:
+        rows = sum(
+            len(chunk)
+            for chunk in reader.read_file_chunks(
+                file_path, exam_type, column_filter=TableSplitter.is_needed_column
+            )
+        )
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return seconds, peak / 1024, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--exam", choices=[e.name for e in ExamType], default="EM")
+    _ = parser.add_argument("--year", type=int, default=2023)
+    args = parser.parse_args()
+
+    exam_type = ExamType[args.exam]  # pyright: ignore[reportAny]
+    year: int = args.year  # pyright: ignore[reportAny]
+    file_path = ExcelReader.base_data_path / exam_type.directory_name / f"{year}.xlsx"
+    for mode in ("whole", "chunks"):
+        # a fresh process per mode, so the peaks don't overlap
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            seconds, peak, rows = executor.submit(
+                peak_rss, mode, file_path, exam_type
+            ).result()
+        print(f"{mode:<8} {rows:>7} rows {seconds:>6.1f}s  peak RSS +{peak:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
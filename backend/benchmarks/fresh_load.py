@@ -0,0 +1,61 @@
+"""
+Benchmark of a full import into an empty database: regular INSERTs vs the COPY fresh load.
+
+Both runs replay the same cached pages (see --replay of the importer), so nothing
+is downloaded. The configured database is wiped before every run.
+
+    python -m benchmarks.fresh_load --replay 2025-04-01 --drop-tables
+"""
+
+import argparse
+import logging
+import time
+
+from sqlmodel import SQLModel
+
+from app.core.database import engine
+from data_import.api.fetcher import ReplayFetcher
+from data_import.api.page_cache import PageCache
+from data_import.api.pipeline import ImportPipeline
+
+
+def run_import(replay: str, fresh_load: bool) -> tuple[int, float]:
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    pipeline = ImportPipeline(
+        ReplayFetcher(PageCache(), fetch_date=replay), fresh_load=fresh_load
+    )
+    start = time.perf_counter()
+    if not pipeline.run():
+        raise RuntimeError(f"Import failed at page {pipeline.failed_page}")
+    return pipeline.total_processed, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument(
+        "--replay",
+        default=PageCache.LATEST,
+        metavar="DATE",
+        help="date of cached pages",
+    )
+    _ = parser.add_argument(
+        "--drop-tables",
+        action="store_true",
+        help="confirm that all tables of the configured database may be dropped",
+    )
+    args = parser.parse_args()
+    if not args.drop_tables:  # pyright: ignore[reportAny]
+        parser.error("the benchmark drops all tables, confirm it with --drop-tables")
+
+    logging.basicConfig(level=logging.WARNING)
+    engine.echo = False
+    for name, fresh_load in (("inserts", False), ("fresh load", True)):
+        schools, seconds = run_import(args.replay, fresh_load)  # pyright: ignore[reportAny]
+        print(
+            f"{name:<12} {schools} schools in {seconds:.1f}s ({schools / seconds:,.0f} schools/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Peak memory of decoding Hydra pages, measured with tracemalloc.
+
+Compares response.json()-style decoding of the whole page with HydraStream,
+for pages of a growing number of schools (copies of the recorded test page).
+Every school is validated and dropped, as the import pipeline does.
+
+    python -m benchmarks.streaming_memory
+"""
+
+import argparse
+import io
+import json
+import tracemalloc
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import cast
+
+from data_import.api.models import SzkolaAPIResponse
+from data_import.api.streaming import HydraStream
+from data_import.api.types import APIResponse, SchoolDict
+from data_import.core.config import APISettings
+
+RECORDED_PAGE = Path(__file__).parents[1] / "tests" / "fixtures" / "hydra_page.json"
+
+
+def make_page(schools: int) -> bytes:
+    page = cast(APIResponse, json.loads(RECORDED_PAGE.read_text(encoding="utf-8")))
+    members = cast(list[SchoolDict], page["hydra:member"])
+    page["hydra:member"] = [
+        {**members[index % len(members)], "numerRspo": index}
+        for index in range(schools)
+    ]
+    return json.dumps(page, ensure_ascii=False).encode()
+
+
+def chunks(raw: bytes) -> Iterator[bytes]:
+    body = io.BytesIO(raw)
+    while chunk := body.read(APISettings.STREAM_CHUNK_SIZE):
+        yield chunk
+
+
+def decode_whole(raw: bytes) -> None:
+    # like response.json(), the body is joined from chunks and decoded at once
+    page = cast(APIResponse, json.loads(b"".join(chunks(raw))))
+    for school in cast(list[SchoolDict], page["hydra:member"]):
+        _ = SzkolaAPIResponse.model_validate(school)
+
+
+def decode_stream(raw: bytes) -> None:
+    for school in HydraStream(chunks(raw)):
+        _ = SzkolaAPIResponse.model_validate(school)
+
+
+def peak_memory(decode: Callable[[bytes], None], raw: bytes) -> float:
+    """Peak of memory allocated while decoding, in MiB (the raw page is not counted)"""
+    tracemalloc.start()
+    decode(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument(
+        "--schools",
+        type=int,
+        nargs="+",
+        default=[1_000, 5_000, 20_000],
+        help="numbers of schools on the decoded page",
+    )
+    args = parser.parse_args()
+
+    print(f"{'schools':>8} {'whole page':>12} {'stream':>10}")
+    for schools in args.schools:  # pyright: ignore[reportAny]
+        raw = make_page(schools)  # pyright: ignore[reportAny]
+        whole = peak_memory(decode_whole, raw)
+        stream = peak_memory(decode_stream, raw)
+        print(f"{schools:>8} {whole:>9.1f} MiB {stream:>6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Microbenchmark of validating API school payloads, in schools per second.
+
+Compares the per-school path (model_validate, model_dump, Szkola constructor)
+with the page-level TypeAdapter building plain insert rows.
+
+    python -m benchmarks.validation                    # recorded test page
+    python -m benchmarks.validation --replay 2025-04-01  # pages cached by the importer
+"""
+
+import argparse
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import cast
+
+from app.models.schools import Szkola
+from data_import.api.models import SCHOOL_ROW_FIELDS, SCHOOLS_ADAPTER, SzkolaAPIResponse
+from data_import.api.page_cache import PageCache
+from data_import.api.types import APIResponse, SchoolDict
+
+RECORDED_PAGE = Path(__file__).parents[1] / "tests" / "fixtures" / "hydra_page.json"
+# fields which used to be removed before passing a dump to the Szkola constructor
+EXCLUDED_FIELDS = (
+    "typ",
+    "etapy_edukacji",
+    "miejscowosc",
+    "ulica",
+    "ksztalcenie_zawodowe",
+    "kategoria_uczniow",
+)
+
+
+def load_pages(replay: str | None) -> list[list[SchoolDict]]:
+    if replay is None:
+        page = cast(APIResponse, json.loads(RECORDED_PAGE.read_text(encoding="utf-8")))
+        return [cast(list[SchoolDict], page["hydra:member"])]
+
+    cache = PageCache()
+    fetch_date = cache.resolve_date(replay)
+    pages: list[list[SchoolDict]] = []
+    page_number = 1
+    while (page := cache.load(page_number, fetch_date)) is not None:
+        pages.append(cast(list[SchoolDict], page["hydra:member"]))
+        page_number += 1
+    return pages
+
+
+def per_school(pages: list[list[SchoolDict]]) -> None:
+    for page in pages:
+        for school_data in page:
+            school = SzkolaAPIResponse.model_validate(school_data)
+            school_dict = school.model_dump()
+            for field in EXCLUDED_FIELDS:
+                school_dict.pop(field)
+            _ = Szkola(
+                **school_dict,  # pyright: ignore[reportAny]
+                geolokalizacja_latitude=school.geolokalizacja.latitude,
+                geolokalizacja_longitude=school.geolokalizacja.longitude,
+            )
+
+
+def per_page(pages: list[list[SchoolDict]]) -> None:
+    for page in pages:
+        for school in SCHOOLS_ADAPTER.validate_python(page):
+            _ = {
+                **school.model_dump(include=SCHOOL_ROW_FIELDS),
+                "geolokalizacja_latitude": school.geolokalizacja.latitude,
+                "geolokalizacja_longitude": school.geolokalizacja.longitude,
+            }
+
+
+def measure(
+    name: str,
+    validate: Callable[[list[list[SchoolDict]]], None],
+    pages: list[list[SchoolDict]],
+    rounds: int,
+) -> None:
+    schools = sum(len(page) for page in pages)
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        validate(pages)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<12} {schools / best:>12,.0f} schools/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--replay", metavar="DATE", help="date of cached pages")
+    _ = parser.add_argument(
+        "--schools", type=int, default=20_000, help="schools validated per round"
+    )
+    _ = parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.replay)  # pyright: ignore[reportAny]
+    page_schools = sum(len(page) for page in pages)
+    pages *= max(1, args.schools // page_schools)  # pyright: ignore[reportAny]
+
+    measure("per school", per_school, pages, args.rounds)  # pyright: ignore[reportAny]
+    measure("per page", per_page, pages, args.rounds)  # pyright: ignore[reportAny]
+
+
+if __name__ == "__main__":
+    main()
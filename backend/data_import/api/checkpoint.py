@@ -0,0 +1,53 @@
+import json
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+from app.models.sync import utc_now
+from data_import.core.config import APISettings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ImportCheckpoint:
+    """Progress of the API import after the last persisted segment"""
+
+    next_page: int  # first page of the next segment
+    segment: int  # number of the next segment
+    total_processed: int
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    saved_at: datetime | None = None
+
+
+class CheckpointFile:
+    """Checkpoint stored as JSON, replaced atomically so a crash never leaves it half-written"""
+
+    def __init__(self, path: Path = APISettings.CHECKPOINT_FILE):
+        self.path: Path = path
+
+    def save(self, checkpoint: ImportCheckpoint) -> None:
+        checkpoint.saved_at = utc_now()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        _ = tmp_path.write_text(
+            json.dumps(asdict(checkpoint), default=str), encoding="utf-8"
+        )
+        _ = tmp_path.replace(self.path)
+
+    def load(self) -> ImportCheckpoint | None:
+        if not self.path.exists():
+            return None
+        data = json.loads(self.path.read_text(encoding="utf-8"))  # pyright: ignore[reportAny]
+        saved_at = data.pop("saved_at", None)  # pyright: ignore[reportAny]
+        return ImportCheckpoint(
+            **data,  # pyright: ignore[reportAny]
+            saved_at=datetime.fromisoformat(saved_at) if saved_at else None,  # pyright: ignore[reportAny]
+        )
+
+    def clear(self) -> None:
+        """The import finished, there is nothing to resume"""
+        self.path.unlink(missing_ok=True)
@@ -1,7 +1,17 @@
+import hashlib
 import logging
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from itertools import batched
+from typing import cast, override
 
 from pydantic import ValidationError
+from sqlalchemy import Engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Mapped
+from sqlmodel import Session, col, delete, select
 
+from app.models.exam_results import WynikE8, WynikEM
 from app.models.locations import Gmina, Miejscowosc, Powiat, Ulica, Wojewodztwo
 from app.models.schools import (
     EtapEdukacji,
@@ -13,41 +23,143 @@ from app.models.schools import (
     StatusPublicznoprawny,
     StatusPublicznoprawnyBase,
     Szkola,
-    SzkolaEtapLink,  # noqa: F401
+    SzkolaEtapLink,
+    SzkolaKsztalcenieZawodoweLink,
     TypSzkoly,
     TypSzkolyBase,
 )
+from app.models.sync import UsunietaSzkola, ZaimportowanyPlik, utc_now
 from data_import.api.db.exceptions import DataValidationError, SchoolProcessingError
-from data_import.api.db.excluded_fields import SchoolFieldExclusions
-from data_import.api.models import SzkolaAPIResponse
+from data_import.api.db.lookup_cache import (
+    EducationalModel,
+    LocationModel,
+    LookupCache,
+    LookupModel,
+)
+from data_import.api.dead_letters import DeadLetterStore
+from data_import.api.models import (
+    SCHOOL_ROW_FIELDS,
+    SCHOOLS_ADAPTER,
+    SzkolaAPIResponse,
+)
 from data_import.api.types import SchoolDict
+from data_import.core.config import APISettings, ExamType
 from data_import.utils.db.session import DatabaseManagerBase
 
 logger = logging.getLogger(__name__)
 
+type SchoolRow = dict[str, object]  # values of the szkola table columns
+# new school with ids of its education stages and vocational trainings (link tables)
+type NewSchool = tuple[SchoolRow, list[int], list[int]]
+
+# columns kept when an existing school is updated by an upsert
+UPSERT_KEPT_COLUMNS = {"id", "numer_rspo", "score", "wersja_utworzenia"}
+
+
+@dataclass(slots=True)
+class WriteCounts:
+    """Numbers of schools inserted, updated and left unchanged"""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    def add(self, other: "WriteCounts") -> None:
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged"
+
+
+def content_hash(school: SzkolaAPIResponse) -> str:
+    """Hash of the validated school payload, used to detect changed schools"""
+    return hashlib.sha256(school.model_dump_json().encode()).hexdigest()
+
 
 class Decomposer(DatabaseManagerBase):
-    def __init__(self):
-        super().__init__()
-        self.voivodeships_cache: dict[str, Wojewodztwo] = {}
-        self.counties_cache: dict[str, Powiat] = {}
-        self.boroughs_cache: dict[str, Gmina] = {}
-        self.localities_cache: dict[str, Miejscowosc] = {}
-        self.streets_cache: dict[str, Ulica] = {}
-        self.school_types_cache: dict[str, TypSzkoly] = {}
-        self.statuses_cache: dict[str, StatusPublicznoprawny] = {}
-        self.education_stages_cache: dict[str, EtapEdukacji] = {}
-        self.student_categories_cache: dict[str, KategoriaUczniow] = {}
-        self.vocational_trainings_cache: dict[str, KsztalcenieZawodowe] = {}
-
-    def _get_or_create_location[T: (Wojewodztwo, Powiat, Gmina, Miejscowosc, Ulica)](
+    def __init__(
+        self,
+        lookup_cache: LookupCache | None = None,
+        upsert: bool = False,
+        dead_letters: DeadLetterStore | None = None,
+        dataset_version: int | None = None,
+        engine: Engine | None = None,
+    ):
+        super().__init__(engine)
+        self.dead_letters: DeadLetterStore | None = dead_letters  # failed schools
+        # ids of lookup entities, pass the same cache to share it between segments
+        self.lookup_cache: LookupCache = lookup_cache or LookupCache()
+        # update changed existing schools instead of skipping all existing ones
+        self.upsert: bool = upsert
+        self.write_counts: WriteCounts = WriteCounts()
+        # a version given by the caller is shared by the whole import run and closed by it
+        self._dataset_version: int | None = dataset_version
+        self._owns_dataset_version: bool = dataset_version is None
+
+    @property
+    def dataset_version(self) -> int:
+        """Dataset version stamped on written schools, opened on first write"""
+        if self._dataset_version is None:
+            self._dataset_version = self._open_dataset_version("decomposer")
+        return self._dataset_version
+
+    @override
+    def close(self) -> None:
+        if self._dataset_version is not None and self._owns_dataset_version:
+            self._close_dataset_version(self._dataset_version)
+            self._dataset_version = None
+        super().close()
+
+    def warm_up_caches(self) -> None:
+        """
+        Load all lookup tables into the cache with one query per table,
+        so that looking up entities of every school is a dictionary hit
+        """
+        self.lookup_cache.warm_up(self._ensure_session())
+
+    def _create_lookup_entity(
         self,
-        model_class: type[T],
+        model_class: type[LookupModel],
+        key_column: Mapped[str],
+        key: str,
+        **values: str | int,
+    ) -> int:
+        """
+        Insert a lookup entity in its own short transaction, returns its id.
+        Concurrent imports (shards) may create the same entity at the same time,
+        so the insert does nothing on conflict and the existing id is selected instead.
+        Committing at once means no transaction holds locks of lookup rows
+        while waiting for another one, so concurrent imports can't deadlock.
+        """
+        with Session(self._engine) as session:
+            entity_id = (
+                session.connection()
+                .execute(
+                    pg_insert(model_class)
+                    .values(**values)
+                    .on_conflict_do_nothing(index_elements=[key_column])
+                    .returning(col(model_class.id))
+                )
+                .scalar_one_or_none()
+            )
+            if entity_id is None:  # created by another import in the meantime
+                entity_id = session.exec(
+                    select(col(model_class.id)).where(key_column == key)
+                ).one()
+            session.commit()
+        self.lookup_cache.put(model_class, key, cast(int, entity_id))
+        return cast(int, entity_id)
+
+    def _get_or_create_location(
+        self,
+        model_class: type[LocationModel],
         name: str,
         territorial_code: str,
-        cache_dict: dict[str, T],
-        **kwargs: Wojewodztwo | Powiat | Gmina,
-    ) -> T:
+        **kwargs: int,
+    ) -> int:
         """
         Get or create an entity record (voivodeship, county, borough, or locality)
 
@@ -55,269 +167,394 @@ class Decomposer(DatabaseManagerBase):
             model_class: The model class to use (Wojewodztwo, Powiat, etc.)
             name: Name of the entity
             territorial_code: TERYT code of the entity
-            cache_dict: Reference to the appropriate cache dictionary
-            **kwargs: Additional keyword arguments like parent entities (wojewodztwo, powiat, etc.)
+            **kwargs: Ids of parent entities (wojewodztwo_id, powiat_id, etc.)
 
         Returns:
-            The retrieved or created entity
+            Id of the retrieved or created entity
         """
-        if territorial_code in cache_dict:
-            return cache_dict[territorial_code]
-
-        location = self._select_where(
-            model_class, model_class.teryt == territorial_code
+        location_id = self.lookup_cache.get(model_class, territorial_code)
+        if location_id is not None:
+            return location_id
+
+        if not self.lookup_cache.is_complete(model_class):
+            session = self._ensure_session()
+            location_id = session.exec(
+                select(col(model_class.id)).where(
+                    col(model_class.teryt) == territorial_code
+                )
+            ).first()
+            if location_id is not None:
+                self.lookup_cache.put(model_class, territorial_code, location_id)
+                return location_id
+
+        return self._create_lookup_entity(
+            model_class,
+            col(model_class.teryt),
+            territorial_code,
+            nazwa=name,
+            teryt=territorial_code,
+            **kwargs,
         )
 
-        if not location:
-            location = model_class(nazwa=name, teryt=territorial_code, **kwargs)  # pyright: ignore[reportArgumentType]
-
-        cache_dict[territorial_code] = location
-        return location
-
-    def _get_or_create_educational_entity[
-        T: (
-            TypSzkoly,
-            StatusPublicznoprawny,
-            KategoriaUczniow,
-            KsztalcenieZawodowe,
-            EtapEdukacji,
-        )
-    ](
+    def _get_or_create_educational_entity(
         self,
-        model_class: type[T],
+        model_class: type[EducationalModel],
         entity_base: TypSzkolyBase
         | StatusPublicznoprawnyBase
         | KategoriaUczniowBase
         | KsztalcenieZawodoweBase
         | EtapEdukacjiBase,
-        cache_dict: dict[str, T],
-    ) -> T:
+    ) -> int:
         """
         Get or create an educational entity record (school type, legal status, student category, etc.)
 
         Args:
             model_class: The model class to use (TypSzkoly, StatusPublicznoprawny, etc.)
             entity_base: Base entity object containing data for initialization
-            cache_dict: Reference to the appropriate cache dictionary
 
         Returns:
-            The retrieved or created educational entity
+            Id of the retrieved or created educational entity
         """
         name = entity_base.nazwa
-        if name in cache_dict:
-            return cache_dict[name]
-
-        entity = self._select_where(model_class, model_class.nazwa == name)
-
-        if not entity:
-            entity = model_class.model_validate(entity_base)
-
-        cache_dict[name] = entity
-        return entity
+        entity_id = self.lookup_cache.get(model_class, name)
+        if entity_id is not None:
+            return entity_id
+
+        if not self.lookup_cache.is_complete(model_class):
+            session = self._ensure_session()
+            entity_id = session.exec(
+                select(col(model_class.id)).where(col(model_class.nazwa) == name)
+            ).first()
+            if entity_id is not None:
+                self.lookup_cache.put(model_class, name, entity_id)
+                return entity_id
+
+        return self._create_lookup_entity(
+            model_class, col(model_class.nazwa), name, nazwa=name
+        )
 
     def _process_location_data(
         self, school_data: SzkolaAPIResponse
-    ) -> tuple[Miejscowosc, Ulica | None]:
-        """Process location data from school_data and return locality and street objects"""
-        voivodeship = self._get_or_create_location(
+    ) -> tuple[int, int | None]:
+        """Process location data from school_data and return locality and street ids"""
+        voivodeship_id = self._get_or_create_location(
             model_class=Wojewodztwo,
             name=school_data.wojewodztwo,
             territorial_code=school_data.wojewodztwo_kod_TERYT,
-            cache_dict=self.voivodeships_cache,
         )
 
-        county = self._get_or_create_location(
+        county_id = self._get_or_create_location(
             model_class=Powiat,
             name=school_data.powiat,
             territorial_code=school_data.powiat_kod_TERYT,
-            cache_dict=self.counties_cache,
-            wojewodztwo=voivodeship,
+            wojewodztwo_id=voivodeship_id,
         )
 
-        borough = self._get_or_create_location(
+        borough_id = self._get_or_create_location(
             model_class=Gmina,
             name=school_data.gmina,
             territorial_code=school_data.gmina_kod_TERYT,
-            cache_dict=self.boroughs_cache,
-            powiat=county,
+            powiat_id=county_id,
         )
 
-        locality = self._get_or_create_location(
+        locality_id = self._get_or_create_location(
             model_class=Miejscowosc,
             name=school_data.miejscowosc,
             territorial_code=school_data.miejscowosc_kod_TERYT,
-            cache_dict=self.localities_cache,
-            gmina=borough,
+            gmina_id=borough_id,
         )
 
-        street = None
+        street_id = None
         if school_data.ulica and school_data.ulica_kod_TERYT:
-            street = self._get_or_create_location(
+            street_id = self._get_or_create_location(
                 model_class=Ulica,
                 name=school_data.ulica,
                 territorial_code=school_data.ulica_kod_TERYT,
-                cache_dict=self.streets_cache,
             )
 
-        return locality, street
+        return locality_id, street_id
 
     def _process_school_other_information(
         self, school_data: SzkolaAPIResponse
-    ) -> tuple[TypSzkoly, StatusPublicznoprawny, KategoriaUczniow]:
-        """Process school type, status and student category data"""
-        school_type = self._get_or_create_educational_entity(
+    ) -> tuple[int, int, int]:
+        """Process school type, status and student category data, returns their ids"""
+        school_type_id = self._get_or_create_educational_entity(
             model_class=TypSzkoly,
             entity_base=school_data.typ,
-            cache_dict=self.school_types_cache,
         )
-        status = self._get_or_create_educational_entity(
+        status_id = self._get_or_create_educational_entity(
             model_class=StatusPublicznoprawny,
             entity_base=school_data.status_publiczno_prawny,
-            cache_dict=self.statuses_cache,
         )
-        student_category = self._get_or_create_educational_entity(
+        student_category_id = self._get_or_create_educational_entity(
             model_class=KategoriaUczniow,
             entity_base=school_data.kategoria_uczniow,
-            cache_dict=self.student_categories_cache,
         )
-        return school_type, status, student_category
+        return school_type_id, status_id, student_category_id
 
     def _process_vocational_training_data(
         self, school_data: SzkolaAPIResponse
-    ) -> list[KsztalcenieZawodowe]:
-        """Process vocational training data"""
+    ) -> list[int]:
+        """Process vocational training data, returns distinct ids"""
         if not school_data.ksztalcenie_zawodowe:
             return []
 
-        vocational_trainings = [
+        vocational_training_ids = [
             self._get_or_create_educational_entity(
                 model_class=KsztalcenieZawodowe,
                 entity_base=KsztalcenieZawodoweBase(nazwa=value),
-                cache_dict=self.vocational_trainings_cache,
             )
             for value in school_data.ksztalcenie_zawodowe.values()
         ]
 
-        return vocational_trainings
+        # the same id twice would violate the primary key of the link table
+        return list(dict.fromkeys(vocational_training_ids))
 
-    def _process_education_stages(
-        self, school_data: SzkolaAPIResponse
-    ) -> list[EtapEdukacji]:
-        """Process education stages data"""
+    def _process_education_stages(self, school_data: SzkolaAPIResponse) -> list[int]:
+        """Process education stages data, returns distinct ids"""
         if not school_data.etapy_edukacji:
             return []
-        education_stages_list = [
+        education_stage_ids = [
             self._get_or_create_educational_entity(
                 model_class=EtapEdukacji,
                 entity_base=education_stage_data,
-                cache_dict=self.education_stages_cache,
             )
             for education_stage_data in school_data.etapy_edukacji
         ]
-        return education_stages_list
+        return list(dict.fromkeys(education_stage_ids))
 
-    def _validate_required_school_data(
-        self, school_data: SchoolDict
-    ) -> SzkolaAPIResponse:
+    @staticmethod
+    def validate_school_data(school_data: SchoolDict) -> SzkolaAPIResponse:
         """Validate that all required fields are present in the school data"""
-        school_model = SzkolaAPIResponse.model_validate(school_data)
-        return school_model
+        try:
+            return SzkolaAPIResponse.model_validate(school_data)
+        except ValidationError as e:
+            raise DataValidationError(school_data, e) from e
 
-    def _create_school_object(
+    @staticmethod
+    def validate_schools_data(
+        schools_data: list[SchoolDict],
+    ) -> tuple[list[SzkolaAPIResponse], list[DataValidationError]]:
+        """
+        Validate a whole page of schools in one pass.
+        Only when it fails, the invalid schools are validated one by one for their errors.
+        Returns valid schools and errors of the invalid ones.
+        """
+        try:
+            return SCHOOLS_ADAPTER.validate_python(schools_data), []
+        except ValidationError as e:
+            invalid_indexes = {cast(int, error["loc"][0]) for error in e.errors()}
+
+        errors: list[DataValidationError] = []
+        for index in sorted(invalid_indexes):
+            try:
+                _ = Decomposer.validate_school_data(schools_data[index])
+            except DataValidationError as error:
+                errors.append(error)
+        valid_data = [
+            school_data
+            for index, school_data in enumerate(schools_data)
+            if index not in invalid_indexes
+        ]
+        return SCHOOLS_ADAPTER.validate_python(valid_data), errors
+
+    def _create_school_row(
         self,
         school_data: SzkolaAPIResponse,
-        school_type: TypSzkoly,
-        status: StatusPublicznoprawny,
-        locality: Miejscowosc,
-        street: Ulica | None,
-        education_stages: list[EtapEdukacji],
-        vocational_trainings: list[KsztalcenieZawodowe],
-        student_category: KategoriaUczniow,
-    ) -> Szkola:
-        """Create a new school object from validated data"""
+        school_type_id: int,
+        status_id: int,
+        locality_id: int,
+        street_id: int | None,
+        student_category_id: int,
+    ) -> SchoolRow:
+        """Create a row of the szkola table from validated data, without validating it again"""
         geolocation = school_data.geolokalizacja
-
-        api_school_data_dict = school_data.model_dump()
-        # remove specific columns to prevent multiple values for the same field
-        for column in SchoolFieldExclusions.ALL:
-            api_school_data_dict.pop(column)
-
-        # all other fields from SzkolaAPIResponse that are not used in Szkola are removed by pydantic
-        new_school = Szkola(
-            **api_school_data_dict,  # pyright: ignore[reportAny]
-            geolokalizacja_latitude=geolocation.latitude,
-            geolokalizacja_longitude=geolocation.longitude,
-            typ=school_type,
-            status_publicznoprawny=status,  # we haven't removed status_publicznoprawny from SzkolaAPIResponse because from the API we actually have status_publiczno_prawny which is incorrect form
-            miejscowosc=locality,
-            ulica=street,
-            etapy_edukacji=education_stages,
-            ksztalcenie_zawodowe=vocational_trainings,
-            kategoria_uczniow=student_category,
-        )
-
-        return new_school
+        return {
+            **school_data.model_dump(include=SCHOOL_ROW_FIELDS),
+            "geolokalizacja_latitude": geolocation.latitude,
+            "geolokalizacja_longitude": geolocation.longitude,
+            "typ_id": school_type_id,
+            "status_publicznoprawny_id": status_id,
+            "miejscowosc_id": locality_id,
+            "ulica_id": street_id,
+            "kategoria_uczniow_id": student_category_id,
+            "wersja": self.dataset_version,
+            "wersja_utworzenia": self.dataset_version,
+            "zaktualizowano": utc_now(),
+            "hash_danych": content_hash(school_data),
+        }
 
     def prune_and_decompose_single_school_data(self, school_data: SchoolDict) -> None:
         """Process a single school's data and save to database"""
-        session = self._ensure_session()
-
         # First, validate the required fields. Let errors propagate upward.
-        try:
-            school = self._validate_required_school_data(school_data)
-        except ValidationError as e:
-            session.rollback()
-            raise DataValidationError(school_data, e) from e
+        school = self.validate_school_data(school_data)
+        self.decompose_school(school)
 
-        try:
-            # Check if school already exists
-            existing_school = self._select_where(
-                Szkola, Szkola.numer_rspo == school.numer_rspo
-            )
+    def _select_schools_to_save(
+        self, schools: list[SzkolaAPIResponse]
+    ) -> tuple[list[SzkolaAPIResponse], set[int]]:
+        """
+        Filter out schools which don't have to be written, with a single query for all of them.
+        Existing schools are skipped, in upsert mode only those with an unchanged content hash.
+        Returns schools to save and RSPO numbers of those which already exist.
+        A school given more than once (e.g. on overlapping pages) is saved once,
+        from its last copy, the other copies are counted as unchanged.
+        """
+        session = self._ensure_session()
+        schools_by_rspo = {school.numer_rspo: school for school in schools}
+        self.write_counts.unchanged += len(schools) - len(schools_by_rspo)
+        rspo_numbers = list(schools_by_rspo)
+        existing_hashes = dict(
+            session.exec(
+                select(Szkola.numer_rspo, Szkola.hash_danych).where(
+                    col(Szkola.numer_rspo).in_(rspo_numbers)
+                )
+            ).all()
+        )
 
-            if existing_school:
+        schools_to_save: list[SzkolaAPIResponse] = []
+        for school in schools_by_rspo.values():
+            if school.numer_rspo not in existing_hashes:
+                schools_to_save.append(school)
+            elif not self.upsert:
                 logger.info(
                     f"🔙 School with RSPO {school.numer_rspo} already exists. Skipping."
                 )
-                return
+                self.write_counts.unchanged += 1
+            elif existing_hashes[school.numer_rspo] == content_hash(school):
+                self.write_counts.unchanged += 1
+            else:
+                schools_to_save.append(school)
+        return schools_to_save, set(existing_hashes)
+
+    def _save_schools(
+        self, schools: list[SzkolaAPIResponse], batch_size: int
+    ) -> list[SchoolProcessingError]:
+        """Save schools which are new or changed in batches, returns errors of the failed ones"""
+        schools_to_save, existing_rspo_numbers = self._select_schools_to_save(schools)
+        errors: list[SchoolProcessingError] = []
+        for batch in batched(schools_to_save, max(batch_size, 1), strict=False):
+            errors.extend(self._persist_batch(list(batch)))
+
+        failed_rspo_numbers = {error.rspo for error in errors}
+        for school in schools_to_save:
+            if school.numer_rspo in failed_rspo_numbers:
+                continue
+            if school.numer_rspo in existing_rspo_numbers:
+                self.write_counts.updated += 1
+            else:
+                self.write_counts.inserted += 1
+        return errors
+
+    def _build_school(self, school: SzkolaAPIResponse) -> NewSchool:
+        """Build a new school row with ids of its education stages and vocational trainings"""
+        # Process location data
+        locality_id, street_id = self._process_location_data(school)
+
+        # Process school type and status data
+        school_type_id, status_id, student_category_id = (
+            self._process_school_other_information(school)
+        )
 
-            # Process location data
-            locality, street = self._process_location_data(school)
+        # Create a new school row
+        new_school = self._create_school_row(
+            school_data=school,
+            school_type_id=school_type_id,
+            status_id=status_id,
+            locality_id=locality_id,
+            street_id=street_id,
+            student_category_id=student_category_id,
+        )
+        return (
+            new_school,
+            self._process_education_stages(school),
+            self._process_vocational_training_data(school),
+        )
 
-            # Process school type and status data
-            school_type, school_status, student_category = (
-                self._process_school_other_information(school)
-            )
+    def decompose_school(self, school: SzkolaAPIResponse) -> None:
+        """Save already validated school data to database"""
+        try:
+            errors = self._save_schools([school], batch_size=1)
+        except Exception as e:
+            self._ensure_session().rollback()
+            raise SchoolProcessingError(school.numer_rspo, e) from e
+        if errors:
+            raise errors[0]
 
-            # Process vocational training data
-            vocational_trainings_list = self._process_vocational_training_data(school)
-
-            # Process education stages data
-            education_stages_list = self._process_education_stages(school)
-
-            # Create a new school object
-            new_school_object = self._create_school_object(
-                school_data=school,
-                school_type=school_type,
-                status=school_status,
-                locality=locality,
-                street=street,
-                education_stages=education_stages_list,
-                vocational_trainings=vocational_trainings_list,
-                student_category=student_category,
+    def _persist_batch(
+        self, schools: list[SzkolaAPIResponse]
+    ) -> list[SchoolProcessingError]:
+        """
+        Save schools in one transaction, with a single multi-row INSERT.
+        When the batch fails, it is bisected until the failing schools are isolated.
+        Returns errors of the schools which could not be saved.
+        """
+        session = self._ensure_session()
+        try:
+            new_schools = [self._build_school(school) for school in schools]
+            school_ids = self._insert_schools([row for row, _, _ in new_schools])
+
+            for school_id, (_, education_stage_ids, vocational_training_ids) in zip(
+                school_ids, new_schools, strict=True
+            ):
+                session.add_all(
+                    SzkolaEtapLink(etap_id=etap_id, szkola_id=school_id)
+                    for etap_id in education_stage_ids
+                )
+                session.add_all(
+                    SzkolaKsztalcenieZawodoweLink(
+                        ksztalcenie_zawodowe_id=training_id, szkola_id=school_id
+                    )
+                    for training_id in vocational_training_ids
+                )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(schools) == 1:
+                return [SchoolProcessingError(schools[0].numer_rspo, e)]
+            logger.warning(
+                f"🔪 Saving a batch of {len(schools)} schools failed, splitting it in half"
+            )
+            middle = len(schools) // 2
+            return self._persist_batch(schools[:middle]) + self._persist_batch(
+                schools[middle:]
             )
 
-            session.add(new_school_object)
-            session.commit()
-            session.refresh(new_school_object)
+        for school in schools:
+            logger.info(f"💾 Saved school: {school.nazwa} (RSPO: {school.numer_rspo})")
+        return []
 
-            logger.info(
-                f"💾 Added school: {new_school_object.nazwa} (RSPO: {new_school_object.numer_rspo})"
+    def _insert_schools(self, rows: list[SchoolRow]) -> list[int]:
+        """
+        Insert school rows with a single INSERT, in upsert mode
+        with ON CONFLICT (numer_rspo) DO UPDATE. Links of updated schools are removed,
+        so that they can be written again. Returns ids of the schools in the same order.
+        """
+        session = self._ensure_session()
+        statement = pg_insert(Szkola).values(rows)
+        if self.upsert:
+            statement = statement.on_conflict_do_update(
+                index_elements=[col(Szkola.numer_rspo)],
+                set_={
+                    column: statement.excluded[column]
+                    for column in rows[0]
+                    if column not in UPSERT_KEPT_COLUMNS
+                },
             )
+        returned = (
+            session.connection()
+            .execute(statement.returning(col(Szkola.numer_rspo), col(Szkola.id)))
+            .all()
+        )
+        ids = dict(cast(Sequence[tuple[int, int]], returned))
+        school_ids = [ids[cast(int, row["numer_rspo"])] for row in rows]
 
-        except Exception as e:
-            session.rollback()
-            raise SchoolProcessingError(school.numer_rspo, e) from e
+        if self.upsert:
+            for table in (SzkolaEtapLink, SzkolaKsztalcenieZawodoweLink):
+                _ = session.connection().execute(
+                    delete(table).where(col(table.szkola_id).in_(school_ids))
+                )
+        return school_ids
 
     def prune_and_decompose_schools(self, schools_data: list[SchoolDict]) -> None:
         """
@@ -331,12 +568,142 @@ class Decomposer(DatabaseManagerBase):
             try:
                 self.prune_and_decompose_single_school_data(school_data)
                 processed_schools += 1
-            except (SchoolProcessingError, DataValidationError) as e:
+            except DataValidationError as e:
+                failed_schools += 1
+                logger.error(f"📛 Error processing school: {e}")
+                if self.dead_letters:
+                    self.dead_letters.add_validation_error(e)
+            except SchoolProcessingError as e:
                 failed_schools += 1
                 logger.error(f"📛 Error processing school: {e}")
+                if self.dead_letters:
+                    self.dead_letters.add_processing_error(e, school_data)
 
+        self._log_processing_summary(total_schools, processed_schools, failed_schools)
+
+    @staticmethod
+    def raw_schools_by_rspo(schools_data: list[SchoolDict]) -> dict[int, SchoolDict]:
+        """Raw payloads of schools by RSPO number, stored as dead letters when saving fails"""
+        return {
+            rspo: school_data
+            for school_data in schools_data
+            if isinstance(rspo := school_data.get("numerRspo"), int)
+        }
+
+    def decompose_schools(
+        self,
+        schools: list[SzkolaAPIResponse],
+        batch_size: int = APISettings.PERSIST_BATCH_SIZE,
+        raw_schools: Mapping[int, SchoolDict] | None = None,
+    ) -> list[SchoolProcessingError]:
+        """
+        Save a list of already validated schools, committing once per batch.
+        raw_schools are the payloads the schools were validated from, by RSPO number,
+        a school failing to save is stored as a dead letter with its payload.
+        Returns errors of the schools which failed.
+        """
+        errors = self._save_schools(schools, batch_size)
+        schools_by_rspo = {school.numer_rspo: school for school in schools}
+        for error in errors:
+            logger.error(f"📛 Error processing school: {error}")
+            if not self.dead_letters:
+                continue
+            raw_school = (raw_schools or {}).get(error.rspo)
+            if raw_school is None:
+                # dumped with API field names, so the payload can be validated again
+                raw_school = cast(
+                    SchoolDict,
+                    schools_by_rspo[error.rspo].model_dump(mode="json", by_alias=True),
+                )
+            self.dead_letters.add_processing_error(error, raw_school)
+
+        self._log_processing_summary(
+            len(schools), len(schools) - len(errors), len(errors)
+        )
+        logger.info(f"📊 Schools: {self.write_counts}")
+        return errors
+
+    def _log_processing_summary(
+        self, total_schools: int, processed_schools: int, failed_schools: int
+    ) -> None:
         logger.info(
             f"📊 Processing complete. Successfully processed: {processed_schools}/{total_schools} schools"
         )
         if failed_schools > 0:
             logger.warning(f"⚠️ Failed to process {failed_schools} schools")
+
+    def delete_schools(self, rspo_numbers: Iterable[int]) -> int:
+        """
+        Delete schools together with their links and exam results.
+        A tombstone is left for every school, so that clients syncing changes drop it too.
+        Returns the number of deleted schools.
+        """
+        session = self._ensure_session()
+        schools = session.exec(
+            select(Szkola).where(col(Szkola.numer_rspo).in_(list(rspo_numbers)))
+        ).all()
+        if not schools:
+            return 0
+
+        school_ids = [school.id for school in schools]
+        self._forget_result_files(school_ids)
+        for table in (SzkolaEtapLink, SzkolaKsztalcenieZawodoweLink, WynikE8, WynikEM):
+            _ = session.connection().execute(
+                delete(table).where(col(table.szkola_id).in_(school_ids))
+            )
+
+        for school in schools:
+            session.add(
+                UsunietaSzkola(
+                    szkola_id=cast(int, school.id),
+                    numer_rspo=school.numer_rspo,
+                    wersja=self.dataset_version,
+                )
+            )
+            session.delete(school)
+            logger.info(f"🗑️ Deleted school: {school.nazwa} (RSPO: {school.numer_rspo})")
+
+        session.commit()
+        return len(schools)
+
+    def _forget_result_files(self, school_ids: list[int | None]) -> None:
+        """
+        Remove manifest entries of exam result files with results of the schools,
+        so the files are imported again when the schools come back to RSPO
+        """
+        session = self._ensure_session()
+        for exam_type, table in ((ExamType.E8, WynikE8), (ExamType.EM, WynikEM)):
+            years = session.exec(
+                select(table.rok).where(col(table.szkola_id).in_(school_ids)).distinct()
+            ).all()
+            if years:
+                _ = session.connection().execute(
+                    delete(ZaimportowanyPlik).where(
+                        col(ZaimportowanyPlik.typ_egzaminu) == exam_type.name,
+                        col(ZaimportowanyPlik.rok).in_(years),
+                    )
+                )
+
+    def delete_missing_schools(self, seen_rspo_numbers: set[int]) -> int:
+        """
+        Delete schools which were not seen by a full import, they were removed from RSPO.
+        Nothing is deleted when no school was seen, an empty API response is not trusted,
+        or when more than APISettings.MAX_DELETED_SHARE of the stored schools are missing,
+        which rather means that the import missed pages.
+        Returns the number of deleted schools.
+        """
+        if not seen_rspo_numbers:
+            return 0
+        session = self._ensure_session()
+        stored = set(session.exec(select(Szkola.numer_rspo)).all())
+        missing = stored - seen_rspo_numbers
+        max_share = APISettings.MAX_DELETED_SHARE
+        if len(missing) > max_share * len(stored):
+            logger.error(
+                f"🛑 {len(missing)} of {len(stored)} schools are missing from the import, more than {max_share:.0%}. Not deleting any of them."
+            )
+            return 0
+        deleted = self.delete_schools(sorted(missing))
+        if deleted:
+            logger.info(f"🗑️ Deleted {deleted} schools which are no longer in RSPO")
+        return deleted
@@ -0,0 +1,257 @@
+import io
+import logging
+from collections.abc import Iterator
+from datetime import datetime
+from typing import cast, override
+
+from sqlalchemy import Engine, Index, Table, func, text
+from sqlalchemy.orm import Mapped
+from sqlmodel import SQLModel, col, select
+
+from app.models.schools import Szkola, SzkolaEtapLink, SzkolaKsztalcenieZawodoweLink
+from data_import.api.db.decomposer import Decomposer, NewSchool, SchoolRow
+from data_import.api.db.exceptions import SchoolProcessingError
+from data_import.api.db.lookup_cache import (
+    EDUCATIONAL_MODELS,
+    LOCATION_MODELS,
+    LookupCache,
+    LookupModel,
+)
+from data_import.api.dead_letters import DeadLetterStore
+from data_import.api.models import SzkolaAPIResponse
+
+logger = logging.getLogger(__name__)
+
+# tables with an id sequence, parents before children
+SEQUENCE_MODELS: tuple[type[SQLModel], ...] = (
+    *LOCATION_MODELS,
+    *EDUCATIONAL_MODELS,
+    Szkola,
+)
+# tables which get most rows, their non-unique indexes are built after loading
+INDEXED_MODELS: tuple[type[SQLModel], ...] = (Szkola, *LOCATION_MODELS)
+
+
+def copy_value(value: object) -> str:
+    """Value in the text format of COPY"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class FreshLoader(Decomposer):
+    """
+    Full import into a database without any schools, written with COPY instead of INSERTs.
+    Ids of schools and new lookup entities are assigned in memory,
+    non-unique indexes of the largest tables are dropped in prepare() and built again
+    on close(). Unique indexes are kept, so a killed load never leaves tables without them,
+    and restore_indexes() builds the dropped ones again on the next start.
+    """
+
+    def __init__(
+        self,
+        lookup_cache: LookupCache | None = None,
+        dead_letters: DeadLetterStore | None = None,
+        dataset_version: int | None = None,
+        engine: Engine | None = None,
+    ):
+        super().__init__(
+            lookup_cache,
+            dead_letters=dead_letters,
+            dataset_version=dataset_version,
+            engine=engine,
+        )
+        self._next_ids: dict[type[SQLModel], int] = {}
+        self._new_lookups: dict[type[SQLModel], list[SchoolRow]] = {}
+        self._rspo_numbers: set[int] = set()
+        self._regons: set[str] = set()
+        self._indexes_dropped: bool = False
+
+    @staticmethod
+    def _deferred_indexes() -> Iterator[Index]:
+        """Non-unique indexes of the largest tables, dropped for the load"""
+        for model in INDEXED_MODELS:
+            table = cast(Table, model.__table__)  # pyright: ignore[reportAttributeAccessIssue]
+            yield from (index for index in table.indexes if not index.unique)
+
+    @classmethod
+    def restore_indexes(cls, engine: Engine) -> None:
+        """Build indexes left dropped by a fresh load which was killed before finishing"""
+        with engine.begin() as connection:
+            for index in cls._deferred_indexes():
+                index.create(connection, checkfirst=True)
+
+    def prepare(self) -> bool:
+        """Drop indexes before loading, returns False if the database already has schools"""
+        session = self._ensure_session()
+        if session.exec(select(func.count()).select_from(Szkola)).one():
+            return False
+
+        self.warm_up_caches()
+        for model in SEQUENCE_MODELS:
+            max_id = cast(
+                int | None,
+                session.exec(select(func.max(col(model.id)))).one(),  # pyright: ignore[reportAttributeAccessIssue, reportUnknownArgumentType, reportUnknownMemberType]
+            )
+            self._next_ids[model] = (max_id or 0) + 1
+
+        connection = session.connection()
+        for index in self._deferred_indexes():
+            index.drop(connection, checkfirst=True)
+        session.commit()
+        self._indexes_dropped = True
+        logger.info("🚚 Fresh load prepared, indexes will be built after loading")
+        return True
+
+    def _next_id(self, model: type[SQLModel]) -> int:
+        next_id = self._next_ids[model]
+        self._next_ids[model] = next_id + 1
+        return next_id
+
+    @override
+    def _create_lookup_entity(
+        self,
+        model_class: type[LookupModel],
+        key_column: Mapped[str],
+        key: str,
+        **values: str | int,
+    ) -> int:
+        """Assign an id in memory, the entity is written with the schools of the batch"""
+        entity_id = self._next_id(model_class)
+        self._new_lookups.setdefault(model_class, []).append(
+            {"id": entity_id, **values}
+        )
+        self.lookup_cache.put(model_class, key, entity_id)
+        return entity_id
+
+    @override
+    def _select_schools_to_save(
+        self, schools: list[SzkolaAPIResponse]
+    ) -> tuple[list[SzkolaAPIResponse], set[int]]:
+        """The database had no schools, so only schools loaded earlier are checked in memory"""
+        schools_to_save: list[SzkolaAPIResponse] = []
+        for school in schools:
+            if school.numer_rspo in self._rspo_numbers:
+                logger.info(
+                    f"🔙 School with RSPO {school.numer_rspo} already exists. Skipping."
+                )
+                self.write_counts.unchanged += 1
+            else:
+                self._rspo_numbers.add(school.numer_rspo)
+                schools_to_save.append(school)
+        return schools_to_save, set()
+
+    def _copy(self, model: type[SQLModel], rows: list[SchoolRow]) -> None:
+        """Write rows with COPY ... FROM STDIN in the current transaction"""
+        if not rows:
+            return
+        table = cast(Table, model.__table__)  # pyright: ignore[reportAttributeAccessIssue]
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        for row in rows:
+            _ = buffer.write("\t".join(copy_value(row[column]) for column in columns))
+            _ = buffer.write("\n")
+        _ = buffer.seek(0)
+
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        dbapi_connection = self._ensure_session().connection().connection
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(  # pyright: ignore[reportAny]
+                f'COPY "{table.name}" ({column_list}) FROM STDIN', buffer
+            )
+        finally:
+            cursor.close()
+
+    @override
+    def _persist_batch(
+        self, schools: list[SzkolaAPIResponse]
+    ) -> list[SchoolProcessingError]:
+        """
+        Write the batch with COPY. A duplicate REGON would violate its unique constraint
+        and fail the whole COPY, so schools with a duplicate REGON are rejected here.
+        A failure of the batch stops the load, ids assigned in memory are not reusable.
+        """
+        errors: list[SchoolProcessingError] = []
+        new_schools: list[NewSchool] = []
+        for school in schools:
+            if school.regon in self._regons:
+                errors.append(
+                    SchoolProcessingError(
+                        school.numer_rspo, ValueError(f"duplicate REGON {school.regon}")
+                    )
+                )
+                continue
+            self._regons.add(school.regon)
+            new_schools.append(self._build_school(school))
+
+        session = self._ensure_session()
+        try:
+            for model in SEQUENCE_MODELS[:-1]:
+                self._copy(model, self._new_lookups.pop(model, []))
+            for row, _, _ in new_schools:
+                row["id"] = self._next_id(Szkola)
+            self._copy(Szkola, [row for row, _, _ in new_schools])
+            self._copy(
+                SzkolaEtapLink,
+                [
+                    {"etap_id": etap_id, "szkola_id": row["id"]}
+                    for row, education_stage_ids, _ in new_schools
+                    for etap_id in education_stage_ids
+                ],
+            )
+            self._copy(
+                SzkolaKsztalcenieZawodoweLink,
+                [
+                    {"ksztalcenie_zawodowe_id": training_id, "szkola_id": row["id"]}
+                    for row, _, vocational_training_ids in new_schools
+                    for training_id in vocational_training_ids
+                ],
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        logger.info(f"💾 Loaded {len(new_schools)} schools")
+        return errors
+
+    def _reset_sequences(self) -> None:
+        """Continue id sequences after the ids assigned in memory"""
+        session = self._ensure_session()
+        for model in SEQUENCE_MODELS:
+            table_name = cast(Table, model.__table__).name  # pyright: ignore[reportAttributeAccessIssue]
+            _ = session.connection().execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                    + f'(SELECT COALESCE(MAX(id), 0) + 1 FROM "{table_name}"), false)'
+                )
+            )
+
+    def _finish_load(self) -> None:
+        session = self._ensure_session()
+        session.rollback()  # a failed batch may have left the transaction aborted
+        logger.info("🏗️ Building indexes...")
+        connection = session.connection()
+        for index in self._deferred_indexes():
+            index.create(connection, checkfirst=True)
+        self._reset_sequences()
+        session.commit()
+        self._indexes_dropped = False
+        logger.info("✅ Fresh load finished")
+
+    @override
+    def close(self) -> None:
+        if self._indexes_dropped:
+            self._finish_load()
+        super().close()
@@ -0,0 +1,112 @@
+import logging
+from collections import OrderedDict
+from typing import cast
+
+from sqlalchemy.orm import Mapped
+from sqlmodel import Session, SQLModel, col, func, select
+
+from app.models.locations import Gmina, Miejscowosc, Powiat, Ulica, Wojewodztwo
+from app.models.schools import (
+    EtapEdukacji,
+    KategoriaUczniow,
+    KsztalcenieZawodowe,
+    StatusPublicznoprawny,
+    TypSzkoly,
+)
+from data_import.core.config import APISettings
+
+logger = logging.getLogger(__name__)
+
+type LocationModel = Wojewodztwo | Powiat | Gmina | Miejscowosc | Ulica
+type EducationalModel = (
+    TypSzkoly
+    | StatusPublicznoprawny
+    | KategoriaUczniow
+    | KsztalcenieZawodowe
+    | EtapEdukacji
+)
+type LookupModel = LocationModel | EducationalModel
+
+LOCATION_MODELS: tuple[type[LocationModel], ...] = (
+    Wojewodztwo,
+    Powiat,
+    Gmina,
+    Miejscowosc,
+    Ulica,
+)  # identified by TERYT code
+EDUCATIONAL_MODELS: tuple[type[EducationalModel], ...] = (
+    TypSzkoly,
+    StatusPublicznoprawny,
+    KategoriaUczniow,
+    EtapEdukacji,
+    KsztalcenieZawodowe,
+)  # identified by name
+
+
+class LookupCache:
+    """
+    Import-scoped cache of lookup entity ids (locations by TERYT code, educational entities by name).
+
+    It stores plain ids instead of ORM instances, so it is not bound to any session
+    and survives across segments. Every table keeps at most max_entries ids,
+    the least recently used ones are evicted.
+    Lookup entities are committed as soon as they are created, so cached ids never
+    belong to a rolled back transaction.
+    """
+
+    def __init__(self, max_entries: int = APISettings.LOOKUP_CACHE_SIZE):
+        self.max_entries: int = max_entries
+        self._ids: dict[type[SQLModel], OrderedDict[str, int]] = {}
+        # tables loaded completely - a miss means that the entity doesn't exist yet
+        self._complete: set[type[SQLModel]] = set()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, model: type[LookupModel], key: str) -> int | None:
+        ids = self._ids.get(model)
+        if ids is None or key not in ids:
+            self.misses += 1
+            return None
+        ids.move_to_end(key)
+        self.hits += 1
+        return ids[key]
+
+    def is_complete(self, model: type[LookupModel]) -> bool:
+        return model in self._complete
+
+    def put(self, model: type[LookupModel], key: str, entity_id: int) -> None:
+        """Cache an id of an entity existing in the database"""
+        ids = self._ids.setdefault(model, OrderedDict())
+        ids[key] = entity_id
+        ids.move_to_end(key)
+        if len(ids) > self.max_entries:
+            _ = ids.popitem(last=False)
+            self._complete.discard(model)  # evicted ids have to be selected again
+
+    def warm_up(self, session: Session) -> None:
+        """Load ids of all lookup tables, one query per table"""
+        for model in LOCATION_MODELS:
+            self._load_table(session, model, col(model.teryt))
+        for model in EDUCATIONAL_MODELS:
+            self._load_table(session, model, col(model.nazwa))
+        logger.info(
+            f"🔥 Lookup cache warmed up: {sum(len(ids) for ids in self._ids.values())} ids"
+        )
+
+    def _load_table(
+        self,
+        session: Session,
+        model: type[LookupModel],
+        key_column: Mapped[str],
+    ) -> None:
+        if model in self._complete:
+            return
+        count = session.exec(select(func.count()).select_from(model)).one()
+        if count > self.max_entries:
+            logger.warning(
+                f"⚠️ {model.__name__} has {count} rows, more than the cache size {self.max_entries}. Not preloading it."
+            )
+            return
+        for key, entity_id in session.exec(select(key_column, col(model.id))).all():
+            self.put(model, key, cast(int, entity_id))
+        self._complete.add(model)
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.models.sync import utc_now
+from data_import.api.db.exceptions import DataValidationError, SchoolProcessingError
+from data_import.api.types import SchoolDict
+from data_import.core.config import APISettings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class DeadLetter:
+    """Raw payload of a school which could not be imported, with the reason"""
+
+    rspo: int | None
+    stage: str  # "validation" or "processing"
+    error: str
+    payload: SchoolDict
+    failed_at: str
+
+
+class DeadLetterStore:
+    """
+    Failed schools appended to a JSONL file, one record per line.
+    They can be imported again with --replay-dead-letters once the cause is fixed.
+    """
+
+    VALIDATION: str = "validation"
+    PROCESSING: str = "processing"
+
+    def __init__(self, path: Path = APISettings.DEAD_LETTER_FILE):
+        self.path: Path = path
+        # records taken by a replay, kept until it finishes
+        self.replay_path: Path = path.with_suffix(".replaying.jsonl")
+        self._lock: threading.Lock = threading.Lock()
+
+    def _append(self, letter: DeadLetter) -> None:
+        """
+        Append the record with a single write to the file opened with O_APPEND,
+        so records of shards appending at the same time are never interleaved
+        """
+        line = json.dumps(asdict(letter), ensure_ascii=False, separators=(",", ":"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            _ = os.write(fd, (line + "\n").encode())
+        finally:
+            os.close(fd)
+
+    def add_validation_error(self, error: DataValidationError) -> None:
+        rspo = error.raw_data.get("numerRspo")
+        self._append(
+            DeadLetter(
+                rspo=rspo if isinstance(rspo, int) else None,
+                stage=self.VALIDATION,
+                error=str(error.original_exc),
+                payload=error.raw_data,
+                failed_at=utc_now().isoformat(),
+            )
+        )
+
+    def add_processing_error(
+        self, error: SchoolProcessingError, school_data: SchoolDict
+    ) -> None:
+        self._append(
+            DeadLetter(
+                rspo=error.rspo,
+                stage=self.PROCESSING,
+                error=repr(error.original_exc),
+                payload=school_data,
+                failed_at=utc_now().isoformat(),
+            )
+        )
+
+    @staticmethod
+    def _read(path: Path) -> list[DeadLetter]:
+        if not path.exists():
+            return []
+        with path.open(encoding="utf-8") as dead_letter_file:
+            return [DeadLetter(**json.loads(line)) for line in dead_letter_file]  # pyright: ignore[reportAny]
+
+    def load(self) -> list[DeadLetter]:
+        return self._read(self.path)
+
+    def take(self) -> list[DeadLetter]:
+        """
+        Take all records for a replay, schools failing again are appended as new records.
+        Records of an interrupted replay are taken again.
+        """
+        with self._lock:
+            if self.path.exists():
+                if self.replay_path.exists():
+                    with self.replay_path.open("a", encoding="utf-8") as replay_file:
+                        _ = replay_file.write(self.path.read_text(encoding="utf-8"))
+                    self.path.unlink()
+                else:
+                    _ = self.path.replace(self.replay_path)
+            return self._read(self.replay_path)
+
+    def finish_replay(self) -> None:
+        """Drop the replayed records, those which failed again are already stored"""
+        self.replay_path.unlink(missing_ok=True)
@@ -1,3 +1,6 @@
+import requests
+
+
 class APIError(Exception):
     """Base exception for API-related errors."""
 
@@ -18,6 +21,18 @@ class APIRequestError(APIError):
         super().__init__(f"{message} (after {attempts} attempts)")
 
 
+class APIOverloadedError(requests.exceptions.RequestException):
+    """Raised for responses asking to slow down (429/503), they are retried after a pause."""
+
+    status_code: int
+    retry_after: float | None
+
+    def __init__(self, status_code: int, retry_after: float | None):
+        super().__init__(f"API overloaded with status {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
 class SchoolsDataError(APIError):
     """Exception raised when there's an issue with schools data."""
 
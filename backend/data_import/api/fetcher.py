@@ -1,12 +1,37 @@
 import logging
+import math
 import time
-from typing import cast
+from collections.abc import Callable, Generator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import cast, override
+from urllib.parse import parse_qs, urlparse
 
 import requests
 
-from data_import.api.exceptions import APIRequestError, SchoolsDataError
+from data_import.api.exceptions import (
+    APIOverloadedError,
+    APIRequestError,
+    SchoolsDataError,
+)
+from data_import.api.http_session import (
+    FetchStats,
+    RequestTimings,
+    create_http_session,
+    timed_chunks,
+    timed_get,
+    timed_stream_get,
+)
+from data_import.api.page_cache import PageCache
+from data_import.api.streaming import HydraStream
+from data_import.api.throttle import AdaptiveThrottle, CircuitBreaker, parse_retry_after
 from data_import.api.types import APIResponse, SchoolDict
-from data_import.core.config import TIMEOUT, APISettings, RetrySettings
+from data_import.core.config import (
+    TIMEOUT,
+    APISettings,
+    RetrySettings,
+    ThrottleSettings,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -28,45 +53,152 @@ class HydraResponse:
         view = cast(dict[str, str], self.raw.get("hydra:view", {}))
         return view.get("hydra:next")
 
+    @property
+    def last_page(self) -> int | None:
+        view = cast(dict[str, str], self.raw.get("hydra:view", {}))
+        last_page_url = view.get("hydra:last")
+        if not last_page_url:
+            return None
+        page = parse_qs(urlparse(last_page_url).query).get("page")
+        return int(page[0]) if page else None
+
+
+class RetryBudget:
+    """
+    Retries of one request. Failures are retried with exponential backoff
+    up to MAX_RETRIES times, overload responses only pause the throttle
+    and are given up after MAX_CONSECUTIVE_OVERLOADS of them in a row.
+    """
+
+    def __init__(self, throttle: AdaptiveThrottle, circuit_breaker: CircuitBreaker):
+        self.throttle: AdaptiveThrottle = throttle
+        self.circuit_breaker: CircuitBreaker = circuit_breaker
+        self.delay: float = RetrySettings.INITIAL_DELAY
+        self.attempts: int = 0  # failed attempts
+        self.overloads: int = 0  # consecutive overload responses
+
+    def wait(self) -> None:
+        """Wait for the circuit breaker and the throttle before the next attempt"""
+        self.circuit_breaker.wait()
+        self.throttle.acquire()
+
+    def succeeded(self) -> None:
+        self.throttle.on_success()
+        self.circuit_breaker.record_success()
+
+    def overloaded(self, err: APIOverloadedError) -> None:
+        """Slow down the throttle, raises when the API stays overloaded"""
+        self.overloads += 1
+        if self.overloads >= ThrottleSettings.MAX_CONSECUTIVE_OVERLOADS:
+            raise APIRequestError(
+                f"API still overloaded after {self.overloads} responses",
+                attempts=self.attempts + self.overloads,
+            ) from err
+        pause = self.throttle.on_overload(err.retry_after)
+        logger.warning(
+            f"🐢 API overloaded ({err.status_code}), slowing down to {self.throttle.rate:.1f} requests/s and pausing for {pause:.0f}s"
+        )
+
+    def failed(self, err: Exception) -> None:
+        """Back off before the next attempt, raises when no retries are left"""
+        max_retries = RetrySettings.MAX_RETRIES
+        self.attempts += 1
+        self.overloads = 0
+        self.circuit_breaker.record_failure()
+        logger.error(
+            f"❌ API Request failed (attempt {self.attempts}/{max_retries}): {err}"
+        )
+        if self.attempts >= max_retries:
+            raise APIRequestError(
+                "API Request failed after all retries", attempts=self.attempts
+            ) from err
+        if not self.circuit_breaker.is_open:
+            logger.info(f"⏱️ Retrying in {self.delay} seconds...")
+            time.sleep(self.delay)
+            self.delay = min(
+                self.delay * 2, RetrySettings.MAX_DELAY
+            )  # exponential backoff
+
 
 class SchoolsAPIFetcher:
     def __init__(
         self,
         base_url: str = APISettings.API_SCHOOLS_URL,
         headers: dict[str, str] = APISettings.HEADERS,
+        concurrency: int = APISettings.CONCURRENCY,
+        pool_size: int = APISettings.POOL_SIZE,
+        page_cache: PageCache | None = None,
+        throttle: AdaptiveThrottle | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        run_date: date | None = None,
     ):
         self.base_url: str = base_url
         self.headers: dict[str, str] = headers
+        self.concurrency: int = max(concurrency, 1)
+        self.session: requests.Session = create_http_session(
+            headers, pool_size=max(pool_size, self.concurrency)
+        )
+        self.stats: FetchStats = FetchStats()
+        # shared by all fetching threads, so they slow down and pause together
+        self.throttle: AdaptiveThrottle = throttle or AdaptiveThrottle()
+        self.circuit_breaker: CircuitBreaker = circuit_breaker or CircuitBreaker()
+        self.last_page: int | None = None  # known after the first fetched page
+        # the last page to fetch, a shard of a sharded import stops at its own last page
+        self.page_limit: int | None = APISettings.PAGE_LIMIT
+        self.page_cache: PageCache | None = page_cache  # raw pages are stored there
+        # fetch date of the cached pages, fixed when the run starts
+        self.run_date: date = run_date or date.today()
 
-    def api_request(self, params: dict[str, int]) -> APIResponse:
+    def _retrying[T](self, request: Callable[[], T]) -> T:
         """
-        Helper to make API requests
+        Send a request with retries. Requests are paced by the adaptive throttle,
+        overload responses (429/503) slow it down instead of counting as failures,
+        so they don't use up the retries - the throttle already backs off.
+        A request still overloaded after MAX_CONSECUTIVE_OVERLOADS responses is given up.
         """
-        delay = RetrySettings.INITIAL_DELAY
-        max_retries = RetrySettings.MAX_RETRIES
-        for attempt in range(max_retries):
+        budget = RetryBudget(self.throttle, self.circuit_breaker)
+        while True:
+            budget.wait()
             try:
-                response = requests.get(
-                    self.base_url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=(TIMEOUT.CONNECT, TIMEOUT.READ),
-                )
-                response.raise_for_status()  # Raises HTTPError for bad status codes
-                return cast(APIResponse, response.json())
+                result = request()
+            except APIOverloadedError as err:
+                budget.overloaded(err)
+                continue
             except requests.exceptions.RequestException as err:
-                logger.error(
-                    f"❌ API Request failed (attempt {attempt + 1}/{max_retries}): {err}"
-                )
-                if (attempt + 1) < max_retries:
-                    logger.info(f"⏱️ Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                    delay = min(
-                        delay * 2, RetrySettings.MAX_DELAY
-                    )  # exponential backoff
-        raise APIRequestError(
-            "API Request failed after all retries", attempts=max_retries
-        )  # Raise custom exception after all retries
+                budget.failed(err)
+                continue
+            budget.succeeded()
+            return result
+
+    @staticmethod
+    def _check_status(response: requests.Response) -> None:
+        if response.status_code in ThrottleSettings.OVERLOAD_STATUSES:
+            raise APIOverloadedError(
+                response.status_code,
+                parse_retry_after(response.headers.get("Retry-After")),
+            )
+        response.raise_for_status()  # Raises HTTPError for bad status codes
+
+    def api_request(self, params: dict[str, int]) -> APIResponse:
+        """
+        Helper to make API requests
+        """
+
+        def request() -> APIResponse:
+            response, timings = timed_get(
+                self.session,
+                self.base_url,
+                params=params,
+                timeout=(TIMEOUT.CONNECT, TIMEOUT.READ),
+            )
+            self.stats.record(timings)
+            logger.debug(
+                f"⏱️ {params}: connect {timings.connect:.3f}s, TTFB {timings.ttfb:.3f}s, download {timings.download:.3f}s ({timings.size} B)"
+            )
+            self._check_status(response)
+            return cast(APIResponse, response.json())
+
+        return self._retrying(request)
 
     def fetch_schools_page(self, page: int = 1) -> HydraResponse:
         """
@@ -76,12 +208,46 @@ class SchoolsAPIFetcher:
 
         try:
             data = self.api_request(params)
+            if self.page_cache:
+                _ = self.page_cache.store(page, data, self.run_date)
             hydra_response = HydraResponse(data)
             return hydra_response
         except APIRequestError as err:
             logging.critical(f"🚫 Fatal error fetching schools data: {err}")
             raise SchoolsDataError(str(err), page=page) from err
 
+    def fetch_schools_pages(self, pages: list[int]) -> list[HydraResponse]:
+        """
+        Fetch several pages concurrently (up to self.concurrency at once)
+        Every page keeps its own retries, responses are returned in the order of pages
+        """
+        if self.concurrency == 1 or len(pages) == 1:
+            return [self.fetch_schools_page(page=page) for page in pages]
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.concurrency, len(pages))
+        ) as executor:
+            return list(executor.map(self.fetch_schools_page, pages))
+
+    def _pages_window(
+        self, start_page: int, missing_schools: int, page_size: int | None
+    ) -> list[int]:
+        """
+        Choose the pages to fetch at once, so that we don't fetch
+        pages past the last one or more pages than needed to fill the segment
+        """
+        if self.last_page is None:  # learn the number of pages from the first one
+            return [start_page]
+
+        size = self.concurrency
+        if page_size:
+            size = min(size, math.ceil(missing_schools / page_size))
+        last_page = self.last_page
+        if self.page_limit:
+            last_page = min(last_page, self.page_limit)
+        size = min(size, last_page - start_page + 1)
+        return list(range(start_page, start_page + max(size, 1)))
+
     def fetch_schools_segment(
         self, start_page: int, max_schools: int = APISettings.MAX_SCHOOLS_SEGMENT
     ) -> tuple[list[SchoolDict], int | None]:
@@ -90,32 +256,189 @@ class SchoolsAPIFetcher:
         Returns tuple of (schools_list, next_page_number)
         """
         schools: list[SchoolDict] = []
-        current_page = start_page
+        current_page: int | None = start_page
+        page_size: int | None = None
 
         while current_page and len(schools) < max_schools:
-            response = self.fetch_schools_page(page=current_page)
-
-            # extract schools from response
-            if response.items:
-                new_schools = response.items
-                schools.extend(new_schools)
-                logger.info(
-                    f"📋 Fetched {len(new_schools)} schools from page {current_page}"
-                )
-            else:
-                logger.info(f"ℹ️ No schools found on page {current_page}")  # noqa: RUF001
+            pages = self._pages_window(
+                current_page, max_schools - len(schools), page_size
+            )
+            for page, response in zip(
+                pages, self.fetch_schools_pages(pages), strict=True
+            ):
+                if response.last_page is not None:
+                    self.last_page = response.last_page
+
+                # extract schools from response
+                if response.items:
+                    new_schools = response.items
+                    schools.extend(new_schools)
+                    page_size = max(page_size or 0, len(new_schools))
+                    logger.info(
+                        f"📋 Fetched {len(new_schools)} schools from page {page}"
+                    )
+                else:
+                    logger.info(f"ℹ️ No schools found on page {page}")  # noqa: RUF001
 
-            # check if page limit is reached
-            if APISettings.PAGE_LIMIT and current_page >= APISettings.PAGE_LIMIT:
-                current_page = None
-                break
+                # check if page limit is reached
+                if self.page_limit and page >= self.page_limit:
+                    current_page = None
+                elif response.next_page_url:  # check if there are more pages in reponse
+                    current_page = page + 1
+                else:  # no more pages - stopping...
+                    current_page = None
 
-            if response.next_page_url:  # check if there are more pages in reponse
-                current_page += 1
-            else:  # no more pages - stopping...
-                current_page = None
+                # the rest of the window is not needed (it will be fetched again in the next segment)
+                if not current_page or len(schools) >= max_schools:
+                    break
 
         logger.info(
             f"🏁 Finished fetching segment. Total schools in segment: {len(schools)}"
         )
+        self.stats.log_summary()
+        self.throttle.log_summary()
+        self.circuit_breaker.log_summary()
         return schools, current_page
+
+    def _open_stream(self, page: int) -> tuple[requests.Response, RequestTimings]:
+        """Response of a page whose body is not read yet, with its timings so far"""
+        response, timings = timed_stream_get(
+            self.session,
+            self.base_url,
+            params={"page": page},
+            timeout=(TIMEOUT.CONNECT, TIMEOUT.READ),
+        )
+        try:
+            self._check_status(response)
+        except Exception:
+            self.stats.record(timings)
+            response.close()
+            raise
+        return response, timings
+
+    def _stream_page(
+        self, page: int
+    ) -> Generator[tuple[int, SchoolDict], None, HydraResponse]:
+        """
+        Yield schools of a page as they are decoded, returns the rest of the page.
+        When the download breaks, the page is requested again
+        and the already yielded schools are skipped. Opening and reading the stream
+        share one retry budget, so a page is given up after MAX_RETRIES failures.
+        With a page cache, the schools of the current page are kept to store the page.
+        """
+        budget = RetryBudget(self.throttle, self.circuit_breaker)
+        yielded = 0
+        try:
+            while True:
+                budget.wait()
+                try:
+                    response, timings = self._open_stream(page)
+                except APIOverloadedError as err:
+                    budget.overloaded(err)
+                    continue
+                except requests.exceptions.RequestException as err:
+                    budget.failed(err)
+                    continue
+                members: list[SchoolDict] = []
+                try:
+                    with response:
+                        stream = HydraStream(
+                            timed_chunks(
+                                response, APISettings.STREAM_CHUNK_SIZE, timings
+                            )
+                        )
+                        for index, school in enumerate(stream):
+                            if self.page_cache:
+                                members.append(school)
+                            if index >= yielded:
+                                yielded += 1
+                                yield page, school
+                        data = stream.metadata
+                    if self.page_cache:
+                        # the same document as a fetched page, so it gets the same hash
+                        _ = self.page_cache.store(
+                            page, {**data, "hydra:member": members}, self.run_date
+                        )
+                    budget.succeeded()
+                    return HydraResponse(data)
+                except (requests.exceptions.RequestException, ValueError) as err:
+                    # a broken download uses up a retry and backs off like a failed request
+                    budget.failed(err)
+                finally:
+                    self.stats.record(timings)
+        except APIRequestError as err:
+            raise SchoolsDataError(str(err), page=page) from err
+
+    def stream_schools(
+        self, start_page: int = APISettings.START_PAGE
+    ) -> Iterator[tuple[int, SchoolDict]]:
+        """
+        Yield (page, school) for all schools from start_page on, decoded while downloading,
+        so memory doesn't grow with the number of schools. Pages are read one by one.
+        """
+        page: int | None = start_page
+        while page:
+            response = yield from self._stream_page(page)
+            if response.last_page is not None:
+                self.last_page = response.last_page
+            if self.page_limit and page >= self.page_limit:
+                page = None
+            elif response.next_page_url:
+                page += 1
+            else:
+                page = None
+        self.stats.log_summary()
+        self.throttle.log_summary()
+        self.circuit_breaker.log_summary()
+
+    def close(self) -> None:
+        """Close pooled connections"""
+        self.session.close()
+
+
+class ReplayFetcher(SchoolsAPIFetcher):
+    """
+    Serves pages from the on-disk PageCache instead of the API,
+    so that decomposition can be re-run without downloading anything
+    """
+
+    def __init__(self, page_cache: PageCache, fetch_date: str = PageCache.LATEST):
+        super().__init__(concurrency=1)
+        self.replay_cache: PageCache = page_cache
+        self.fetch_date: str = page_cache.resolve_date(fetch_date)
+        logger.info(f"📼 Replaying schools pages cached on {self.fetch_date}")
+
+    @override
+    def fetch_schools_page(self, page: int = 1) -> HydraResponse:
+        data = self.replay_cache.load(page, self.fetch_date)
+        if data is None:
+            raise SchoolsDataError(
+                f"page not found in cache from {self.fetch_date}", page=page
+            )
+        return HydraResponse(data)
+
+    @override
+    def _stream_page(
+        self, page: int
+    ) -> Generator[tuple[int, SchoolDict], None, HydraResponse]:
+        response = self.fetch_schools_page(page)
+        for school in response.items:
+            yield page, school
+        return response
+
+
+def create_api_fetcher(
+    replay: str | None = None,
+    run_date: date | None = None,
+    throttle: AdaptiveThrottle | None = None,
+    circuit_breaker: CircuitBreaker | None = None,
+) -> SchoolsAPIFetcher:
+    """Fetcher of the API, or of pages cached on the replay date"""
+    if replay:
+        return ReplayFetcher(PageCache(), fetch_date=replay)
+    return SchoolsAPIFetcher(
+        page_cache=PageCache() if APISettings.CACHE_PAGES else None,
+        throttle=throttle,
+        circuit_breaker=circuit_breaker,
+        run_date=run_date,
+    )
@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, cast, override
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+if TYPE_CHECKING:
+    from urllib3._base_connection import BaseHTTPConnection, BaseHTTPSConnection
+
+logger = logging.getLogger(__name__)
+
+# time spent opening a connection (TCP + TLS) during the current request of this thread
+_connect_time = threading.local()
+
+
+def _reset_connect_time() -> None:
+    _connect_time.value = 0.0
+
+
+def _pop_connect_time() -> float:
+    value = cast(float, getattr(_connect_time, "value", 0.0))
+    _reset_connect_time()
+    return value
+
+
+class TimedHTTPConnection(HTTPConnection):
+    @override
+    def connect(self) -> None:
+        start = time.perf_counter()
+        super().connect()
+        _connect_time.value = time.perf_counter() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    @override
+    def connect(self) -> None:
+        start = time.perf_counter()
+        super().connect()
+        _connect_time.value = time.perf_counter() - start
+
+
+# urllib3's own connection classes don't match its connection protocols exactly
+# (default_socket_options, default_port), so the subclasses are narrowed with cast
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls: "type[BaseHTTPConnection]" = cast(
+        "type[BaseHTTPConnection]", TimedHTTPConnection
+    )
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls: "type[BaseHTTPSConnection]" = cast(
+        "type[BaseHTTPSConnection]", TimedHTTPSConnection
+    )
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record how long opening them took"""
+
+    @override
+    def init_poolmanager(self, *args, **kwargs) -> None:  # pyright: ignore[reportMissingParameterType, reportUnknownParameterType]
+        super().init_poolmanager(*args, **kwargs)  # pyright: ignore[reportUnknownArgumentType]
+        self.poolmanager.pool_classes_by_scheme = {  # pyright: ignore[reportAttributeAccessIssue]
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def create_http_session(headers: dict[str, str], pool_size: int) -> requests.Session:
+    """
+    Create a session with a pool of keep-alive connections,
+    reused between requests instead of a new TCP + TLS handshake for every page
+    """
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@dataclass(slots=True)
+class RequestTimings:
+    connect: float  # opening a new connection, 0 if a pooled one was reused
+    ttfb: float  # from sending the request until the response headers arrived (includes connect)
+    download: float  # reading (and decompressing) the body
+    size: int  # bytes of the decoded body
+
+    @property
+    def total(self) -> float:
+        return self.ttfb + self.download
+
+
+def timed_get(
+    session: requests.Session,
+    url: str,
+    params: dict[str, int],
+    timeout: tuple[int, int],
+) -> tuple[requests.Response, RequestTimings]:
+    """GET that records connect/TTFB/download timings of the request"""
+    _reset_connect_time()
+    start = time.perf_counter()
+    response = session.get(url, params=params, timeout=timeout, stream=True)
+    headers_received = time.perf_counter()
+    # reads the whole body, so the connection goes back to the pool
+    content = response.content
+    timings = RequestTimings(
+        connect=_pop_connect_time(),
+        ttfb=headers_received - start,
+        download=time.perf_counter() - headers_received,
+        size=len(content),
+    )
+    return response, timings
+
+
+def timed_stream_get(
+    session: requests.Session,
+    url: str,
+    params: dict[str, int],
+    timeout: tuple[int, int],
+) -> tuple[requests.Response, RequestTimings]:
+    """
+    GET whose body is read by the caller, only connect/TTFB timings are recorded here.
+    The caller adds the download time and size while reading the body.
+    """
+    _reset_connect_time()
+    start = time.perf_counter()
+    response = session.get(url, params=params, timeout=timeout, stream=True)
+    timings = RequestTimings(
+        connect=_pop_connect_time(),
+        ttfb=time.perf_counter() - start,
+        download=0.0,
+        size=0,
+    )
+    return response, timings
+
+
+def timed_chunks(
+    response: requests.Response, chunk_size: int, timings: RequestTimings
+) -> Iterator[bytes]:
+    """
+    Chunks of the (decoded) body, their reading time and size are added to timings.
+    Only waiting for the chunks is counted, not the time the caller spends between them.
+    """
+    chunks = response.iter_content(chunk_size)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        timings.download += time.perf_counter() - start
+        if chunk is None:
+            return
+        timings.size += len(chunk)
+        yield chunk
+
+
+@dataclass(slots=True)
+class FetchStats:
+    """Thread-safe totals of request timings, to see where crawl time goes"""
+
+    requests: int = 0
+    new_connections: int = 0
+    connect: float = 0.0
+    ttfb: float = 0.0
+    download: float = 0.0
+    size: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def record(self, timings: RequestTimings) -> None:
+        with self._lock:
+            self.requests += 1
+            if timings.connect:
+                self.new_connections += 1
+            self.connect += timings.connect
+            self.ttfb += timings.ttfb
+            self.download += timings.download
+            self.size += timings.size
+
+    def log_summary(self) -> None:
+        if not self.requests:
+            return
+        logger.info(
+            f"🌐 {self.requests} requests ({self.new_connections} new connections), avg connect {self.connect / self.requests:.3f}s, avg TTFB {self.ttfb / self.requests:.3f}s, avg download {self.download / self.requests:.3f}s, {self.size / 1024 / 1024:.1f} MiB received"
+        )
@@ -1,6 +1,6 @@
 from typing import cast
 
-from pydantic import ConfigDict, model_validator
+from pydantic import ConfigDict, TypeAdapter, model_validator
 from sqlmodel import SQLModel
 
 from app.models.schools import (
@@ -13,6 +13,9 @@ from app.models.schools import (
 from data_import.api.types import SchoolDict
 from data_import.utils.convert_to_camel import custom_camel
 
+# values of API fields replaced with None before validation
+EMPTY_VALUES: tuple[str, list[object]] = ("", [])
+
 
 class GeolocationAPIResponse(SQLModel):
     latitude: float
@@ -41,15 +44,29 @@ class SzkolaAPIResponse(SzkolaExtendedData):
     @model_validator(mode="before")
     @classmethod
     def empty_str_list_to_none[T](cls, data: T) -> T:
-        """Convert empty strings and empty lists to None for all fields."""
+        """
+        Convert empty strings and empty lists to None for all fields.
+        A new dict is built in one pass, the raw payload is still cached
+        and stored in dead letters. Validators of single fields were measured
+        to be slower (see benchmarks/validation.py), a call per field costs more.
+        """
         if not isinstance(data, dict):
             raise ValueError(f"Expected data to be a dictionary, but got {data}")
 
-        # Convert empty strings to None for all fields
-        for field_name, field_value in list(cast(SchoolDict, data).items()):
-            if (
-                field_value == "" or field_value == []
-            ):  # "" or [] are considered empty, 0 is a normal value
-                data[field_name] = None
+        # "" or [] are considered empty, 0 is a normal value
+        return cast(
+            T,
+            {
+                field_name: None if field_value in EMPTY_VALUES else field_value
+                for field_name, field_value in cast(SchoolDict, data).items()
+            },
+        )
+
+
+# built once, validating a whole page with it avoids a per-school validator setup
+SCHOOLS_ADAPTER: TypeAdapter[list[SzkolaAPIResponse]] = TypeAdapter(
+    list[SzkolaAPIResponse]
+)
 
-        return cast(T, data)
+# fields of SzkolaAPIResponse which are stored as they are in the szkola table
+SCHOOL_ROW_FIELDS: set[str] = set(SzkolaExtendedData.model_fields)
@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import cast
+
+from data_import.api.types import APIResponse
+from data_import.core.config import APISettings
+
+
+class PageCache:
+    """
+    On-disk cache of raw Hydra pages.
+
+    Pages are stored content-addressed (gzip compressed JSON named by its sha256),
+    so unchanged pages fetched on different days are kept only once.
+    For every fetch date there is a JSONL index mapping page numbers to page hashes:
+
+        objects/ab/ab12...ef.json.gz
+        runs/2025-04-01.jsonl   ->  {"page": 1, "sha256": "ab12...ef"}
+
+    Shards of one import write to the cache from several processes, so objects are
+    written under unique temporary names and index lines are appended atomically.
+    """
+
+    LATEST: str = "latest"
+
+    def __init__(self, cache_dir: Path = APISettings.CACHE_DIR):
+        self.cache_dir: Path = cache_dir
+        self.objects_dir: Path = cache_dir / "objects"
+        self.runs_dir: Path = cache_dir / "runs"
+        self._lock: threading.Lock = threading.Lock()
+        self._indexes: dict[str, dict[int, str]] = {}
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.json.gz"
+
+    def _run_path(self, fetch_date: str) -> Path:
+        return self.runs_dir / f"{fetch_date}.jsonl"
+
+    def store(self, page: int, data: APIResponse, fetch_date: date) -> str:
+        """
+        Store a page fetched in the run started on fetch_date, returns its hash.
+        All pages of a run share the date, even when the run goes past midnight.
+        """
+        content = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        digest = hashlib.sha256(content).hexdigest()
+        run_date = fetch_date.isoformat()
+
+        object_path = self._object_path(digest)
+        with self._lock:
+            if not object_path.exists():
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                # unique per process, another shard may write the same object now
+                tmp_path = object_path.with_name(
+                    f"{object_path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+                )
+                _ = tmp_path.write_bytes(gzip.compress(content))
+                _ = tmp_path.replace(object_path)  # never leave half-written objects
+
+            self.runs_dir.mkdir(parents=True, exist_ok=True)
+            self._append_line(
+                self._run_path(run_date), {"page": page, "sha256": digest}
+            )
+            _ = self._indexes.pop(run_date, None)
+
+        return digest
+
+    @staticmethod
+    def _append_line(path: Path, entry: dict[str, int | str]) -> None:
+        """
+        Append a JSON line with a single write to a file opened with O_APPEND,
+        so lines appended by other processes are never interleaved with it
+        """
+        line = (json.dumps(entry) + "\n").encode()
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            _ = os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def fetch_dates(self) -> list[str]:
+        """Dates (ISO format) of cached runs, oldest first"""
+        if not self.runs_dir.exists():
+            return []
+        return sorted(path.stem for path in self.runs_dir.glob("*.jsonl"))
+
+    def resolve_date(self, fetch_date: str) -> str:
+        """Replace LATEST with the date of the latest cached run"""
+        if fetch_date != self.LATEST:
+            return fetch_date
+        dates = self.fetch_dates()
+        if not dates:
+            raise FileNotFoundError(f"No cached pages found in {self.cache_dir}")
+        return dates[-1]
+
+    def _index(self, fetch_date: str) -> dict[int, str]:
+        with self._lock:
+            if fetch_date not in self._indexes:
+                run_path = self._run_path(fetch_date)
+                if not run_path.exists():
+                    raise FileNotFoundError(f"No cached pages for {fetch_date}")
+                index: dict[int, str] = {}  # the last entry of a page wins
+                with run_path.open(encoding="utf-8") as index_file:
+                    for line in index_file:
+                        entry = cast(dict[str, int | str], json.loads(line))
+                        index[int(entry["page"])] = str(entry["sha256"])
+                self._indexes[fetch_date] = index
+            return self._indexes[fetch_date]
+
+    def load(self, page: int, fetch_date: str) -> APIResponse | None:
+        """Load a page cached on fetch_date, None if it was not cached"""
+        digest = self._index(fetch_date).get(page)
+        if digest is None:
+            return None
+        content = gzip.decompress(self._object_path(digest).read_bytes())
+        return cast(APIResponse, json.loads(content))
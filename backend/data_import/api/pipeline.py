@@ -0,0 +1,393 @@
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import override
+
+from sqlalchemy import Engine
+
+from data_import.api.checkpoint import CheckpointFile, ImportCheckpoint
+from data_import.api.db.decomposer import Decomposer, WriteCounts
+from data_import.api.db.fresh_loader import FreshLoader
+from data_import.api.db.lookup_cache import LookupCache
+from data_import.api.dead_letters import DeadLetterStore
+from data_import.api.exceptions import SchoolsDataError
+from data_import.api.fetcher import SchoolsAPIFetcher
+from data_import.api.models import SzkolaAPIResponse
+from data_import.api.types import SchoolDict
+from data_import.core.config import APISettings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Segment[T]:
+    """Schools of one fetched segment passed between pipeline stages"""
+
+    number: int
+    start_page: int
+    next_page: int | None
+    schools: list[T]
+    # payloads of the validated schools by RSPO number, for dead letters
+    raw_schools: dict[int, SchoolDict] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class StageMetrics:
+    """Throughput of a single pipeline stage"""
+
+    name: str
+    schools: int = 0
+    busy: float = 0.0  # seconds spent doing the stage's own work
+    waiting: float = 0.0  # seconds blocked on an empty input or a full output queue
+
+    @property
+    def throughput(self) -> float:
+        return self.schools / self.busy if self.busy else 0.0
+
+    @override
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.schools} schools, {self.busy:.1f}s busy "
+            f"({self.throughput:.1f} schools/s), {self.waiting:.1f}s waiting"
+        )
+
+
+class ImportPipeline:
+    """
+    Import of schools from the API as three stages running concurrently:
+    fetch -> validate -> persist, connected by bounded queues.
+    Full queues block the previous stage (backpressure), so at most
+    queue_size segments are held in memory between two stages.
+    """
+
+    _STOP: None = None  # end of input marker
+
+    def __init__(
+        self,
+        api_fetcher: SchoolsAPIFetcher,
+        start_page: int = APISettings.START_PAGE,
+        queue_size: int = APISettings.PIPELINE_QUEUE_SIZE,
+        upsert: bool = False,
+        checkpoint_file: CheckpointFile | None = None,
+        dead_letters: DeadLetterStore | None = None,
+        fresh_load: bool = False,
+        streaming: bool = False,
+        delete_missing: bool = False,
+        dataset_version: int | None = None,
+        engine: Engine | None = None,
+    ):
+        self.api_fetcher: SchoolsAPIFetcher = api_fetcher
+        self.start_page: int = start_page
+        self.start_segment: int = 1
+        self.checkpoint_file: CheckpointFile | None = checkpoint_file
+        self.dead_letters: DeadLetterStore | None = dead_letters
+        self.upsert: bool = upsert  # update changed existing schools
+        # write schools with COPY, only used when the database has no schools yet
+        self.fresh_load: bool = fresh_load
+        # decode schools while downloading and pass them on in small batches
+        self.streaming: bool = streaming
+        # delete schools which are no longer in RSPO, only after a complete import
+        self.delete_missing: bool = delete_missing
+        # version stamped on written schools, by default opened once for the run
+        self.dataset_version: int | None = dataset_version
+        # RSPO numbers of all fetched schools, also of the invalid ones
+        self.engine: Engine | None = engine  # database of the persist stage
+        self.seen_rspo_numbers: set[int] = set()
+        self.deleted: int = 0
+        self._fetched: queue.Queue[Segment[SchoolDict] | None] = queue.Queue(
+            maxsize=queue_size
+        )
+        self._validated: queue.Queue[Segment[SzkolaAPIResponse] | None] = queue.Queue(
+            maxsize=queue_size
+        )
+        self._failed: threading.Event = threading.Event()
+        self._lock: threading.Lock = threading.Lock()
+        self.metrics: dict[str, StageMetrics] = {
+            name: StageMetrics(name) for name in ("fetch", "validate", "persist")
+        }
+        # shared by all segments, so every lookup entity is selected at most once
+        self.lookup_cache: LookupCache = LookupCache()
+        self.write_counts: WriteCounts = WriteCounts()
+        self.total_processed: int = 0
+        self.failed_page: int | None = None  # page to resume from after a failure
+        self.failed_segment: int | None = None
+
+    def restore(self, checkpoint: ImportCheckpoint) -> None:
+        """Continue an interrupted import from its checkpoint"""
+        self.start_page = checkpoint.next_page
+        # schools of the pages before the checkpoint are not seen by this run
+        self.delete_missing = False
+        self.start_segment = checkpoint.segment
+        self.total_processed = checkpoint.total_processed
+        self.write_counts.inserted = checkpoint.inserted
+        self.write_counts.updated = checkpoint.updated
+        self.write_counts.unchanged = checkpoint.unchanged
+
+    def _save_checkpoint(self, segment: Segment[SzkolaAPIResponse]) -> None:
+        if self.checkpoint_file is None or segment.next_page is None:
+            return
+        self.checkpoint_file.save(
+            ImportCheckpoint(
+                next_page=segment.next_page,
+                segment=segment.number + 1,
+                total_processed=self.total_processed,
+                inserted=self.write_counts.inserted,
+                updated=self.write_counts.updated,
+                unchanged=self.write_counts.unchanged,
+            )
+        )
+
+    def _put[T](self, target: queue.Queue[T], item: T, metrics: StageMetrics) -> bool:
+        """Put an item into the queue, returns False when the pipeline has failed"""
+        start = time.perf_counter()
+        try:
+            while not self._failed.is_set():
+                try:
+                    target.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            metrics.waiting += time.perf_counter() - start
+
+    def _get[T](self, source: queue.Queue[T], metrics: StageMetrics) -> T | None:
+        """Get an item from the queue, returns None when the pipeline has failed"""
+        start = time.perf_counter()
+        try:
+            while not self._failed.is_set():
+                try:
+                    return source.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            return None
+        finally:
+            metrics.waiting += time.perf_counter() - start
+
+    def _fail(self, segment_number: int, page: int, abort: bool = True) -> None:
+        """
+        Record where the import stopped (the earliest failed page wins).
+        Unless abort is False, stages stop at once
+        instead of finishing the already queued segments.
+        """
+        with self._lock:
+            if self.failed_page is None or page < self.failed_page:
+                self.failed_segment = segment_number
+                self.failed_page = page
+        if abort:
+            self._failed.set()
+
+    def _fetch_stage(self) -> None:
+        metrics = self.metrics["fetch"]
+        current_page = self.start_page
+        segment_number = self.start_segment
+        try:
+            while True:
+                logger.info(
+                    f"🔄 Fetching segment {segment_number} (starting from page {current_page})..."
+                )
+                start = time.perf_counter()
+                schools_data, next_page = self.api_fetcher.fetch_schools_segment(
+                    start_page=current_page
+                )
+                metrics.busy += time.perf_counter() - start
+                metrics.schools += len(schools_data)
+
+                if not schools_data:
+                    logger.info("ℹ️ No more schools to process")  # noqa: RUF001
+                    break
+
+                segment = Segment(segment_number, current_page, next_page, schools_data)
+                if not self._put(self._fetched, segment, metrics):
+                    return
+
+                if not next_page:
+                    logger.info("🏁 No more pages to process")
+                    break
+                current_page = next_page
+                segment_number += 1
+        # segments fetched before the failure are still persisted
+        except SchoolsDataError as e:
+            logger.error(f"📛 Schools data error: {e}")
+            self._fail(segment_number, current_page, abort=False)
+        except Exception as e:
+            logger.critical(f"🚨 Unhandled, critical error while fetching: {e}")
+            self._fail(segment_number, current_page, abort=False)
+        _ = self._put(self._fetched, self._STOP, metrics)
+
+    def _stream_fetch_stage(self) -> None:
+        """
+        Fetch stage of --stream: schools are decoded while pages are downloaded
+        and passed on in small batches, so memory doesn't depend on the segment size.
+        A batch ending inside a page resumes from that page (saved schools are skipped).
+        """
+        metrics = self.metrics["fetch"]
+        segment_number = self.start_segment
+        current_page = self.start_page
+        batch: list[SchoolDict] = []
+        batch_start_page = current_page
+        try:
+            start = time.perf_counter()
+            for page, school in self.api_fetcher.stream_schools(self.start_page):
+                if not batch:
+                    batch_start_page = page
+                current_page = page
+                batch.append(school)
+                if len(batch) < APISettings.STREAM_BATCH_SIZE:
+                    continue
+
+                metrics.busy += time.perf_counter() - start
+                metrics.schools += len(batch)
+                segment = Segment(segment_number, batch_start_page, page, batch)
+                if not self._put(self._fetched, segment, metrics):
+                    return
+                batch = []
+                segment_number += 1
+                start = time.perf_counter()
+
+            metrics.busy += time.perf_counter() - start
+            metrics.schools += len(batch)
+            if batch:
+                segment = Segment(segment_number, batch_start_page, None, batch)
+                if not self._put(self._fetched, segment, metrics):
+                    return
+            logger.info("🏁 No more pages to process")
+        except SchoolsDataError as e:
+            logger.error(f"📛 Schools data error: {e}")
+            self._fail(
+                segment_number, batch_start_page if batch else current_page, abort=False
+            )
+        except Exception as e:
+            logger.critical(f"🚨 Unhandled, critical error while fetching: {e}")
+            self._fail(
+                segment_number, batch_start_page if batch else current_page, abort=False
+            )
+        _ = self._put(self._fetched, self._STOP, metrics)
+
+    def _validate_stage(self) -> None:
+        metrics = self.metrics["validate"]
+        segment_number, page = self.start_segment, self.start_page
+        try:
+            while (segment := self._get(self._fetched, metrics)) is not None:
+                segment_number, page = segment.number, segment.start_page
+                start = time.perf_counter()
+                raw_schools = Decomposer.raw_schools_by_rspo(segment.schools)
+                self.seen_rspo_numbers.update(raw_schools)
+                validated, errors = Decomposer.validate_schools_data(segment.schools)
+                for error in errors:
+                    logger.error(f"📛 Error processing school: {error}")
+                    if self.dead_letters:
+                        self.dead_letters.add_validation_error(error)
+                metrics.busy += time.perf_counter() - start
+                metrics.schools += len(segment.schools)
+
+                next_segment = Segment(
+                    segment.number,
+                    segment.start_page,
+                    segment.next_page,
+                    validated,
+                    raw_schools,
+                )
+                if not self._put(self._validated, next_segment, metrics):
+                    return
+        except Exception as e:
+            logger.critical(f"🚨 Unhandled, critical error while validating: {e}")
+            self._fail(segment_number, page, abort=True)
+        finally:
+            _ = self._put(self._validated, self._STOP, metrics)
+
+    def _persist_stage(self) -> None:
+        if not self.fresh_load:
+            self._persist_all()
+            return
+        try:
+            with FreshLoader(
+                self.lookup_cache, self.dead_letters, self.dataset_version, self.engine
+            ) as fresh_loader:
+                if fresh_loader.prepare():
+                    self._persist_segments(fresh_loader)
+                    return
+        except Exception as e:
+            logger.critical(f"🚨 Unhandled, critical error of the fresh load: {e}")
+            self._fail(self.start_segment, self.start_page)
+            return
+        logger.warning(
+            "⚠️ The database already contains schools, saving them without a fresh load"
+        )
+        self._persist_all()
+
+    def _persist_all(self) -> None:
+        """Save all segments with one Decomposer, so the run has a single dataset version"""
+        try:
+            with Decomposer(
+                self.lookup_cache,
+                upsert=self.upsert,
+                dead_letters=self.dead_letters,
+                dataset_version=self.dataset_version,
+                engine=self.engine,
+            ) as decomposer:
+                decomposer.warm_up_caches()
+                self._persist_segments(decomposer)
+                if self.delete_missing and self.failed_page is None:
+                    self.deleted = decomposer.delete_missing_schools(
+                        self.seen_rspo_numbers
+                    )
+        except Exception as e:
+            logger.critical(f"🚨 Unhandled, critical error: {e}")
+            self._fail(self.start_segment, self.start_page)
+
+    def _persist_segments(self, decomposer: Decomposer) -> None:
+        metrics = self.metrics["persist"]
+        while (segment := self._get(self._validated, metrics)) is not None:
+            logger.info(
+                f"⚡ Processing {len(segment.schools)} schools from segment {segment.number}..."
+            )
+            start = time.perf_counter()
+            try:
+                decomposer.write_counts = WriteCounts()  # counts of this segment
+                _ = decomposer.decompose_schools(
+                    segment.schools, raw_schools=segment.raw_schools
+                )
+                self.write_counts.add(decomposer.write_counts)
+            except Exception as e:
+                logger.critical(f"🚨 Unhandled, critical error: {e}")
+                self._fail(segment.number, segment.start_page)
+                return
+            metrics.busy += time.perf_counter() - start
+            metrics.schools += len(segment.schools)
+
+            self.total_processed += len(segment.schools)
+            logger.info(
+                f"✅ Successfully processed segment {segment.number} ({len(segment.schools)} schools)"
+            )
+            logger.info(f"📊 Total schools processed so far: {self.total_processed}")
+            self._save_checkpoint(segment)
+
+    def run(self) -> bool:
+        """Run all stages until the last page is persisted, returns False on failure"""
+        stages: list[Callable[[], None]] = [
+            self._stream_fetch_stage if self.streaming else self._fetch_stage,
+            self._validate_stage,
+            self._persist_stage,
+        ]
+        threads = [
+            threading.Thread(target=stage, name=f"import-{stage.__name__}")
+            for stage in stages
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for metrics in self.metrics.values():
+            logger.info(f"⏱️ {metrics}")
+        logger.info(
+            f"🗃️ Lookup cache: {self.lookup_cache.hits} hits, {self.lookup_cache.misses} misses"
+        )
+        logger.info(f"💾 Schools: {self.write_counts}")
+        if self.failed_page is None and self.checkpoint_file is not None:
+            self.checkpoint_file.clear()
+        return self.failed_page is None
@@ -0,0 +1,184 @@
+import logging
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from multiprocessing.sharedctypes import Synchronized
+
+from app.core.database import engine
+from data_import.api.db.decomposer import Decomposer
+from data_import.api.dead_letters import DeadLetterStore
+from data_import.api.fetcher import create_api_fetcher
+from data_import.api.pipeline import ImportPipeline
+from data_import.api.throttle import AdaptiveThrottle, CircuitBreaker, shared_time
+from data_import.core.config import APISettings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Shard:
+    """Range of pages imported by one worker process"""
+
+    number: int
+    start_page: int
+    end_page: int | None  # None imports up to the last page of the API
+
+
+@dataclass(slots=True)
+class ShardResult:
+    shard: Shard
+    schools: int
+    seconds: float
+    failed_page: int | None
+    inserted: int
+    updated: int
+    unchanged: int
+    seen_rspo_numbers: set[int]
+
+    @property
+    def throughput(self) -> float:
+        return self.schools / self.seconds if self.seconds else 0.0
+
+
+def split_pages(start_page: int, last_page: int | None, shards: int) -> list[Shard]:
+    """
+    Split pages into at most shards contiguous ranges of (almost) the same size.
+    With an unknown last page all pages are imported by a single shard without a limit.
+    """
+    if last_page is None:
+        return [Shard(1, start_page, None)]
+    pages = last_page - start_page + 1
+    size = math.ceil(pages / max(shards, 1))
+    return [
+        Shard(number, first, min(first + size - 1, last_page))
+        for number, first in enumerate(range(start_page, last_page + 1, size), start=1)
+    ]
+
+
+# pause of the throttle and of the circuit breaker shared by all shards,
+# set in every worker process by _init_worker
+_paused_until: "Synchronized[float] | None" = None
+_breaker_open_until: "Synchronized[float] | None" = None
+
+
+def _init_worker(
+    paused_until: "Synchronized[float]", breaker_open_until: "Synchronized[float]"
+) -> None:
+    global _paused_until, _breaker_open_until
+    # connections inherited from the parent process must not be used by the children
+    engine.dispose(close=False)
+    _paused_until = paused_until
+    _breaker_open_until = breaker_open_until
+
+
+def run_shard(
+    shard: Shard,
+    replay: str | None,
+    upsert: bool,
+    dataset_version: int,
+    run_date: date,
+    shards: int = 1,
+) -> ShardResult:
+    """
+    Import pages of the shard in a worker process, with its own fetcher and sessions.
+    The fetcher gets a share of the request rate of all shards, overload responses
+    and the circuit breaker of one shard pause the others too.
+    """
+    api_fetcher = create_api_fetcher(
+        replay,
+        run_date=run_date,
+        throttle=AdaptiveThrottle.shared_by(
+            shards, _paused_until if _paused_until is not None else shared_time()
+        ),
+        circuit_breaker=CircuitBreaker(open_until=_breaker_open_until),
+    )
+    api_fetcher.page_limit = shard.end_page
+    pipeline = ImportPipeline(
+        api_fetcher,
+        start_page=shard.start_page,
+        upsert=upsert,
+        dead_letters=DeadLetterStore(),
+        dataset_version=dataset_version,
+    )
+    start = time.perf_counter()
+    _ = pipeline.run()
+    api_fetcher.close()
+    return ShardResult(
+        shard=shard,
+        schools=pipeline.total_processed,
+        seconds=time.perf_counter() - start,
+        failed_page=pipeline.failed_page,
+        inserted=pipeline.write_counts.inserted,
+        updated=pipeline.write_counts.updated,
+        unchanged=pipeline.write_counts.unchanged,
+        seen_rspo_numbers=pipeline.seen_rspo_numbers,
+    )
+
+
+def sharded_import(
+    shards: int = APISettings.SHARDS,
+    replay: str | None = None,
+    upsert: bool = False,
+    start_page: int = APISettings.START_PAGE,
+    delete_missing: bool = False,
+) -> list[ShardResult]:
+    """
+    Import schools with the page range split across worker processes.
+    The number of pages is read from the first page (hydra:last).
+    All shards stamp schools with one dataset version opened here. With delete_missing
+    schools missing from RSPO are deleted here too, once every shard of a known number
+    of pages finished without a failure.
+    """
+    run_date = date.today()  # pages of all shards are cached under one date
+    api_fetcher = create_api_fetcher(replay, run_date=run_date)
+    last_page = api_fetcher.fetch_schools_page(start_page).last_page
+    api_fetcher.close()
+    if APISettings.PAGE_LIMIT:
+        last_page = min(last_page or APISettings.PAGE_LIMIT, APISettings.PAGE_LIMIT)
+    if last_page is None:
+        logger.warning("⚠️ Unknown number of pages, importing in a single shard")
+
+    page_shards = split_pages(start_page, last_page, shards)
+    logger.info(
+        f"🧩 Importing pages {start_page}-{last_page or 'last'} in {len(page_shards)} shards"
+    )
+    with Decomposer(upsert=upsert) as decomposer:
+        dataset_version = decomposer.dataset_version
+        with ProcessPoolExecutor(
+            max_workers=len(page_shards),
+            initializer=_init_worker,
+            initargs=(shared_time(), shared_time()),
+        ) as executor:
+            results = list(
+                executor.map(
+                    run_shard,
+                    page_shards,
+                    [replay] * len(page_shards),
+                    [upsert] * len(page_shards),
+                    [dataset_version] * len(page_shards),
+                    [run_date] * len(page_shards),
+                    [len(page_shards)] * len(page_shards),
+                )
+            )
+        if (
+            delete_missing
+            and last_page is not None
+            and not APISettings.PAGE_LIMIT
+            and all(result.failed_page is None for result in results)
+        ):
+            _ = decomposer.delete_missing_schools(
+                set[int]().union(*(result.seen_rspo_numbers for result in results))
+            )
+
+    for result in results:
+        shard = result.shard
+        logger.info(
+            f"🧩 Shard {shard.number} (pages {shard.start_page}-{shard.end_page or 'last'}): {result.schools} schools in {result.seconds:.1f}s ({result.throughput:.1f} schools/s), {result.inserted} inserted, {result.updated} updated, {result.unchanged} unchanged"
+        )
+        if result.failed_page is not None:
+            logger.error(
+                f"❌ Shard {shard.number} stopped at page {result.failed_page}"
+            )
+    return results
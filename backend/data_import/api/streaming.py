@@ -0,0 +1,88 @@
+import codecs
+import json
+from collections.abc import Iterable, Iterator
+from typing import cast
+
+from data_import.api.types import APIResponse, SchoolDict
+
+MEMBERS_KEY = '"hydra:member"'
+_decoder = json.JSONDecoder()
+
+
+class HydraStream:
+    """
+    Incremental decoder of a Hydra page read in chunks.
+    Items of hydra:member are decoded one by one, so only the current item
+    and one chunk are held in memory. The rest of the page (hydra:view etc.)
+    is available as metadata after all items were read.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._text_decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder(
+            "utf-8"
+        )()
+        self._buffer: str = ""
+        self._finished: bool = False
+        self._metadata: APIResponse | None = None
+
+    def _read(self) -> bool:
+        """Append the next chunk to the buffer, False at the end of the page"""
+        if self._finished:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._finished = True
+            self._buffer += self._text_decoder.decode(b"", final=True)
+            return False
+        self._buffer += self._text_decoder.decode(chunk)
+        return True
+
+    def _skip_separators(self, position: int) -> int:
+        """Position of the next item or of the end of the array, reading more chunks if needed"""
+        while True:
+            while position < len(self._buffer) and self._buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(self._buffer) or not self._read():
+                return position
+
+    def __iter__(self) -> Iterator[SchoolDict]:
+        # everything before the items is kept to decode the metadata later
+        while (key_start := self._buffer.find(MEMBERS_KEY)) < 0:
+            if not self._read():
+                self._metadata = cast(APIResponse, json.loads(self._buffer))
+                return
+        while (array_start := self._buffer.find("[", key_start)) < 0:
+            if not self._read():
+                raise ValueError("Unexpected end of the page in hydra:member")
+        prefix = self._buffer[: array_start + 1]
+        self._buffer = self._buffer[array_start + 1 :]
+
+        while True:
+            position = self._skip_separators(0)
+            if position >= len(self._buffer):
+                raise ValueError("Unexpected end of the page in hydra:member")
+            if self._buffer[position] == "]":
+                break
+            try:
+                item, end = cast(
+                    tuple[SchoolDict, int],
+                    _decoder.raw_decode(self._buffer, position),
+                )
+            except json.JSONDecodeError:
+                if self._read():
+                    continue  # the item is not complete yet
+                raise
+            self._buffer = self._buffer[end:]
+            yield item
+
+        while self._read():
+            pass
+        self._metadata = cast(APIResponse, json.loads(prefix + self._buffer[position:]))
+
+    @property
+    def metadata(self) -> APIResponse:
+        """The page without its items, available after iterating over them"""
+        if self._metadata is None:
+            raise RuntimeError("Metadata is available after all items were read")
+        return self._metadata
@@ -0,0 +1,204 @@
+import logging
+import multiprocessing
+import threading
+import time
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from multiprocessing.sharedctypes import Synchronized
+from typing import cast
+
+from data_import.core.config import ThrottleSettings
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds from a Retry-After header, given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(UTC)).total_seconds(), 0.0)
+
+
+def shared_time() -> "Synchronized[float]":
+    """
+    time.monotonic() value which can be shared by the worker processes of a sharded import,
+    the monotonic clock is the same for all processes of the machine
+    """
+    return cast("Synchronized[float]", multiprocessing.Value("d", 0.0))
+
+
+class AdaptiveThrottle:
+    """
+    AIMD rate limit of requests shared by all fetching threads.
+    The rate grows additively, by increase once per window of rate successful
+    requests (about a second), every overload response (429/503) cuts it
+    multiplicatively and pauses all requests for Retry-After seconds.
+    With paused_until shared by processes, an overload pauses all of them.
+    """
+
+    rate: float  # allowed requests per second
+    requests: int
+    overloads: int
+    backoff: float  # seconds of pauses requested by overload responses
+
+    def __init__(
+        self,
+        initial_rate: float = ThrottleSettings.INITIAL_RATE,
+        min_rate: float = ThrottleSettings.MIN_RATE,
+        max_rate: float = ThrottleSettings.MAX_RATE,
+        increase: float = ThrottleSettings.RATE_INCREASE,
+        decrease: float = ThrottleSettings.RATE_DECREASE,
+        paused_until: "Synchronized[float] | None" = None,
+    ):
+        self._lock: threading.Lock = threading.Lock()
+        self.rate = initial_rate
+        self.min_rate: float = min_rate
+        self.max_rate: float = max_rate
+        self.increase: float = increase
+        self.decrease: float = decrease
+        self._next_request: float = 0.0
+        self._paused_until: "Synchronized[float]" = (
+            paused_until if paused_until is not None else shared_time()
+        )
+        self._started: float | None = None
+        self.requests = 0
+        self.overloads = 0
+        self.backoff = 0.0
+
+    def acquire(self) -> None:
+        """Wait for the next request slot"""
+        with self._lock:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            slot = max(now, self._next_request, self._paused_until.value)
+            self._next_request = slot + 1 / self.rate
+            self.requests += 1
+        if slot > now:
+            time.sleep(slot - now)
+
+    @classmethod
+    def shared_by(
+        cls, processes: int, paused_until: "Synchronized[float]"
+    ) -> "AdaptiveThrottle":
+        """
+        Throttle of one of processes fetching at the same time,
+        all of them together keep to the rates of ThrottleSettings
+        """
+        return cls(
+            initial_rate=ThrottleSettings.INITIAL_RATE / processes,
+            min_rate=ThrottleSettings.MIN_RATE / processes,
+            max_rate=ThrottleSettings.MAX_RATE / processes,
+            increase=ThrottleSettings.RATE_INCREASE / processes,
+            paused_until=paused_until,
+        )
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.rate + self.increase / self.rate, self.max_rate)
+
+    def on_overload(self, retry_after: float | None) -> float:
+        """Slow down after an overload response, returns the pause in seconds"""
+        pause = (
+            ThrottleSettings.DEFAULT_RETRY_AFTER if retry_after is None else retry_after
+        )
+        with self._lock, self._paused_until.get_lock():
+            self.overloads += 1
+            self.rate = max(self.rate * self.decrease, self.min_rate)
+            now = time.monotonic()
+            current = self._paused_until.value
+            paused_until = max(current, now + pause)
+            # concurrent overload responses extend a single pause
+            self.backoff += paused_until - max(current, now)
+            self._paused_until.value = paused_until
+        return pause
+
+    @property
+    def achieved_rate(self) -> float:
+        if self._started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started
+        return self.requests / elapsed if elapsed else 0.0
+
+    def log_summary(self) -> None:
+        if not self.requests:
+            return
+        logger.info(
+            f"🚦 {self.requests} requests at {self.achieved_rate:.1f} requests/s (allowed {self.rate:.1f} requests/s), {self.overloads} overload responses, {self.backoff:.1f}s backing off"
+        )
+
+
+class CircuitBreaker:
+    """
+    Pauses the whole crawl after failure_threshold consecutive failed requests,
+    instead of every page being retried on its own. While the breaker is open,
+    all threads wait for the cooldown. Then requests are let through again
+    and the first one failing opens the breaker with a doubled cooldown.
+    With open_until shared by processes, the breaker pauses all of them.
+    """
+
+    opened: int  # how many times the breaker was opened
+    open_time: float  # seconds the crawl was paused
+
+    def __init__(
+        self,
+        failure_threshold: int = ThrottleSettings.FAILURE_THRESHOLD,
+        cooldown: float = ThrottleSettings.BREAKER_COOLDOWN,
+        max_cooldown: float = ThrottleSettings.BREAKER_MAX_COOLDOWN,
+        open_until: "Synchronized[float] | None" = None,
+    ):
+        self._lock: threading.Lock = threading.Lock()
+        self.failure_threshold: int = failure_threshold
+        self.initial_cooldown: float = cooldown
+        self.max_cooldown: float = max_cooldown
+        self._cooldown: float = cooldown
+        self._failures: int = 0
+        self._open_until: "Synchronized[float]" = (
+            open_until if open_until is not None else shared_time()
+        )
+        self.opened = 0
+        self.open_time = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until.value
+
+    def wait(self) -> None:
+        """Block while the breaker is open"""
+        remaining = self._open_until.value - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._cooldown = self.initial_cooldown
+
+    def record_failure(self) -> None:
+        with self._lock, self._open_until.get_lock():
+            self._failures += 1
+            now = time.monotonic()
+            # already open, possibly opened by another process
+            if self._failures < self.failure_threshold or now < self._open_until.value:
+                return
+            self._open_until.value = now + self._cooldown
+            self.opened += 1
+            self.open_time += self._cooldown
+            logger.warning(
+                f"🔌 {self._failures} requests failed in a row, pausing the crawl for {self._cooldown:.0f}s"
+            )
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            # after the pause, a single failure opens the breaker again
+            self._failures = self.failure_threshold - 1
+
+    def log_summary(self) -> None:
+        if self.opened:
+            logger.info(
+                f"🔌 Circuit breaker opened {self.opened} times, crawl paused for {self.open_time:.0f}s"
+            )
@@ -1,15 +1,35 @@
 from enum import Enum
-from typing import ClassVar, final
+from pathlib import Path
+from typing import ClassVar, Literal, final
 
 from app.models.exam_results import WynikE8, WynikEM
 
 
 class APISettings:
     API_SCHOOLS_URL: str = "https://api-rspo.men.gov.pl/api/placowki/"
+    # requests already asks for gzip and keeps pooled connections alive
     HEADERS: ClassVar[dict[str, str]] = {"accept": "application/ld+json"}
     START_PAGE: int = 1
+    # --delete-missing refuses to delete a larger share of the stored schools
+    MAX_DELETED_SHARE: float = 0.05
     PAGE_LIMIT: int | None = None  # the last page to fetch, if None there is no limit
     MAX_SCHOOLS_SEGMENT: int = 1000
+    CONCURRENCY: int = 4  # pages fetched in parallel, 1 means sequential fetching
+    SHARDS: int = 1  # worker processes importing separate page ranges, see --shards
+    POOL_SIZE: int = 8  # keep-alive connections kept open, should be >= CONCURRENCY
+    PERSIST_BATCH_SIZE: int = 1000  # schools committed in one transaction
+    LOOKUP_CACHE_SIZE: int = 200_000  # ids kept per lookup table during an import
+    PIPELINE_QUEUE_SIZE: int = 2  # segments buffered between import stages
+    STREAM_CHUNK_SIZE: int = 64 * 1024  # bytes of a page decoded at once by --stream
+    STREAM_BATCH_SIZE: int = 100  # schools passed between import stages by --stream
+    CACHE_PAGES: bool = True  # keep raw pages on disk, so they can be replayed offline
+    CACHE_DIR: Path = Path(__file__).parent.parent / ".cache" / "api_pages"
+    # progress saved after every persisted segment, used by --resume
+    CHECKPOINT_FILE: Path = Path(__file__).parent.parent / ".cache" / "checkpoint.json"
+    # schools which failed validation or saving, see --replay-dead-letters
+    DEAD_LETTER_FILE: Path = (
+        Path(__file__).parent.parent / ".cache" / "dead_letters.jsonl"
+    )
 
 
 class RetrySettings:
@@ -18,6 +38,24 @@ class RetrySettings:
     MAX_RETRIES: int = 20
 
 
+class ThrottleSettings:
+    INITIAL_RATE: float = 20.0  # requests per second
+    MIN_RATE: float = 0.5
+    MAX_RATE: float = 50.0
+    # added to the rate once per window of rate successful requests (about a second)
+    RATE_INCREASE: float = 1.0
+    # the rate is multiplied by it after an overload response
+    RATE_DECREASE: float = 0.5
+    OVERLOAD_STATUSES: ClassVar[set[int]] = {429, 503}
+    DEFAULT_RETRY_AFTER: int = 5  # pause when an overload response has no Retry-After
+    # consecutive overload responses after which a request is given up
+    MAX_CONSECUTIVE_OVERLOADS: int = 30
+    # consecutive failed requests opening the circuit breaker
+    FAILURE_THRESHOLD: int = 5
+    BREAKER_COOLDOWN: int = 30  # seconds, doubled every time the breaker opens again
+    BREAKER_MAX_COOLDOWN: int = 600
+
+
 class TIMEOUT:
     CONNECT: int = 30
     READ: int = 60
@@ -40,6 +78,20 @@ class ExamType(Enum):
 class ExcelFile:
     SHEET_NAME = "SAS"
     SPECIAL_COLUMN_START = ("Unnamed", "dla")
+    # calamine (Rust) parses sheets several times faster than openpyxl
+    ENGINE: Literal["calamine", "openpyxl"] = "calamine"
+    # keep parsed sheets on disk, unchanged files aren't parsed again
+    CACHE_PARSED: bool = True
+    CACHE_DIR: Path = Path(__file__).parent.parent / ".cache" / "excel"
+    WORKERS: int = 4  # processes parsing files in parallel, 1 means sequential parsing
+    RESULTS_BATCH_SIZE: int = 5000  # exam results inserted with one statement
+    CHUNK_ROWS: int = 500  # rows of a sheet passed on at once by --stream-excel
+
+
+class ScoreSettings:
+    UPDATE_BATCH_SIZE: int = 10_000  # school scores written by one UPDATE statement
+    # scores closer than that are the same score summed up in another order
+    TOLERANCE: float = 1e-9
 
 
 @final
@@ -0,0 +1,112 @@
+import logging
+from pathlib import Path
+
+from sqlalchemy import Engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import col, func, select
+
+from app.models.schools import Szkola
+from app.models.sync import ZaimportowanyPlik, utc_now
+from data_import.core.config import ExamType
+from data_import.excel.parse_cache import ParsedExcelCache
+from data_import.utils.db.session import DatabaseManagerBase
+
+logger = logging.getLogger(__name__)
+
+
+class FileManifest(DatabaseManagerBase):
+    """
+    Hashes of imported exam results files, one entry per exam type and year.
+    Historical CKE files never change, so a file with the hash of its entry is skipped
+    before it is even parsed. A file which had RSPO numbers without a school is imported
+    again once new schools are added. With force every file is imported again.
+    """
+
+    force: bool
+    _entries: dict[tuple[str, int], ZaimportowanyPlik] | None
+    _digests: dict[tuple[str, int], str]  # hashes of files to import in this run
+    file_digests: dict[Path, str]  # the same by path, so the reader doesn't hash again
+    _schools_version: int | None
+
+    def __init__(self, force: bool = False, engine: Engine | None = None):
+        super().__init__(engine)
+        self.force = force
+        self._entries = None
+        self._digests = {}
+        self.file_digests = {}
+        self._schools_version = None
+        self.skipped: int = 0
+
+    def _imported_entries(self) -> dict[tuple[str, int], ZaimportowanyPlik]:
+        if self._entries is None:
+            session = self._ensure_session()
+            entries = session.exec(select(ZaimportowanyPlik)).all()
+            self._entries = {
+                (entry.typ_egzaminu, entry.rok): entry for entry in entries
+            }
+        return self._entries
+
+    def schools_version(self) -> int:
+        """Dataset version which added the newest school, 0 without schools"""
+        if self._schools_version is None:
+            session = self._ensure_session()
+            statement = select(func.max(col(Szkola.wersja_utworzenia)))
+            self._schools_version = session.exec(statement).one() or 0
+        return self._schools_version
+
+    def should_import(self, exam_type: ExamType, year: int, file_path: Path) -> bool:
+        """False for a file which was already imported with the same content and schools"""
+        key = (exam_type.name, year)
+        digest = ParsedExcelCache.file_digest(file_path)
+        self._digests[key] = digest
+        self.file_digests[file_path] = digest
+        entry = self._imported_entries().get(key)
+        if self.force or entry is None or entry.hash_pliku != digest:
+            return True
+        if (
+            entry.liczba_nieznanych_szkol
+            and entry.wersja_szkol != self.schools_version()
+        ):
+            logger.info(
+                f"🔁 Importing {exam_type.name} data for year {year} again, {entry.liczba_nieznanych_szkol} of its schools were missing and new schools were added since"
+            )
+            return True
+        logger.info(
+            f"⏭️ Skipping {exam_type.name} data for year {year}, {file_path.name} didn't change since the last import"
+        )
+        self.skipped += 1
+        return False
+
+    def record(
+        self,
+        exam_type: ExamType,
+        year: int,
+        rows: int,
+        results: int,
+        unknown_schools: int = 0,
+    ) -> None:
+        """Save the manifest entry of a file imported successfully in this run"""
+        key = (exam_type.name, year)
+        values = {
+            "typ_egzaminu": exam_type.name,
+            "rok": year,
+            "hash_pliku": self._digests[key],
+            "liczba_wierszy": rows,
+            "liczba_wynikow": results,
+            "liczba_nieznanych_szkol": unknown_schools,
+            "wersja_szkol": self.schools_version(),
+            "zaimportowano": utc_now(),
+        }
+        statement = pg_insert(ZaimportowanyPlik).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=["typ_egzaminu", "rok"],
+            set_={
+                name: statement.excluded[name]
+                for name in values
+                if name not in ("typ_egzaminu", "rok")
+            },
+        )
+        session = self._ensure_session()
+        _ = session.connection().execute(statement)
+        session.commit()
+        self._imported_entries()[key] = ZaimportowanyPlik.model_validate(values)
@@ -0,0 +1,68 @@
+import logging
+from typing import cast
+
+import numpy as np
+import numpy.typing as npt
+from sqlmodel import Session, col, select
+
+from app.models.schools import Szkola
+
+logger = logging.getLogger(__name__)
+
+
+class SchoolIdMap:
+    """
+    numer_rspo -> szkola.id of all schools, loaded with one query per import run.
+
+    The mapping is kept as two sorted NumPy arrays, so a whole RSPO column
+    is resolved with a single searchsorted instead of a query per row.
+    RSPO numbers without a school are collected for one summary at the end of the run.
+    """
+
+    SAMPLE_SIZE: int = 20  # unmatched RSPO numbers listed in the summary
+
+    def __init__(self, rspo_numbers: npt.NDArray[np.int64], ids: npt.NDArray[np.int64]):
+        order = np.argsort(rspo_numbers)
+        self._rspo_numbers: npt.NDArray[np.int64] = rspo_numbers[order]
+        self._ids: npt.NDArray[np.int64] = ids[order]
+        self.unmatched: set[int] = set()
+
+    @classmethod
+    def load(cls, session: Session) -> "SchoolIdMap":
+        rows = session.exec(select(col(Szkola.numer_rspo), col(Szkola.id))).all()
+        rspo_numbers = np.fromiter((rspo for rspo, _ in rows), np.int64, len(rows))
+        ids = np.fromiter((school_id for _, school_id in rows), np.int64, len(rows))
+        logger.info(f"🗺️ Loaded ids of {len(rows)} schools")
+        return cls(rspo_numbers, ids)
+
+    def __len__(self) -> int:
+        return len(self._rspo_numbers)
+
+    def resolve(
+        self, rspo_numbers: npt.NDArray[np.int64]
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.bool_]]:
+        """School ids of the RSPO numbers and a mask of the numbers which have a school"""
+        found: npt.NDArray[np.bool_]
+        if len(self) == 0:
+            found = np.zeros(len(rspo_numbers), dtype=np.bool_)
+            ids = np.full(len(rspo_numbers), -1, dtype=np.int64)
+        else:
+            positions = np.searchsorted(self._rspo_numbers, rspo_numbers)
+            positions = np.minimum(
+                positions, len(self) - 1
+            )  # numbers after the last one
+            found = np.equal(self._rspo_numbers[positions], rspo_numbers)
+            ids = np.where(found, self._ids[positions], -1)
+        self.unmatched.update(cast(list[int], np.unique(rspo_numbers[~found]).tolist()))
+        return ids, found
+
+    def log_unmatched(self) -> None:
+        if not self.unmatched:
+            return
+        sample = ", ".join(
+            str(rspo) for rspo in sorted(self.unmatched)[: self.SAMPLE_SIZE]
+        )
+        more = len(self.unmatched) - self.SAMPLE_SIZE
+        logger.warning(
+            f"❓ {len(self.unmatched)} RSPO numbers of exam results have no school in the database, their results were skipped: {sample}{f' and {more} more' if more > 0 else ''}"
+        )
@@ -4,10 +4,16 @@
 # pyright: reportMissingTypeArgument = false
 # pyright: reportUnknownArgumentType = false
 import logging
-from collections.abc import Hashable
+from collections.abc import Hashable, Iterable
+from itertools import batched
+from typing import cast
 
+import numpy as np
 import pandas as pd
-from pydantic import ValidationError
+from sqlalchemy import Boolean, Engine, Table, literal_column, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql.dml import ReturningInsert
+from sqlmodel import col, func, select
 
 from app.models.exam_results import (
     Przedmiot,
@@ -16,13 +22,15 @@ from app.models.exam_results import (
     WynikEM,
     WynikEMExtra,
 )
-from app.models.schools import Szkola
 from data_import.core.config import ExamType, ExcelFile
+from data_import.excel.db.school_ids import SchoolIdMap
 from data_import.utils.clean_column_names import clean_column_name
 from data_import.utils.db.session import DatabaseManagerBase
 
 logger = logging.getLogger(__name__)
 
+RESULT_KEY_COLUMNS = ("szkola_id", "przedmiot_id", "rok")
+
 
 class TableSplitter(DatabaseManagerBase):
     exam_data: pd.DataFrame
@@ -33,15 +41,48 @@ class TableSplitter(DatabaseManagerBase):
     subjects_cache: dict[str, Przedmiot]
     processed_count: int = 0
     skipped_schools: int = 0
+    unknown_schools: int = 0  # RSPO numbers without a school in the database
     added_results: int = 0
+    updated_results: int = 0
+    unchanged_results: int = 0
+    rows_count: int = 0  # rows of the sheet processed so far
+    school_ids: SchoolIdMap | None
 
-    def __init__(self, exam_data: pd.DataFrame, exam_type: ExamType, year: int):
-        super().__init__()
-        self.exam_data = exam_data
+    def __init__(
+        self,
+        exam_data: pd.DataFrame | None,
+        exam_type: ExamType,
+        year: int,
+        school_ids: SchoolIdMap | None = None,
+        engine: Engine | None = None,
+    ):
+        """
+        school_ids can be shared by all files of an import run, otherwise it is loaded here.
+        Without exam_data the rows are given to split_exam_chunks, see for_chunks.
+        """
+        super().__init__(engine)
+        if exam_data is not None:
+            self.exam_data = exam_data
         self.exam_type = exam_type
         self.year = year
         self.unique_subjects = set()
         self.subjects_cache = {}
+        self.school_ids = school_ids
+        self._owns_school_ids: bool = False  # the map was loaded by this splitter
+        # schools of all chunks, a school's rows may be split between two chunks
+        self._matched_rspo: set[int] = set()
+        self._unknown_rspo: set[int] = set()
+
+    @classmethod
+    def for_chunks(
+        cls,
+        exam_type: ExamType,
+        year: int,
+        school_ids: SchoolIdMap | None = None,
+        engine: Engine | None = None,
+    ) -> "TableSplitter":
+        """A splitter of a file read in chunks of rows, exam data comes with split_exam_chunks"""
+        return cls(None, exam_type, year, school_ids, engine)
 
     def initialize(self) -> bool:
         """Perform initialization and validation steps.
@@ -56,12 +97,37 @@ class TableSplitter(DatabaseManagerBase):
             )
             return False
 
+    @staticmethod
+    def is_subject_column(column: Hashable) -> bool:
+        """A (subject, metric) column, not an unnamed/metadata column which can be skipped"""
+        if not isinstance(column, tuple):
+            return False
+        names = cast(tuple[str, ...], column)
+        return len(names) > 1 and not any(
+            prefix in names[0] for prefix in ExcelFile.SPECIAL_COLUMN_START
+        )
+
+    @classmethod
+    def is_needed_column(cls, column: Hashable) -> bool:
+        """Columns used by the splitter: subjects and the RSPO number"""
+        return cls.is_subject_column(column) or (
+            isinstance(column, tuple) and "RSPO" in cast(tuple[str, ...], column)[1]
+        )
+
+    def _column_names(self) -> list[tuple[str, str]]:
+        """Two-level (subject, metric) column names of the exam data"""
+        columns: list[Hashable] = list(self.exam_data.columns)
+        return [
+            cast(tuple[str, str], column)
+            for column in columns
+            if isinstance(column, tuple)
+        ]
+
     def _get_rspo_col_name(self):
         rspo_cols = [
-            col
-            for col in self.exam_data.columns
-            if isinstance(col, tuple)
-            and "RSPO" in col[1]  # RSPO is in the second part of the tuple
+            column
+            for column in self._column_names()
+            if "RSPO" in column[1]  # RSPO is in the second part of the tuple
         ]
         if len(rspo_cols) != 1:
             raise ValueError("Exactly one column with 'RSPO' in its name is expected.")
@@ -75,17 +141,9 @@ class TableSplitter(DatabaseManagerBase):
         """
 
         # Iterate through columns to find subjects (assuming they are level 0 of multi-index)
-        for col in self.exam_data.columns:
-            # Check if it's a tuple (multi-index) and not unnamed/metadata column which can be skipped
-            if isinstance(col, tuple) and len(col) > 1:
-                valid_col = True
-                for col_prefix in ExcelFile.SPECIAL_COLUMN_START:
-                    if col_prefix in col[0]:
-                        valid_col = False
-                        break
-                if not valid_col:
-                    continue
-                self.unique_subjects.add(str(col[0]))
+        for column in self._column_names():
+            if self.is_subject_column(column):
+                self.unique_subjects.add(column[0])
 
         logger.info(f"📚 Identified subjects for processing: {self.unique_subjects}")
         cols_to_keep = [*self.unique_subjects, self.rspo_col_name[0]]
@@ -113,145 +171,269 @@ class TableSplitter(DatabaseManagerBase):
         subject = Przedmiot(nazwa=subject_name)
         self.subjects_cache[subject_name] = subject
 
-    def get_school_rspo_number(
-        self, school_exam_data: pd.Series, index: Hashable
-    ) -> int | None:
-        # Extract RSPO number from the current row
-        rspo = school_exam_data.at[self.rspo_col_name]
-
-        if pd.isna(rspo):
-            self.skip_school(f"❓ RSPO number not found in row {index}")
-            return None
-        return int(rspo)
-
-    def get_school(self, rspo: int) -> Szkola | None:
-        school = self._select_where(Szkola, Szkola.numer_rspo == rspo)
-        if not school:
-            self.skip_school(f"❓ School with RSPO {rspo} not found in the database")
-        return school
-
-    def skip_school(self, reason: str):
-        logger.warning(
-            f"{reason}. Therefore, skipping associated results for this school."
+    def _result_models(
+        self,
+    ) -> tuple[type[WynikE8Extra | WynikEMExtra], type[WynikE8 | WynikEM]]:
+        match self.exam_type:
+            case ExamType.E8:
+                return WynikE8Extra, WynikE8
+            case ExamType.EM:
+                return WynikEMExtra, WynikEM
+
+    def rspo_numbers(self) -> "pd.Series[int]":
+        """RSPO numbers of all rows, rows without one are skipped"""
+        rspo = cast(
+            "pd.Series[float]",
+            pd.to_numeric(self.exam_data[self.rspo_col_name], errors="coerce"),
         )
-        self.skipped_schools += 1
-
-    def _validate_enough_data(self, result: WynikE8Extra | WynikEMExtra) -> bool:
-        # the columns differ in different exam types
-        average_score: float | None = (
-            result.sredni_wynik
-            if isinstance(result, WynikEMExtra)
-            else result.wynik_sredni
+        missing = int(np.count_nonzero(rspo.isna()))
+        if missing:
+            logger.warning(
+                f"❓ RSPO number not found in {missing} rows. Therefore, skipping associated results for these rows."
+            )
+            self.skipped_schools += missing
+        rspo = rspo.dropna()
+        return pd.Series(np.asarray(rspo, dtype=np.int64), index=rspo.index, dtype=int)
+
+    def result_frame(self, rspo: "pd.Series[int]") -> pd.DataFrame:
+        """
+        Results of the rows in rspo (RSPO numbers indexed by row) as one long table,
+        with columns numer_rspo, przedmiot and the fields of the result model.
+        Column names are cleaned once, the frame is stacked by subject and
+        the checks of the result model are applied as masks instead of row by row:
+        required columns, numeric and whole number values, and enough data for a score.
+        """
+        base, _ = self._result_models()
+        fields = list(base.model_fields)
+        required = {
+            name for name, field in base.model_fields.items() if field.is_required()
+        }
+        int_fields = [
+            name
+            for name, field in base.model_fields.items()
+            if field.annotation == int | None
+        ]
+
+        columns = [
+            column
+            for column in self._column_names()
+            if column[0] in self.unique_subjects
+        ]
+        names = [(subject, clean_column_name(metric)) for subject, metric in columns]
+        # the last of columns with the same cleaned name wins
+        last = {name: position for position, name in enumerate(names)}
+        positions = sorted(
+            position for name, position in last.items() if name[1] in fields
         )
-        if (
-            not result.liczba_zdajacych
-        ):  # even if liczba_zdajacych is 0 we are dismissing the result
-            return False
-        if average_score is None and result.mediana is None:  # score can equal to 0
-            return False
-        return True
 
-    def create_result_record(
-        self,
-        subject_exam_result: dict[str, int | float | None],
-        school: Szkola,
-        subject: Przedmiot,
-        base: type[WynikE8Extra | WynikEMExtra],
-        table: type[WynikE8 | WynikEM],
-    ) -> WynikE8 | WynikEM | None:
-        session = self._ensure_session()
-        try:
-            result_base = base.model_validate(subject_exam_result)
-        except ValidationError as e:
+        # a subject without a column of a required field fails validation for every school
+        metrics: dict[str, set[str]] = {}
+        for position in positions:
+            subject, metric = names[position]
+            metrics.setdefault(subject, set()).add(metric)
+        incomplete = [
+            subject
+            for subject, subject_metrics in metrics.items()
+            if not required <= subject_metrics
+        ]
+        for subject in incomplete:
             logger.error(
-                f"🚫 Invalid data for subject '{subject.nazwa}' (School RSPO: {school.numer_rspo}). Details: {subject_exam_result}. Error: {e}"
+                f"🚫 Subject '{subject}' lacks some of the columns {sorted(required)}. Skipping its results."
             )
-            return None
-        if not self._validate_enough_data(result_base):
+        positions = [
+            position for position in positions if names[position][0] not in incomplete
+        ]
+
+        data = self.exam_data.loc[rspo.index, columns]
+        data.columns = pd.MultiIndex.from_tuples(names, names=["subject", "metric"])
+        data = data.iloc[:, positions]
+
+        numeric = data.apply(pd.to_numeric, errors="coerce")
+        invalid = numeric.isna() & data.notna()  # values which are not numbers
+        is_int = [names[position][1] in int_fields for position in positions]
+        fractional = (numeric.loc[:, is_int] % 1).fillna(0) != 0
+        invalid.loc[:, is_int] |= fractional
+
+        results = cast(
+            pd.DataFrame, numeric.stack(level="subject", future_stack=True)
+        ).reindex(columns=fields)
+        invalid_results = cast(
+            pd.DataFrame, invalid.stack(level="subject", future_stack=True)
+        ).any(axis="columns")
+        average = "sredni_wynik" if base is WynikEMExtra else "wynik_sredni"
+        # even if liczba_zdajacych is 0 we are dismissing the result, score can equal to 0
+        enough_data = results["liczba_zdajacych"].fillna(0).ne(0) & (
+            results[average].notna() | results["mediana"].notna()
+        )
+        invalid_count = np.count_nonzero(invalid_results)
+        if invalid_count:
+            logger.error(f"🚫 Skipping {invalid_count} results with invalid values")
+        insufficient = np.count_nonzero(~enough_data & ~invalid_results)
+        if insufficient:
+            logger.info(f"📊 Skipping {insufficient} results with insufficient data")
+
+        results = results.loc[enough_data & ~invalid_results]
+        results[int_fields] = results[int_fields].astype("Int64")
+        index = cast(pd.MultiIndex, results.index)
+        subjects = cast(list[str], index.get_level_values("subject").tolist())
+        results = results.reset_index(drop=True)
+        result_rows = index.get_level_values(0)  # rows of the sheet
+        results.insert(0, "numer_rspo", np.asarray(rspo.loc[result_rows]))
+        results.insert(1, "przedmiot", [clean_column_name(name) for name in subjects])
+
+        # different subject columns may have the same cleaned name, e.g. a new and an old exam formula
+        duplicated = results.duplicated(["numer_rspo", "przedmiot"])
+        duplicated_count = np.count_nonzero(duplicated)
+        if duplicated_count:
             logger.warning(
-                f"📊 Insufficient data for '{subject.nazwa}' (Details: {subject_exam_result}). Skipping result record creation."
+                f"⚠️ Skipping {duplicated_count} results of subjects with the same name given twice for a school"
             )
-            return None
-        result = table(
-            szkola=school,
-            przedmiot=subject,
-            rok=self.year,
-            **result_base.model_dump(),  # pyright: ignore[reportAny]
-        )
-        session.add(result)
-        self.added_results += 1
-        return result
+        return results.loc[~duplicated].reset_index(drop=True)
 
-    def create_results(self, school_exam_data: pd.Series, szkola: Szkola, rspo: int):
+    def _subject_ids(self, subject_names: list[str]) -> dict[str, int]:
+        """Ids of subjects, creating the missing ones"""
         session = self._ensure_session()
-        results_to_commit = 0
-        for subject_name in self.unique_subjects:
-            subject = self.get_subject(clean_column_name(subject_name))
-
-            subject_exam_result: dict[str, int | float | None] = (
-                school_exam_data.loc[subject_name]
-            ).to_dict()
-            # change numpy NaN values to None and clean column names
-            subject_exam_result = {
-                clean_column_name(k): (v if pd.notna(v) else None)
-                for k, v in subject_exam_result.items()
-            }
-
-            match self.exam_type:
-                case ExamType.E8:
-                    result = self.create_result_record(
-                        subject_exam_result, szkola, subject, WynikE8Extra, WynikE8
-                    )
-                case ExamType.EM:
-                    result = self.create_result_record(
-                        subject_exam_result, szkola, subject, WynikEMExtra, WynikEM
-                    )
-            if not result:
-                continue  # there was a ValidationError, move on
-            results_to_commit += 1
-            logger.info(f"💾 Added new exam result: {result.przedmiot} (RSPO: {rspo})")
-
-        if results_to_commit > 0:
-            session.commit()
+        for subject_name in subject_names:
+            subject = self.get_subject(subject_name)
+            if subject.id is None:
+                session.add(subject)
+        session.flush()
+        return {name: cast(int, self.subjects_cache[name].id) for name in subject_names}
+
+    def _count_results(self) -> int:
+        _, table = self._result_models()
+        session = self._ensure_session()
+        statement = (
+            select(func.count()).select_from(table).where(table.rok == self.year)
+        )
+        return session.exec(statement).one()
 
-    def split_exam_results(self):
+    def _upsert_statement(
+        self, fields: list[str], postgres: bool
+    ) -> ReturningInsert[tuple[bool]] | ReturningInsert[tuple[int | None]]:
         """
-        Iterates through exam data, finds corresponding schools and subjects,
-        creates WynikE8/WynikEM records, and adds them to the DB session.
+        INSERT ... ON CONFLICT (szkola_id, przedmiot_id, rok) DO UPDATE of changed rows,
+        returning a row for every written result. On PostgreSQL it is xmax = 0,
+        true for an inserted row and false for an updated one.
         """
-        logger.info(
-            f"📊 Starting processing of {self.exam_type} results for {len(self.exam_data)} schools..."
+        _, table = self._result_models()
+        table_columns = cast(Table, table.__table__).c  # pyright: ignore[reportAttributeAccessIssue]
+        statement = pg_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=RESULT_KEY_COLUMNS,
+            set_={name: statement.excluded[name] for name in fields},
+            where=or_(
+                *(
+                    table_columns[name].is_distinct_from(statement.excluded[name])
+                    for name in fields
+                )
+            ),
         )
+        if postgres:
+            return statement.returning(literal_column("xmax = 0", Boolean))
+        return statement.returning(col(table.id))
 
-        for index, school_exam_data in self.exam_data.iterrows():
-            school_exam_data: pd.Series
-            try:
-                # Find School by RSPO
-                rspo = self.get_school_rspo_number(school_exam_data, index)
-                if not rspo:
-                    continue
-
-                school = self.get_school(rspo)
-                if not school:
-                    continue
-
-                # Process results for each subject for this school
-                self.create_results(school_exam_data, school, rspo)
-
-                self.processed_count += 1
-                if self.processed_count % 100 == 0:  # Log progress periodically
-                    logger.info(
-                        f"⏳ Processed {self.processed_count} schools... Added {self.added_results} results so far."
-                    )
-
-            except Exception as e:
-                logger.exception(f"📛 Unexpected error processing row {index}: {e}")
-                self.skipped_schools += (
-                    1  # Count as skipped if major error occurs for the row
+    def _upsert_results(self, results: pd.DataFrame) -> None:
+        """
+        Write results in batches with INSERT ... ON CONFLICT DO UPDATE,
+        so importing a year again (or a corrected file) is idempotent.
+        Rows whose values didn't change are not rewritten.
+        """
+        session = self._ensure_session()
+        columns: list[Hashable] = list(results.columns)
+        fields = [str(name) for name in columns if name not in RESULT_KEY_COLUMNS]
+        rows = cast(
+            list[dict[str, object]],
+            results.astype(object).where(results.notna(), None).to_dict("records"),
+        )
+        postgres = self._engine.dialect.name == "postgresql"
+        statement = self._upsert_statement(fields, postgres)
+        # e.g. SQLite has no xmax, the added rows are counted before and after instead
+        existing = 0 if postgres else self._count_results()
+        added = written = 0
+        for batch in batched(rows, ExcelFile.RESULTS_BATCH_SIZE, strict=False):
+            returned = session.connection().execute(statement, list(batch)).all()
+            written += len(returned)
+            if postgres:
+                added += sum(
+                    1 for (inserted,) in cast(list[tuple[bool]], returned) if inserted
                 )
+            session.commit()
+        if not postgres:
+            added = self._count_results() - existing
+        # counters add up over the chunks of a file
+        self.added_results += added
+        self.updated_results += written - added
+        self.unchanged_results += len(rows) - written
+
+    def _school_id_map(self) -> SchoolIdMap:
+        if self.school_ids is None:
+            self.school_ids = SchoolIdMap.load(self._ensure_session())
+            self._owns_school_ids = True
+        return self.school_ids
+
+    def _write_results(self):
+        """Reshape and upsert results of the current exam data"""
+        school_id_map = self._school_id_map()
+        rspo = self.rspo_numbers()
+        _, found = school_id_map.resolve(np.asarray(rspo, dtype=np.int64))
+        unknown = set(rspo.loc[~found].tolist()) - self._unknown_rspo
+        self._unknown_rspo |= unknown
+        not_found = len(unknown)
+        if not_found:
+            logger.warning(
+                f"❓ {not_found} schools not found in the database. Therefore, skipping associated results for these schools."
+            )
+            self.skipped_schools += not_found
+            self.unknown_schools += not_found
+        matched = rspo.loc[found]
+        self._matched_rspo.update(matched.tolist())
+        self.processed_count = len(self._matched_rspo)
+
+        results = self.result_frame(matched)
+        subject_names = cast(list[str], results["przedmiot"].unique().tolist())
+        subject_ids = self._subject_ids(subject_names)
+        school_ids, _ = school_id_map.resolve(
+            np.asarray(results.pop("numer_rspo"), dtype=np.int64)
+        )
+        results.insert(0, "szkola_id", school_ids)
+        results.insert(1, "przedmiot_id", results.pop("przedmiot").map(subject_ids))
+        results.insert(2, "rok", self.year)
+        self._upsert_results(results)
 
+    def _log_summary(self):
         logger.info(f"✅ Successfully processed {self.processed_count} schools.")
-        logger.info(f"ℹ️ Added {self.added_results} new exam results to the session.")  # noqa: RUF001
         logger.info(
-            f"ℹ️ Skipped {self.skipped_schools} schools due to missing/invalid RSPO, school not found in DB, or row processing error."  # noqa: RUF001
+            f"ℹ️ Exam results: {self.added_results} added, {self.updated_results} updated, {self.unchanged_results} unchanged."  # noqa: RUF001
+        )
+        logger.info(
+            f"ℹ️ Skipped {self.skipped_schools} schools due to missing RSPO or school not found in DB."  # noqa: RUF001
         )
+        if self._owns_school_ids and self.school_ids is not None:
+            self.school_ids.log_unmatched()
+
+    def split_exam_chunks(self, chunks: Iterable[pd.DataFrame]) -> bool:
+        """
+        Reshape the results of a file read in chunks of rows (see ExcelReader.read_file_chunks)
+        and upsert them in large batches, a whole parsed sheet is a single chunk.
+        Results of a chunk are written before the next one is read, so memory doesn't grow
+        with the file. The first chunk initializes the splitter, returns False for an invalid file.
+        """
+        logger.info(f"📊 Starting chunked processing of {self.exam_type} results...")
+        columns: pd.MultiIndex | None = None
+        for chunk in chunks:
+            self.exam_data = chunk
+            if columns is None:
+                if not self.initialize():
+                    return False
+                # pruned to subjects and RSPO
+                columns = cast(pd.MultiIndex, self.exam_data.columns)
+            else:
+                self.exam_data = chunk[columns]
+            self.rows_count += len(chunk)
+            self._write_results()
+            logger.info(
+                f"⏳ Processed {self.rows_count} rows... Added {self.added_results} results so far."
+            )
+        self._log_summary()
+        return True
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from data_import.core.config import ExamType, ExcelFile
+
+logger = logging.getLogger(__name__)
+
+
+class ParsedExcelCache:
+    """
+    On-disk cache of parsed SAS sheets.
+
+    A sheet is stored under the hash of the file content and of the options it was
+    read with (sheet name, header rows, skipped rows, engine), so a modified file
+    or a changed ExamType header is parsed again:
+
+        <sha256>.parquet
+    """
+
+    def __init__(self, cache_dir: Path = ExcelFile.CACHE_DIR):
+        self.cache_dir: Path = cache_dir
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def file_digest(file_path: Path) -> str:
+        with file_path.open("rb") as file:
+            return hashlib.file_digest(file, "sha256").hexdigest()
+
+    def key(
+        self, file_path: Path, exam_type: ExamType, digest: str | None = None
+    ) -> str:
+        """Cache key of the sheet, digest is the file hash if it was already computed"""
+        options = [
+            digest or self.file_digest(file_path),
+            ExcelFile.SHEET_NAME,
+            exam_type.header,
+            exam_type.skiprows,
+            ExcelFile.ENGINE,
+        ]
+        return hashlib.sha256(json.dumps(options).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def load(self, key: str) -> pd.DataFrame | None:
+        path = self._path(key)
+        if not path.exists():
+            self.misses += 1
+            return None
+        try:
+            df = pd.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"⚠️ Broken cached sheet {path.name}, parsing again: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return df
+
+    def store(self, key: str, df: pd.DataFrame) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        df.to_parquet(tmp_path)
+        _ = tmp_path.replace(path)  # never leave half-written sheets
@@ -1,10 +1,15 @@
 import logging
-from collections.abc import Iterator
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 
+import openpyxl
 import pandas as pd
 
 from data_import.core.config import ExamType, ExcelFile
+from data_import.excel.parse_cache import ParsedExcelCache
 
 logger = logging.getLogger(__name__)
 
@@ -12,43 +17,174 @@ logger = logging.getLogger(__name__)
 class ExcelReader:
     base_data_path: Path = Path(__file__).parent
 
-    def __init__(self, base_data_path: Path | None = None):
+    def __init__(
+        self,
+        base_data_path: Path | None = None,
+        parse_cache: ParsedExcelCache | None = None,
+    ):
         """
         Initializes the ExcelReader.
 
         Args:
             base_data_path: The base path where E8_data and EM_data directories reside.
                             Defaults to the script's directory if None.
+            parse_cache: Cache of parsed sheets. Defaults to the cache in
+                         ExcelFile.CACHE_DIR, unless ExcelFile.CACHE_PARSED is False.
         """
         if base_data_path is not None:
             self.base_data_path = base_data_path
+        if parse_cache is None and ExcelFile.CACHE_PARSED:
+            parse_cache = ParsedExcelCache()
+        self.parse_cache: ParsedExcelCache | None = parse_cache
 
-    def read_files_from_dir(
-        self, directory_path: Path, exam_type: ExamType
-    ) -> Iterator[tuple[int, pd.DataFrame]]:
+    def read_file(
+        self, file_path: Path, exam_type: ExamType, digest: str | None = None
+    ) -> pd.DataFrame:
+        """
+        Parse the SAS sheet of a file, or load it from the cache if the file didn't change.
+        digest is the hash of the file if the caller already computed it.
+        """
+        key = None
+        if self.parse_cache is not None:
+            key = self.parse_cache.key(file_path, exam_type, digest)
+            df = self.parse_cache.load(key)
+            if df is not None:
+                logger.info(f"🗃️ Loaded parsed sheet of {file_path.name} from the cache")
+                return df
+
+        df = pd.read_excel(  # pyright: ignore[reportUnknownMemberType]
+            file_path,
+            sheet_name=ExcelFile.SHEET_NAME,
+            header=exam_type.header,
+            skiprows=exam_type.skiprows,
+            engine=ExcelFile.ENGINE,
+        )
+        if self.parse_cache is not None and key is not None:
+            try:
+                self.parse_cache.store(key, df)
+            except Exception as e:
+                logger.warning(
+                    f"⚠️ Could not cache parsed sheet of {file_path.name}: {e}"
+                )
+        return df
+
+    @staticmethod
+    def _read_header(
+        rows: Iterator[tuple[object, ...]], exam_type: ExamType
+    ) -> list[tuple[str, str]]:
+        """
+        Two-level column names as pd.read_excel builds them:
+        blank cells of merged subject headers are filled with the subject on their left
+        """
+        skiprows = exam_type.skiprows or 0
+        try:
+            header_rows = [
+                next(rows) for _ in range(skiprows + max(exam_type.header) + 1)
+            ][skiprows:]
+        except StopIteration:
+            raise ValueError("The sheet ends before its header") from None
+        subjects, metrics = (header_rows[row] for row in exam_type.header)
+
+        width = max(
+            (
+                index + 1
+                for row in (subjects, metrics)
+                for index, value in enumerate(row)
+                if value not in (None, "")
+            ),
+            default=0,
+        )  # trailing columns without a header are dropped
+
+        columns: list[tuple[str, str]] = []
+        seen: dict[tuple[str, str], int] = {}
+        subject: str | None = None
+        for index in range(width):
+            top = subjects[index] if index < len(subjects) else None
+            bottom = metrics[index] if index < len(metrics) else None
+            if top not in (None, ""):
+                subject = str(top)
+            column = (
+                subject if subject is not None else f"Unnamed: {index}_level_0",
+                str(bottom)
+                if bottom not in (None, "")
+                else f"Unnamed: {index}_level_1",
+            )
+            # repeated names get a suffix, as pandas does
+            duplicates = seen.get(column, 0)
+            seen[column] = duplicates + 1
+            if duplicates:
+                column = (column[0], f"{column[1]}.{duplicates}")
+            columns.append(column)
+        return columns
+
+    def read_file_chunks(
+        self,
+        file_path: Path,
+        exam_type: ExamType,
+        chunk_rows: int = ExcelFile.CHUNK_ROWS,
+        column_filter: Callable[[tuple[str, str]], bool] | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Streams the SAS sheet in DataFrames of chunk_rows rows, with the header of read_file.
+        The workbook is opened read-only, so rows are parsed while they are iterated
+        and only the columns accepted by column_filter are kept in memory.
+        At least one (possibly empty) chunk is yielded.
+        """
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook[ExcelFile.SHEET_NAME].iter_rows(values_only=True)
+            columns = self._read_header(rows, exam_type)
+            kept = [
+                index
+                for index, column in enumerate(columns)
+                if column_filter is None or column_filter(column)
+            ]
+            header = pd.MultiIndex.from_tuples([columns[index] for index in kept])  # pyright: ignore[reportUnknownMemberType]
+
+            chunk: list[list[object]] = []
+            chunks = 0
+            for row in rows:
+                if all(value in (None, "") for value in row):
+                    continue
+                chunk.append(
+                    [row[index] if index < len(row) else None for index in kept]
+                )
+                if len(chunk) == chunk_rows:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+                    chunks += 1
+            if chunk or not chunks:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+
+    def year_files(self, directory_path: Path) -> list[tuple[int, Path]]:
+        """Files of a directory with their years, named like 2024.xlsx"""
         # Check that the directory actually exists
         if not directory_path.exists():
             logger.error(f"Directory not found: {directory_path}")
-            return
-        for file_path in directory_path.glob("*.xlsx"):
-            file_name = file_path.name
-            logger.info(f"📄 Processing file: {file_name}")
+            return []
+        files: list[tuple[int, Path]] = []
+        for file_path in sorted(directory_path.glob("*.xlsx")):
             try:
-                df = pd.read_excel(  # pyright: ignore[reportUnknownMemberType]
-                    file_path,
-                    sheet_name=ExcelFile.SHEET_NAME,
-                    header=exam_type.header,
-                    skiprows=exam_type.skiprows,
+                files.append((int(file_path.name.split(".")[0]), file_path))
+            except ValueError:
+                logger.error(
+                    f"Invalid filename format: {file_path.name}. Expected format: 'number.xlsx'"
                 )
-                try:
-                    file_number = int(file_name.split(".")[0])
-                    yield file_number, df
-                except ValueError:
-                    logger.error(
-                        f"Invalid filename format: {file_name}. Expected format: 'number.xlsx'"
-                    )
+        return files
+
+    def read_files_from_dir(
+        self, directory_path: Path, exam_type: ExamType
+    ) -> Iterator[tuple[int, pd.DataFrame]]:
+        for file_number, file_path in self.year_files(directory_path):
+            logger.info(f"📄 Processing file: {file_path.name}")
+            try:
+                df = self.read_file(file_path, exam_type)
             except Exception as e:
-                logger.error(f"Error reading file {file_name}: {e}")
+                logger.error(f"Error reading file {file_path.name}: {e}")
+                continue
+            yield file_number, df
 
     def load_files(self, exam_type: ExamType) -> Iterator[tuple[int, pd.DataFrame]]:
         """
@@ -60,3 +196,106 @@ class ExcelReader:
         yield from self.read_files_from_dir(path, exam_type)
 
         logger.info(f"✅ Successfully processed all files from: {path}")
+
+    def list_files(
+        self,
+        exam_types: Iterable[ExamType] = ExamType,
+        file_filter: Callable[[ExamType, int, Path], bool] | None = None,
+    ) -> list[tuple[ExamType, int, Path]]:
+        """Files of all exam types in order of exam types and years, accepted by file_filter"""
+        return [
+            (exam_type, year, file_path)
+            for exam_type in exam_types
+            for year, file_path in self.year_files(
+                self.base_data_path / exam_type.directory_name
+            )
+            if file_filter is None or file_filter(exam_type, year, file_path)
+        ]
+
+    def load_files_parallel(
+        self,
+        exam_types: Iterable[ExamType] = ExamType,
+        workers: int = ExcelFile.WORKERS,
+        file_filter: Callable[[ExamType, int, Path], bool] | None = None,
+        digests: Mapping[Path, str] | None = None,
+    ) -> Iterator[tuple[ExamType, int, pd.DataFrame]]:
+        """
+        Parses files of all exam types in a pool of worker processes (sequentially for 1 worker).
+        DataFrames are yielded in the order of exam types and years,
+        so the caller writes one file while the next ones are still parsed.
+        Files for which file_filter returns False are not parsed at all.
+        digests are hashes of files computed by file_filter, they are not hashed again.
+        """
+        files = self.list_files(exam_types, file_filter)
+        digests = digests or {}
+        if workers <= 1 or len(files) <= 1:
+            for exam_type, year, file_path in files:
+                logger.info(f"📄 Processing file: {file_path.name}")
+                try:
+                    df = self.read_file(file_path, exam_type, digests.get(file_path))
+                except Exception as e:
+                    logger.error(f"Error reading file {file_path.name}: {e}")
+                    continue
+                yield exam_type, year, df
+            self._log_cache_summary()
+            return
+
+        logger.info(f"🧵 Parsing {len(files)} files in {workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # a bounded window of files, so parsed DataFrames don't pile up in memory
+            # while the caller writes; one more than workers keeps every worker busy
+            pending: deque[
+                tuple[ExamType, int, Path, Future[tuple[pd.DataFrame, bool]]]
+            ] = deque()
+            remaining = iter(files)
+            while True:
+                for exam_type, year, file_path in islice(
+                    remaining, workers + 1 - len(pending)
+                ):
+                    future = executor.submit(
+                        self._read_file_in_worker,
+                        file_path,
+                        exam_type,
+                        digests.get(file_path),
+                    )
+                    pending.append((exam_type, year, file_path, future))
+                if not pending:
+                    break
+                exam_type, year, file_path, future = pending.popleft()
+                try:
+                    df, cached = future.result()
+                except Exception as e:
+                    logger.error(f"Error reading file {file_path.name}: {e}")
+                    self._count_cache_lookup(cached=False)
+                    continue
+                self._count_cache_lookup(cached)
+                logger.info(
+                    f"📄 Parsed file: {exam_type.directory_name}/{file_path.name}"
+                )
+                yield exam_type, year, df
+        self._log_cache_summary()
+
+    def _read_file_in_worker(
+        self, file_path: Path, exam_type: ExamType, digest: str | None
+    ) -> tuple[pd.DataFrame, bool]:
+        """
+        read_file in a worker process, telling also whether the sheet came from the cache.
+        Counters of the cache copied to the worker never get back, the parent counts instead.
+        """
+        hits = self.parse_cache.hits if self.parse_cache is not None else 0
+        df = self.read_file(file_path, exam_type, digest)
+        return df, self.parse_cache is not None and self.parse_cache.hits > hits
+
+    def _count_cache_lookup(self, cached: bool) -> None:
+        if self.parse_cache is None:
+            return
+        if cached:
+            self.parse_cache.hits += 1
+        else:
+            self.parse_cache.misses += 1
+
+    def _log_cache_summary(self) -> None:
+        if self.parse_cache is not None:
+            logger.info(
+                f"🗃️ Parsed sheets cache: {self.parse_cache.hits} hits, {self.parse_cache.misses} misses"
+            )
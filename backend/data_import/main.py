@@ -1,13 +1,26 @@
+import argparse
 import logging
+from collections.abc import Iterable
 
-from app.core.database import create_db_and_tables
+import pandas as pd
+from sqlmodel import Session
+
+from app.core.database import create_db_and_tables, engine
+from data_import.api.checkpoint import CheckpointFile
 from data_import.api.db.decomposer import Decomposer
-from data_import.api.exceptions import SchoolsDataError
-from data_import.api.fetcher import SchoolsAPIFetcher
-from data_import.core.config import APISettings, ExamType, ScoreType
+from data_import.api.db.fresh_loader import FreshLoader
+from data_import.api.dead_letters import DeadLetterStore
+from data_import.api.fetcher import SchoolsAPIFetcher, create_api_fetcher
+from data_import.api.page_cache import PageCache
+from data_import.api.pipeline import ImportPipeline
+from data_import.api.sharding import sharded_import
+from data_import.core.config import APISettings, ExamType, ExcelFile, ScoreType
+from data_import.excel.db.file_manifest import FileManifest
+from data_import.excel.db.school_ids import SchoolIdMap
 from data_import.excel.db.table_splitter import TableSplitter
 from data_import.excel.reader import ExcelReader
 from data_import.score.scorer import Scorer
+from data_import.utils.db.session import DatabaseManagerBase
 
 logger = logging.getLogger(__name__)
 
@@ -26,79 +39,222 @@ def print_error_message(segment_number: int, current_page: int):
     logger.error(f"""
                  ❌ Error processing segment {segment_number}
                  ⚠️ Process stopped at page {current_page}
-                 💡 You can resume the process by starting from this page""")
-
+                 💡 You can resume the process from this page with --resume""")
 
-def api_importer():
-    api_fetcher = SchoolsAPIFetcher()
-    current_page = APISettings.START_PAGE
-    total_processed = 0
-    segment_number = 1
 
-    while True:
-        try:
-            logger.info(
-                f"🔄 Processing segment {segment_number} (starting from page {current_page})..."
-            )
-            schools_data, next_page = api_fetcher.fetch_schools_segment(
-                start_page=current_page
-            )
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Import schools from the RSPO API and exam results from CKE Excel files"
+    )
+    _ = parser.add_argument(
+        "--replay",
+        nargs="?",
+        const=PageCache.LATEST,
+        metavar="DATE",
+        help="import schools from pages cached on DATE (YYYY-MM-DD, latest by default) instead of the API",
+    )
+    _ = parser.add_argument(
+        "--upsert",
+        action="store_true",
+        help="update existing schools whose data changed instead of skipping them",
+    )
+    _ = parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted import from its last persisted segment",
+    )
+    _ = parser.add_argument(
+        "--replay-dead-letters",
+        action="store_true",
+        help="only import again the schools which failed in previous imports",
+    )
+    _ = parser.add_argument(
+        "--shards",
+        type=int,
+        default=APISettings.SHARDS,
+        metavar="N",
+        help="import schools in N worker processes, each with its own range of pages",
+    )
+    _ = parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="load schools with COPY and build indexes afterwards, only for a database without schools",
+    )
+    _ = parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="decode schools while downloading pages, memory doesn't grow with the segment size",
+    )
+    _ = parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="delete schools which are no longer in RSPO, only after an import of all pages",
+    )
+    _ = parser.add_argument(
+        "--excel-workers",
+        type=int,
+        default=ExcelFile.WORKERS,
+        metavar="N",
+        help="parse exam result files in N worker processes",
+    )
+    _ = parser.add_argument(
+        "--stream-excel",
+        action="store_true",
+        help="read exam result files row by row in chunks, memory doesn't grow with the file size",
+    )
+    _ = parser.add_argument(
+        "--force-excel",
+        action="store_true",
+        help="import all exam result files again, also the ones which didn't change since the last import",
+    )
+    args = parser.parse_args(argv)
+    if args.shards > 1:  # pyright: ignore[reportAny]
+        for flag in ("resume", "fresh", "stream"):
+            if getattr(args, flag):
+                parser.error(f"--{flag} can't be combined with --shards")
+    return args
 
-            if not schools_data:
-                logger.info("ℹ️ No more schools to process")  # noqa: RUF001
-                break
 
-            logger.info(
-                f"⚡ Processing {len(schools_data)} schools from segment {segment_number}..."
+def api_importer(
+    api_fetcher: SchoolsAPIFetcher | None = None,
+    upsert: bool = False,
+    resume: bool = False,
+    fresh_load: bool = False,
+    streaming: bool = False,
+    delete_missing: bool = False,
+):
+    checkpoint_file = CheckpointFile()
+    api_fetcher = api_fetcher or SchoolsAPIFetcher()
+    pipeline = ImportPipeline(
+        api_fetcher,
+        upsert=upsert,
+        checkpoint_file=checkpoint_file,
+        dead_letters=DeadLetterStore(),
+        fresh_load=fresh_load,
+        streaming=streaming,
+        # only an import of all pages sees every school still in RSPO
+        delete_missing=delete_missing and not api_fetcher.page_limit,
+    )
+    if resume:
+        checkpoint = checkpoint_file.load()
+        if checkpoint is None:
+            logger.warning(
+                "⚠️ No checkpoint found, starting the import from the beginning"
             )
-            with Decomposer() as decomposer:
-                decomposer.prune_and_decompose_schools(schools_data)
-
-            total_processed += len(schools_data)
+        else:
             logger.info(
-                f"✅ Successfully processed segment {segment_number} ({len(schools_data)} schools)"
+                f"⏩ Resuming from page {checkpoint.next_page} (segment {checkpoint.segment}, {checkpoint.total_processed} schools processed, saved at {checkpoint.saved_at})"
             )
-            logger.info(f"📊 Total schools processed so far: {total_processed}")
-
-            if not next_page:
-                logger.info("🏁 No more pages to process")
-                break
+            pipeline.restore(checkpoint)
+    if not pipeline.run() and pipeline.failed_segment and pipeline.failed_page:
+        print_error_message(pipeline.failed_segment, pipeline.failed_page)
 
-            current_page = next_page
-            segment_number += 1
+    pipeline.api_fetcher.close()
+    logger.info(
+        f"🎉 Import from API completed. Total schools processed: {pipeline.total_processed}"
+    )
 
-        except SchoolsDataError as e:
-            logger.error(f"📛 Schools data error: {e}")
-            print_error_message(segment_number, current_page)
-            break
 
-        except Exception as e:
-            logger.critical(f"🚨 Unhandled, critical error: {e}")
-            print_error_message(segment_number, current_page)
-            break
+def dead_letter_importer(upsert: bool = False):
+    dead_letters = DeadLetterStore()
+    letters = dead_letters.take()
+    if not letters:
+        logger.info("ℹ️ No failed schools to import again")  # noqa: RUF001
+        return
 
+    logger.info(f"🔁 Importing {len(letters)} failed schools again...")
+    payloads = [letter.payload for letter in letters]
+    schools, errors = Decomposer.validate_schools_data(payloads)
+    for error in errors:
+        logger.error(f"📛 Error processing school: {error}")
+        dead_letters.add_validation_error(error)
+    with Decomposer(upsert=upsert, dead_letters=dead_letters) as decomposer:
+        decomposer.warm_up_caches()
+        failed = len(errors) + len(
+            decomposer.decompose_schools(
+                schools, raw_schools=Decomposer.raw_schools_by_rspo(payloads)
+            )
+        )
+    dead_letters.finish_replay()
     logger.info(
-        f"🎉 Import from API completed. Total schools processed: {total_processed}"
+        f"🎉 Import of failed schools completed. Still failing: {failed}/{len(letters)}"
     )
 
 
-def excel_importer():
+def import_exam_file(
+    exam_type: ExamType,
+    year: int,
+    chunks: Iterable[pd.DataFrame],
+    school_ids: SchoolIdMap | None = None,
+) -> tuple[int, int, int] | None:
+    """
+    Import results of one file given as one or more chunks of rows, returns the numbers
+    of rows, results and unknown schools or None for an invalid file
+    """
+    logger.info(f"🗓️ Processing {exam_type.name} data for year {year}...")
+    with TableSplitter.for_chunks(exam_type, year, school_ids) as splitter:
+        if not splitter.split_exam_chunks(chunks):
+            logger.warning(f"⚠️ Skipping invalid {exam_type.name} data for year {year}")
+            return None  # skip this file - it was invalid
+        logger.info(f"✅ Successfully processed {exam_type.name} data for year {year}")
+        results = (
+            splitter.added_results
+            + splitter.updated_results
+            + splitter.unchanged_results
+        )
+        return splitter.rows_count, results, splitter.unknown_schools
+
+
+def excel_importer(
+    workers: int = ExcelFile.WORKERS, force: bool = False, streaming: bool = False
+):
     reader = ExcelReader()
     logger.info("📄 Starting Excel data import...")
-    for exam_type in ExamType:
-        logger.info(f"📊 Processing {exam_type.name} exam data...")
-        for year, exam_data in reader.load_files(exam_type):
-            logger.info(f"🗓️ Processing {exam_type.name} data for year {year}...")
-            with TableSplitter(exam_data, exam_type, year) as splitter:
-                if not splitter.initialize():
-                    logger.warning(
-                        f"⚠️ Skipping invalid {exam_type.name} data for year {year}"
-                    )
-                    continue  # skip this file - it was invalid
-                splitter.split_exam_results()
-                logger.info(
-                    f"✅ Successfully processed {exam_type.name} data for year {year}"
+    with Session(engine) as session:
+        school_ids = SchoolIdMap.load(session)  # shared by all files
+    with FileManifest(force=force) as manifest:
+        if streaming:
+            # files are read row by row, one at a time
+            files = (
+                (
+                    exam_type,
+                    year,
+                    reader.read_file_chunks(
+                        file_path,
+                        exam_type,
+                        column_filter=TableSplitter.is_needed_column,
+                    ),
+                )
+                for exam_type, year, file_path in reader.list_files(
+                    file_filter=manifest.should_import
                 )
+            )
+        else:
+            # files are parsed in worker processes, results are written here one by one
+            files = (
+                (exam_type, year, [exam_data])
+                for exam_type, year, exam_data in reader.load_files_parallel(
+                    workers=workers,
+                    file_filter=manifest.should_import,
+                    digests=manifest.file_digests,
+                )
+            )
+        for exam_type, year, chunks in files:
+            try:
+                imported = import_exam_file(exam_type, year, chunks, school_ids)
+            except Exception as e:
+                logger.error(
+                    f"📛 Error importing {exam_type.name} data for year {year}: {e}"
+                )
+                continue
+            if imported is not None:
+                rows, results, unknown_schools = imported
+                manifest.record(exam_type, year, rows, results, unknown_schools)
+        if manifest.skipped:
+            logger.info(
+                f"⏭️ Skipped {manifest.skipped} unchanged files, use --force-excel to import them again"
+            )
+    school_ids.log_unmatched()
     logger.info("🎉 Excel data import completed")
 
 
@@ -112,13 +268,41 @@ def update_scoring():
 
 
 def main():
+    args = parse_args()
     configure_logging()
     logger.info("🛠️ Creating database and tables...")
     create_db_and_tables()
+    FreshLoader.restore_indexes(engine)
+    closed = DatabaseManagerBase.close_abandoned_dataset_versions(engine)
+    if closed:
+        logger.warning(f"⚠️ Closed {closed} dataset versions of interrupted runs")
+
+    if args.replay_dead_letters:  # pyright: ignore[reportAny]
+        dead_letter_importer(upsert=args.upsert)  # pyright: ignore[reportAny]
+        return
 
     logger.info("📥 Starting segmented schools data import...")
-    api_importer()
-    excel_importer()
+    if args.shards > 1:  # pyright: ignore[reportAny]
+        _ = sharded_import(
+            args.shards,  # pyright: ignore[reportAny]
+            replay=args.replay,  # pyright: ignore[reportAny]
+            upsert=args.upsert,  # pyright: ignore[reportAny]
+            delete_missing=args.delete_missing,  # pyright: ignore[reportAny]
+        )
+    else:
+        api_importer(
+            create_api_fetcher(args.replay),  # pyright: ignore[reportAny]
+            upsert=args.upsert,  # pyright: ignore[reportAny]
+            resume=args.resume,  # pyright: ignore[reportAny]
+            fresh_load=args.fresh,  # pyright: ignore[reportAny]
+            streaming=args.stream,  # pyright: ignore[reportAny]
+            delete_missing=args.delete_missing,  # pyright: ignore[reportAny]
+        )
+    excel_importer(
+        workers=args.excel_workers,  # pyright: ignore[reportAny]
+        force=args.force_excel,  # pyright: ignore[reportAny]
+        streaming=args.stream_excel,  # pyright: ignore[reportAny]
+    )
 
     logger.info("📊 Starting score calculation...")
     update_scoring()
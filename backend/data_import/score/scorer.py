@@ -1,30 +1,67 @@
 import logging
-from typing import cast
+import math
+from datetime import datetime
+from itertools import batched
+from typing import cast, override
 
-from sqlmodel import select
+from sqlalchemy import (
+    Engine,
+    Float,
+    Integer,
+    Update,
+    bindparam,
+    column,
+    func,
+    update,
+    values,
+)
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlmodel import col, select
 
 from app.models.exam_results import Przedmiot, WynikE8
 from app.models.schools import Szkola
-from data_import.core.config import ScoreType
+from app.models.sync import utc_now
+from data_import.core.config import ScoreSettings, ScoreType
 from data_import.score.types import WynikTable
 from data_import.utils.db.session import DatabaseManagerBase
 
 logger = logging.getLogger(__name__)
 
 
+def score_changed(current: float, score: float) -> bool:
+    """False when the scores differ only by float rounding"""
+    return not math.isclose(
+        current, score, rel_tol=ScoreSettings.TOLERANCE, abs_tol=ScoreSettings.TOLERANCE
+    )
+
+
 class Scorer(DatabaseManagerBase):
     _subject_weights_map: dict[str, float]
     _schools_ids: list[int]
     _subjects: list[Przedmiot]
-    _years_num: int = 0
     _table_type: type[WynikTable]
 
-    def __init__(self, score_type: ScoreType):
-        super().__init__()
+    def __init__(self, score_type: ScoreType, engine: Engine | None = None):
+        super().__init__(engine)
         self._subject_weights_map = score_type.subject_weights_map
         self._table_type = score_type.table_type
         self._schools_ids = []
         self._subjects = []
+        self._dataset_version: int | None = None
+
+    @property
+    def dataset_version(self) -> int:
+        """Dataset version stamped on schools whose score changed, opened on first write"""
+        if self._dataset_version is None:
+            self._dataset_version = self._open_dataset_version("scorer")
+        return self._dataset_version
+
+    @override
+    def close(self) -> None:
+        if self._dataset_version is not None:
+            self._close_dataset_version(self._dataset_version)
+            self._dataset_version = None
+        super().close()
 
     def _load_school_ids(self):
         session = self._ensure_session()
@@ -47,63 +84,110 @@ class Scorer(DatabaseManagerBase):
                 f"Not all subjects found in the database. Found: {self._subjects}. Expected: {subject_names}"
             )
 
-    def _get_number_of_years(self):
-        session = self._ensure_session()
-        years = session.exec(select(self._table_type.rok)).unique().all()
-        if not years:
-            raise ValueError("No years found in the database.")
-        self._years_num = len(years)
-
     def _initialize_required_data(self):
         self._load_school_ids()
         self._load_subjects()
-        self._get_number_of_years()  # count all distinct years from the table with scores
 
-    def _calculate_subject_score(self, subject: Przedmiot, school_id: int) -> float:
-        session = self._ensure_session()
-        statement = select(self._table_type).where(
-            self._table_type.szkola_id == school_id,
-            self._table_type.przedmiot_id == subject.id,
+    def _subject_means(self) -> list[tuple[int, int, float | None]]:
+        """
+        One aggregate query for all schools: (szkola_id, przedmiot_id, weighted mean) where the mean is
+        SUM(COALESCE(mediana, average) * liczba_zdajacych) / SUM(liczba_zdajacych) over all years
+        """
+        table = self._table_type
+        average = cast(
+            InstrumentedAttribute[float | None],
+            table.wynik_sredni if table is WynikE8 else table.sredni_wynik,  # pyright: ignore[reportAttributeAccessIssue]
         )
-        subject_results = session.exec(statement).all()
-        if not subject_results:
-            logger.warning(
-                f"🤔 No results found for school ID {school_id}, subject '{subject.nazwa}'. Assigning score 0 for this subject's contribution."
+        value = func.coalesce(col(table.mediana), average)
+        statement = (
+            select(
+                table.szkola_id,
+                table.przedmiot_id,
+                func.sum(value * col(table.liczba_zdajacych))
+                / func.nullif(func.sum(col(table.liczba_zdajacych)), 0),
+            )
+            .where(
+                col(table.przedmiot_id).in_([subject.id for subject in self._subjects]),
+                value.is_not(None),
             )
-            return 0
+            .group_by(col(table.szkola_id), col(table.przedmiot_id))
+            .order_by(col(table.szkola_id), col(table.przedmiot_id))
+        )
+        session = self._ensure_session()
+        return cast(list[tuple[int, int, float | None]], session.exec(statement).all())
+
+    def _final_scores(self) -> dict[int, float]:
+        """Weighted sum of subject scores of every school with results, 0 for a missing subject"""
+        weights = {
+            subject.id: self._subject_weights_map[subject.nazwa]
+            for subject in self._subjects
+        }
+        scores = dict.fromkeys(self._schools_ids, 0.0)
+        for school_id, subject_id, mean in self._subject_means():
+            if mean is not None:  # total liczba_zdajacych is 0
+                scores[school_id] += mean * weights[subject_id]
+        return scores
 
-        # there should be the same amount of records as years
-        if len(subject_results) != self._years_num:
-            logger.info(
-                f"🗓️ Data mismatch for school ID {school_id}, subject '{subject.nazwa}': Found {len(subject_results)} results, expected for {self._years_num} years. Proceeding with available data."
+    def _update_statement(
+        self, scores: list[tuple[int, float]], now: datetime
+    ) -> Update:
+        """UPDATE szkola ... FROM (VALUES (id, score), ...) for a batch of changed scores"""
+        new_scores = values(
+            column("id", Integer), column("score", Float), name="nowe_wyniki"
+        ).data(scores)
+        return (
+            update(Szkola)
+            .where(Szkola.id == new_scores.c.id)  # pyright: ignore[reportArgumentType]
+            .values(
+                score=new_scores.c.score,
+                wersja=self.dataset_version,
+                zaktualizowano=now,
             )
-        # calculate weighted median
-        numerator = 0.0
-        denominator = 0.0
-        for result in subject_results:
-            value = result.mediana
-            if (
-                value is None
-            ):  # if there is no median use sredni_wynik for WynikEM and wynik_sredni for WynikE8
-                value = cast(
-                    float,
-                    result.wynik_sredni
-                    if isinstance(result, WynikE8)
-                    else result.sredni_wynik,
-                )
-            numerator += value * result.liczba_zdajacych
-            denominator += result.liczba_zdajacych
+        )
 
-        if denominator == 0:
-            logger.warning(
-                f"🔢 Denominator is zero for school ID {school_id}, subject '{subject.nazwa}' (total 'liczba_zdajacych' is 0). Assigning score 0 for this subject."
+    def _executemany_statement(self, now: datetime) -> Update:
+        """UPDATE szkola ... WHERE id = :school_id, executed once per changed score"""
+        return (
+            update(Szkola)
+            .where(col(Szkola.id) == bindparam("school_id"))
+            .values(
+                score=bindparam("new_score"),
+                wersja=self.dataset_version,
+                zaktualizowano=now,
             )
-            return 0.0
+        )
 
-        return numerator / denominator
+    def _write_scores(self, scores: dict[int, float]) -> None:
+        """Update changed scores in batches, raises when a school was not updated"""
+        session = self._ensure_session()
+        connection = session.connection()
+        now = utc_now()
+        for batch in batched(
+            scores.items(), ScoreSettings.UPDATE_BATCH_SIZE, strict=False
+        ):
+            if self._engine.dialect.name == "postgresql":
+                result = connection.execute(self._update_statement(list(batch), now))
+            else:  # e.g. SQLite without VALUES column aliases, executemany by primary key
+                result = connection.execute(
+                    self._executemany_statement(now),
+                    [
+                        {"school_id": school_id, "new_score": score}
+                        for school_id, score in batch
+                    ],
+                )
+            if result.rowcount != len(batch):
+                # a school is gone, none of the batches are written
+                session.rollback()
+                raise RuntimeError(
+                    f"Updated scores of {result.rowcount} schools, expected {len(batch)}"
+                )
+        session.commit()
 
     def calculate_scores(self):
-        session = self._ensure_session()
+        """
+        Score every school with one aggregate query and write changed scores
+        with bulk UPDATEs, schools whose score didn't change keep their version
+        """
         try:
             self._initialize_required_data()
         except ValueError as e:
@@ -111,22 +195,23 @@ class Scorer(DatabaseManagerBase):
                 f"⚙️ Initialization error: {e}. Aborting school scoring process."
             )
             return
-        # then get all records for specific school and specific subject -> calculate score for this subject
-        for id in self._schools_ids:
-            final_score = 0.0  # final score for every school after calculating results from all subjects
-            for subject in self._subjects:
-                subject_score = self._calculate_subject_score(subject, id)
-                weight = self._subject_weights_map[subject.nazwa]
-                final_score += subject_score * weight
-            school = self._select_where(Szkola, Szkola.id == id)
-            if not school:
+        scores = self._final_scores()
+
+        session = self._ensure_session()
+        current = dict(session.exec(select(Szkola.id, Szkola.score)).all())
+        changed: dict[int, float] = {}
+        unchanged = 0
+        for school_id, score in scores.items():
+            if school_id not in current:
                 logger.error(
-                    f"🔍 School with ID {id} not found in database. Cannot update score."
+                    f"🔍 School with ID {school_id} not found in database. Cannot update score."
                 )
-                continue
-            school.score = final_score
-            session.add(school)
-            session.commit()
-            logger.info(
-                f"🎯 Score updated for school (RSPO: {school.numer_rspo}): {final_score:.2f}"
-            )
+            elif score_changed(current[school_id], score):
+                changed[school_id] = score
+            else:
+                unchanged += 1  # nothing changed, don't bump the school version
+        if changed:
+            self._write_scores(changed)
+        logger.info(
+            f"🎯 Scores updated for {len(changed)} schools ({unchanged} unchanged)"
+        )
@@ -1,10 +1,11 @@
 from types import TracebackType
-from typing import Self
+from typing import Self, cast
 
 from sqlalchemy import BinaryExpression, Engine
-from sqlmodel import Session, SQLModel, select
+from sqlmodel import Session, SQLModel, col, select, update
 
-from app.core.database import engine
+from app.core import database
+from app.models.sync import WersjaDanych, utc_now
 
 
 class DatabaseManagerBase:
@@ -13,8 +14,9 @@ class DatabaseManagerBase:
     _engine: Engine
     _session: Session | None
 
-    def __init__(self):
-        self._engine = engine
+    def __init__(self, engine: Engine | None = None):
+        """engine defaults to the application's database, tests pass their own"""
+        self._engine = engine if engine is not None else database.engine
         self._session = None
 
     def __enter__(self) -> Self:
@@ -49,3 +51,40 @@ class DatabaseManagerBase:
         """Generic method to select a record based on a condition"""
         session = self._ensure_session()
         return session.exec(select(model).where(condition)).first()
+
+    def _open_dataset_version(self, source: str) -> int:
+        """
+        Open a new dataset version in its own transaction,
+        so it is visible (as unfinished) before any data stamped with it is committed
+        """
+        with Session(self._engine) as session:
+            version = WersjaDanych(zrodlo=source)
+            session.add(version)
+            session.commit()
+            session.refresh(version)
+            return cast(int, version.id)
+
+    def _close_dataset_version(self, version_id: int) -> None:
+        """Mark the dataset version as finished"""
+        with Session(self._engine) as session:
+            version = session.get(WersjaDanych, version_id)
+            if version:
+                version.zakonczono = utc_now()
+                session.add(version)
+                session.commit()
+
+    @staticmethod
+    def close_abandoned_dataset_versions(engine: Engine) -> int:
+        """
+        Close versions left open by runs which were killed before finishing,
+        called on startup, when no other import or scoring run is writing.
+        Nothing is stamped with them anymore, so clients may sync past them.
+        Returns the number of closed versions.
+        """
+        with engine.begin() as connection:
+            result = connection.execute(
+                update(WersjaDanych)
+                .where(col(WersjaDanych.zakonczono).is_(None))
+                .values(zakonczono=utc_now())
+            )
+            return result.rowcount
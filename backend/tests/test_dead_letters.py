@@ -0,0 +1,54 @@
+import copy
+from pathlib import Path
+from typing import cast
+
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.models.schools import Szkola
+from data_import.api.db.decomposer import Decomposer
+from data_import.api.dead_letters import DeadLetterStore
+from data_import.api.types import APIResponse, SchoolDict
+
+
+def test_failed_schools_are_stored_and_replayed(
+    tmp_path: Path, engine: Engine, recorded_page: APIResponse
+):
+    schools_data = cast(list[SchoolDict], recorded_page["hydra:member"])
+    invalid_school = copy.deepcopy(schools_data[1])
+    invalid_school["numerRspo"] = 50001
+    del invalid_school["regon"]
+    dead_letters = DeadLetterStore(tmp_path / "dead_letters.jsonl")
+
+    schools, errors = Decomposer.validate_schools_data([*schools_data, invalid_school])
+    for error in errors:
+        dead_letters.add_validation_error(error)
+    schools[2].regon = schools[0].regon  # violates the unique constraint
+    raw_schools = Decomposer.raw_schools_by_rspo(schools_data)
+    with Decomposer(dead_letters=dead_letters, engine=engine) as decomposer:
+        assert len(decomposer.decompose_schools(schools, raw_schools=raw_schools)) == 1
+
+    letters = dead_letters.load()
+    assert [(letter.rspo, letter.stage) for letter in letters] == [
+        (50001, DeadLetterStore.VALIDATION),
+        (31577, DeadLetterStore.PROCESSING),
+    ]
+    # the payload as received from the API, not the validated school
+    assert letters[1].payload == schools_data[2]
+
+    # after the fix only the failed schools are imported again
+    letters = dead_letters.take()
+    letters[1].payload["regon"] = schools_data[2]["regon"]
+    schools, errors = Decomposer.validate_schools_data(
+        [letter.payload for letter in letters]
+    )
+    for error in errors:
+        dead_letters.add_validation_error(error)
+    with Decomposer(dead_letters=dead_letters, engine=engine) as decomposer:
+        assert decomposer.decompose_schools(schools) == []
+    dead_letters.finish_replay()
+
+    assert [letter.rspo for letter in dead_letters.load()] == [50001]
+    assert not dead_letters.replay_path.exists()
+    with Session(engine) as session:
+        assert len(session.exec(select(Szkola)).all()) == 4
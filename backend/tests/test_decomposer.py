@@ -0,0 +1,213 @@
+import copy
+from collections.abc import Iterator
+from typing import cast
+
+import pytest
+from sqlalchemy import Engine, event
+from sqlmodel import Session, select
+
+from app.models.exam_results import Przedmiot, WynikE8
+from app.models.locations import Miejscowosc
+from app.models.schools import EtapEdukacji, Szkola
+from app.models.sync import ZaimportowanyPlik
+from data_import.api.db.decomposer import Decomposer
+from data_import.api.db.lookup_cache import (
+    EDUCATIONAL_MODELS,
+    LOCATION_MODELS,
+    LookupCache,
+)
+from data_import.api.models import SzkolaAPIResponse
+from data_import.api.types import APIResponse, SchoolDict
+from data_import.core.config import APISettings
+
+
+@pytest.fixture
+def decomposer(engine: Engine) -> Iterator[Decomposer]:
+    with Decomposer(engine=engine) as decomposer:
+        yield decomposer
+
+
+def test_failing_school_is_isolated_from_its_batch(
+    engine: Engine, decomposer: Decomposer, recorded_schools: list[SzkolaAPIResponse]
+):
+    # violates the unique constraint
+    recorded_schools[2].regon = recorded_schools[0].regon
+
+    errors = decomposer.decompose_schools(
+        recorded_schools, batch_size=len(recorded_schools)
+    )
+
+    assert [error.rspo for error in errors] == [31577]
+    with Session(engine) as session:
+        saved = session.exec(select(Szkola.numer_rspo)).all()
+        assert sorted(saved) == [2045, 21305, 40123]
+
+
+def test_duplicated_school_is_saved_once(
+    engine: Engine, decomposer: Decomposer, recorded_schools: list[SzkolaAPIResponse]
+):
+    duplicate = recorded_schools[0].model_copy(update={"nazwa": "Nowa nazwa"})
+
+    errors = decomposer.decompose_schools(
+        [*recorded_schools, duplicate], batch_size=len(recorded_schools) + 1
+    )
+
+    assert errors == []
+    assert str(decomposer.write_counts) == "4 inserted, 0 updated, 1 unchanged"
+    with Session(engine) as session:
+        school = session.exec(select(Szkola).where(Szkola.numer_rspo == 2045)).one()
+        assert school.nazwa == "Nowa nazwa"  # the last copy wins
+
+
+def test_validation_leaves_raw_payloads_unchanged(recorded_page: APIResponse):
+    schools_data = copy.deepcopy(cast(list[SchoolDict], recorded_page["hydra:member"]))
+    del schools_data[1]["regon"]
+    raw = copy.deepcopy(schools_data)
+
+    schools, errors = Decomposer.validate_schools_data(schools_data)
+    assert (len(schools), len(errors)) == (len(raw) - 1, 1)
+    assert schools_data == raw  # e.g. empty strings were not replaced with None
+
+
+def test_existing_schools_are_skipped(
+    engine: Engine, decomposer: Decomposer, recorded_schools: list[SzkolaAPIResponse]
+):
+    assert decomposer.decompose_schools(recorded_schools[:2]) == []
+    assert decomposer.decompose_schools(recorded_schools) == []
+
+    statements: list[str] = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda *args: statements.append(args[2]),  # pyright: ignore[reportUnknownLambdaType, reportUnknownArgumentType]
+    )
+    assert decomposer.decompose_schools(recorded_schools) == []
+
+    # all schools exist, so only one bulk existence query is run
+    assert len(statements) == 1
+    assert "szkola.numer_rspo IN" in statements[0]
+    with Session(engine) as session:
+        assert len(session.exec(select(Szkola)).all()) == 4
+
+
+def test_warmed_up_caches_reuse_existing_entities(
+    engine: Engine, decomposer: Decomposer, recorded_schools: list[SzkolaAPIResponse]
+):
+    assert decomposer.decompose_schools(recorded_schools[:1]) == []
+
+    with Decomposer(engine=engine) as next_decomposer:
+        next_decomposer.warm_up_caches()
+        assert next_decomposer.lookup_cache.is_complete(Miejscowosc)
+        assert next_decomposer.lookup_cache.get(Miejscowosc, "0918123") is not None
+        assert next_decomposer.decompose_schools(recorded_schools[1:]) == []
+
+    with Session(engine) as session:
+        assert len(session.exec(select(Miejscowosc)).all()) == 2
+        assert len(session.exec(select(EtapEdukacji)).all()) == 4
+
+
+def test_lookup_cache_is_shared_between_segments(
+    engine: Engine, recorded_schools: list[SzkolaAPIResponse]
+):
+    lookup_cache = LookupCache()
+    for segment in (recorded_schools[:2], recorded_schools[2:]):
+        with Decomposer(lookup_cache, engine=engine) as decomposer:
+            assert decomposer.decompose_schools(segment) == []
+
+    with Session(engine) as session:
+        # every lookup entity missed the cache only once - when it was created
+        lookup_rows = sum(
+            len(session.exec(select(model)).all())
+            for model in (*LOCATION_MODELS, *EDUCATIONAL_MODELS)
+        )
+        assert lookup_cache.misses == lookup_rows == 19
+
+        school = session.exec(select(Szkola).where(Szkola.numer_rspo == 31577)).one()
+        assert school.miejscowosc.nazwa == "Warszawa"
+        assert [training.nazwa for training in school.ksztalcenie_zawodowe] == [
+            "technik informatyk",
+            "technik teleinformatyk",
+        ]
+
+
+def test_upsert_updates_only_changed_schools(
+    engine: Engine, recorded_schools: list[SzkolaAPIResponse]
+):
+    with Decomposer(upsert=True, engine=engine) as decomposer:
+        assert decomposer.decompose_schools(recorded_schools) == []
+    assert str(decomposer.write_counts) == "4 inserted, 0 updated, 0 unchanged"
+
+    changed = [school.model_copy(deep=True) for school in recorded_schools]
+    changed[0].liczba_uczniow = 999
+    changed[2].ksztalcenie_zawodowe = {"1": "technik informatyk"}
+    with Decomposer(upsert=True, engine=engine) as decomposer:
+        assert decomposer.decompose_schools(changed) == []
+    assert str(decomposer.write_counts) == "0 inserted, 2 updated, 2 unchanged"
+
+    with Session(engine) as session:
+        updated = session.exec(select(Szkola).where(Szkola.numer_rspo == 2045)).one()
+        unchanged = session.exec(select(Szkola).where(Szkola.numer_rspo == 21305)).one()
+        assert updated.liczba_uczniow == 999
+        assert updated.wersja > updated.wersja_utworzenia
+        assert unchanged.wersja == unchanged.wersja_utworzenia
+
+        school = session.exec(select(Szkola).where(Szkola.numer_rspo == 31577)).one()
+        assert [training.nazwa for training in school.ksztalcenie_zawodowe] == [
+            "technik informatyk"
+        ]
+        assert len(session.exec(select(Szkola)).all()) == 4
+
+
+def test_missing_schools_are_not_deleted_above_the_share_limit(
+    engine: Engine,
+    decomposer: Decomposer,
+    recorded_schools: list[SzkolaAPIResponse],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    assert decomposer.decompose_schools(recorded_schools) == []
+    seen = {school.numer_rspo for school in recorded_schools[1:]}
+
+    monkeypatch.setattr(APISettings, "MAX_DELETED_SHARE", 0.2)
+    assert decomposer.delete_missing_schools(seen) == 0  # 1 of 4 schools is missing
+    monkeypatch.setattr(APISettings, "MAX_DELETED_SHARE", 0.25)
+    assert decomposer.delete_missing_schools(seen) == 1
+
+    with Session(engine) as session:
+        assert sorted(session.exec(select(Szkola.numer_rspo)).all()) == sorted(seen)
+
+
+def test_deleted_schools_forget_their_result_files(
+    engine: Engine, decomposer: Decomposer, recorded_schools: list[SzkolaAPIResponse]
+):
+    assert decomposer.decompose_schools(recorded_schools) == []
+    with Session(engine) as session:
+        school = session.exec(select(Szkola).where(Szkola.numer_rspo == 2045)).one()
+        subject = Przedmiot(nazwa="matematyka")
+        session.add(subject)
+        session.flush()
+        session.add(
+            WynikE8(
+                szkola_id=cast(int, school.id),
+                przedmiot_id=cast(int, subject.id),
+                rok=2023,
+                liczba_zdajacych=20,
+                wynik_sredni=60.0,
+            )
+        )
+        for year in (2023, 2024):
+            session.add(
+                ZaimportowanyPlik(
+                    typ_egzaminu="E8",
+                    rok=year,
+                    hash_pliku="hash",
+                    liczba_wierszy=1,
+                    liczba_wynikow=1,
+                )
+            )
+        session.commit()
+
+    assert decomposer.delete_schools([2045]) == 1
+
+    # the file of 2023 is imported again if the school comes back
+    with Session(engine) as session:
+        assert session.exec(select(ZaimportowanyPlik.rok)).all() == [2024]
@@ -0,0 +1,153 @@
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import override
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from data_import.core.config import ExamType, ExcelFile
+from data_import.excel.parse_cache import ParsedExcelCache
+from data_import.excel.reader import ExcelReader
+
+
+def write_e8_file(path: Path, rows: list[list[object]]) -> None:
+    """Minimal E8 results file with the two-level header of CKE sheets"""
+    workbook = Workbook()
+    sheet = workbook.active
+    assert sheet is not None
+    sheet.title = ExcelFile.SHEET_NAME
+    sheet.append(["", "matematyka", "matematyka", "matematyka"])
+    sheet.append(["RSPO", "liczba zdających", "wynik średni (%)", "mediana (%)"])
+    for row in rows:
+        sheet.append(row)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(path)
+
+
+def test_parsed_sheets_are_cached_by_content(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    file_path = tmp_path / "E8_data" / "2024.xlsx"
+    write_e8_file(file_path, [[2045, 30, 55.5, 60.0], [21305, 12, 48.0, None]])
+    cache = ParsedExcelCache(tmp_path / "cache")
+    reader = ExcelReader(tmp_path, parse_cache=cache)
+
+    [(year, parsed)] = list(reader.load_files(ExamType.E8))
+    assert year == 2024
+    assert parsed[("matematyka", "liczba zdających")].tolist() == [30, 12]
+
+    def read_excel(*_: object, **__: object) -> pd.DataFrame:
+        raise AssertionError("an unchanged file should not be parsed again")
+
+    monkeypatch.setattr(pd, "read_excel", read_excel)
+    [(_, cached)] = list(reader.load_files(ExamType.E8))
+    pd.testing.assert_frame_equal(cached, parsed)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    monkeypatch.undo()
+    write_e8_file(file_path, [[2045, 31, 55.5, 60.0]])  # corrected file
+    [(_, reparsed)] = list(reader.load_files(ExamType.E8))
+    assert reparsed[("matematyka", "liczba zdających")].tolist() == [31]
+    assert cache.misses == 2
+
+
+def test_files_are_parsed_in_worker_processes(tmp_path: Path):
+    for year in (2024, 2022, 2023):
+        write_e8_file(tmp_path / "E8_data" / f"{year}.xlsx", [[2045, year, 50.0, 50.0]])
+    _ = (tmp_path / "E8_data" / "notes.xlsx").write_bytes(b"")  # not a year, skipped
+    cache = ParsedExcelCache(tmp_path / "cache")
+    reader = ExcelReader(tmp_path, parse_cache=cache)
+
+    loaded = list(reader.load_files_parallel([ExamType.E8, ExamType.EM], workers=2))
+
+    assert [(exam_type, year) for exam_type, year, _ in loaded] == [
+        (ExamType.E8, 2022),
+        (ExamType.E8, 2023),
+        (ExamType.E8, 2024),
+    ]
+    assert [df[("matematyka", "liczba zdających")].tolist() for *_, df in loaded] == [
+        [2022],
+        [2023],
+        [2024],
+    ]
+    # the parent counts sheets loaded from the cache by the workers
+    assert (cache.hits, cache.misses) == (0, 3)
+    _ = list(reader.load_files_parallel([ExamType.E8], workers=2))
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_files_hashed_before_are_not_hashed_again(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    file_path = tmp_path / "E8_data" / "2024.xlsx"
+    write_e8_file(file_path, [[2045, 30, 55.5, 60.0]])
+    digest = ParsedExcelCache.file_digest(file_path)  # e.g. by FileManifest
+    reader = ExcelReader(tmp_path, parse_cache=ParsedExcelCache(tmp_path / "cache"))
+
+    def file_digest(_: Path) -> str:
+        raise AssertionError("the file was already hashed")
+
+    monkeypatch.setattr(ParsedExcelCache, "file_digest", staticmethod(file_digest))
+    [(_, year, _)] = list(
+        reader.load_files_parallel(
+            [ExamType.E8], workers=1, digests={file_path: digest}
+        )
+    )
+    assert year == 2024
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Threads in place of worker processes, counting the submitted files"""
+
+    submitted: int = 0
+
+    @override
+    def submit[**P, T](
+        self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> Future[T]:
+        CountingExecutor.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_parallel_parsing_keeps_a_bounded_window_of_files(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    years = range(2018, 2025)
+    for year in years:
+        write_e8_file(tmp_path / "E8_data" / f"{year}.xlsx", [[2045, year, 50.0, 50.0]])
+    monkeypatch.setattr(
+        "data_import.excel.reader.ProcessPoolExecutor", CountingExecutor
+    )
+    monkeypatch.setattr(CountingExecutor, "submitted", 0)
+    reader = ExcelReader(tmp_path, parse_cache=ParsedExcelCache(tmp_path / "cache"))
+
+    loaded = reader.load_files_parallel([ExamType.E8], workers=2)
+    assert next(loaded)[1] == 2018
+    assert CountingExecutor.submitted == 3  # the other files wait for a free slot
+    assert [year for _, year, _ in loaded] == list(years)[1:]
+    assert CountingExecutor.submitted == len(years)
+
+
+def test_sheets_are_streamed_in_chunks(tmp_path: Path):
+    file_path = tmp_path / "E8_data" / "2024.xlsx"
+    write_e8_file(file_path, [[1, 30, 55.5, 60.0], [2, 12, 48.0, None], [3, 8, 40, 41]])
+    reader = ExcelReader(tmp_path, parse_cache=ParsedExcelCache(tmp_path / "cache"))
+
+    chunks = list(
+        reader.read_file_chunks(
+            file_path,
+            ExamType.E8,
+            chunk_rows=2,
+            column_filter=lambda column: column[1] != "mediana (%)",
+        )
+    )
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    streamed = pd.concat(chunks, ignore_index=True)
+    parsed = reader.read_file(file_path, ExamType.E8).drop(
+        columns=[("matematyka", "mediana (%)")]
+    )
+    assert list(streamed.columns) == list(parsed.columns)
+    assert streamed.astype(float).equals(parsed.astype(float))
@@ -0,0 +1,193 @@
+import copy
+import json
+import threading
+import time
+from collections.abc import Iterator
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from data_import.api.exceptions import SchoolsDataError
+from data_import.api.fetcher import ReplayFetcher, SchoolsAPIFetcher
+from data_import.api.page_cache import PageCache
+from data_import.core.config import APISettings, RetrySettings, ThrottleSettings
+
+TOTAL_PAGES = 8
+LATENCY = 0.1
+
+
+def make_page(recorded_page: bytes, page: int) -> bytes:
+    """Recorded Hydra page renumbered as the page-th page out of TOTAL_PAGES"""
+    data = json.loads(recorded_page)
+    members = copy.deepcopy(data["hydra:member"])
+    for index, member in enumerate(members):
+        member["numerRspo"] = page * 100 + index
+    data["hydra:member"] = members
+    data["hydra:view"]["@id"] = f"/api/placowki/?page={page}"
+    data["hydra:view"]["hydra:last"] = f"/api/placowki/?page={TOTAL_PAGES}"
+    if page < TOTAL_PAGES:
+        data["hydra:view"]["hydra:next"] = f"/api/placowki/?page={page + 1}"
+    return json.dumps(data).encode()
+
+
+class StubHydraHandler(BaseHTTPRequestHandler):
+    protocol_version: str = "HTTP/1.1"  # keep-alive
+    overloaded_requests: int = 0  # the next requests are answered with 429
+    broken_requests: int = 0  # the next requests are answered with half of a page
+    requests: int = 0  # requests received
+    recorded_page: bytes = b""  # body every served page is made of
+
+    def do_GET(self):  # noqa: N802
+        page = int(parse_qs(urlparse(self.path).query)["page"][0])
+        StubHydraHandler.requests += 1
+        time.sleep(LATENCY)
+        if StubHydraHandler.overloaded_requests > 0:
+            StubHydraHandler.overloaded_requests -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = make_page(StubHydraHandler.recorded_page, page)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/ld+json")
+        self.send_header("Content-Length", str(len(body)))
+        if StubHydraHandler.broken_requests > 0:  # the connection breaks mid-body
+            StubHydraHandler.broken_requests -= 1
+            self.send_header("Connection", "close")
+            self.end_headers()
+            _ = self.wfile.write(body[: len(body) // 2])
+            return
+        self.end_headers()
+        _ = self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture(scope="module")
+def api_url(recorded_page_bytes: bytes) -> Iterator[str]:
+    StubHydraHandler.recorded_page = recorded_page_bytes
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHydraHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/api/placowki/"
+    server.shutdown()
+
+
+def fetch_all(fetcher: SchoolsAPIFetcher, max_schools: int) -> list[list[int]]:
+    """Fetch every segment and return RSPO numbers of each of them"""
+    segments: list[list[int]] = []
+    page: int | None = 1
+    while page:
+        schools, page = fetcher.fetch_schools_segment(page, max_schools=max_schools)
+        segments.append([int(school["numerRspo"]) for school in schools])  # pyright: ignore[reportArgumentType]
+    return segments
+
+
+def test_concurrent_fetch_preserves_page_order(api_url: str):
+    start = time.perf_counter()
+    sequential = fetch_all(SchoolsAPIFetcher(api_url, concurrency=1), max_schools=12)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = fetch_all(SchoolsAPIFetcher(api_url, concurrency=4), max_schools=12)
+    concurrent_time = time.perf_counter() - start
+
+    assert concurrent == sequential
+    assert [len(segment) for segment in concurrent] == [12, 12, 8]
+    assert concurrent[0][:4] == [100, 101, 102, 103]
+    assert concurrent_time < sequential_time * 0.75
+
+
+def test_segment_resumes_from_next_page(api_url: str):
+    fetcher = SchoolsAPIFetcher(api_url, concurrency=4)
+    schools, next_page = fetcher.fetch_schools_segment(3, max_schools=8)
+    assert len(schools) == 8
+    assert next_page == 5
+    assert fetcher.last_page == TOTAL_PAGES
+
+
+def test_connections_are_reused(api_url: str):
+    fetcher = SchoolsAPIFetcher(api_url, concurrency=1)
+    _ = fetcher.fetch_schools_segment(1, max_schools=12)
+    assert fetcher.stats.requests == 3
+    assert fetcher.stats.new_connections == 1
+    assert fetcher.stats.ttfb >= 3 * LATENCY
+
+
+def test_overload_response_slows_down_the_crawl(api_url: str):
+    StubHydraHandler.overloaded_requests = 1
+    fetcher = SchoolsAPIFetcher(api_url, concurrency=1)
+    start = time.perf_counter()
+    schools, _ = fetcher.fetch_schools_segment(1, max_schools=4)
+
+    assert len(schools) == 4
+    assert time.perf_counter() - start >= 1  # Retry-After was honored
+    assert fetcher.throttle.overloads == 1
+    assert fetcher.throttle.backoff == pytest.approx(1, abs=0.1)  # pyright: ignore[reportUnknownMemberType]
+    assert fetcher.throttle.rate < ThrottleSettings.INITIAL_RATE
+    assert fetcher.circuit_breaker.opened == 0
+
+
+def test_streamed_schools_match_fetched_segments(api_url: str):
+    segments = fetch_all(SchoolsAPIFetcher(api_url, concurrency=4), max_schools=12)
+    fetcher = SchoolsAPIFetcher(api_url)
+    streamed = [
+        (page, int(school["numerRspo"]))  # pyright: ignore[reportArgumentType]
+        for page, school in fetcher.stream_schools(1)
+    ]
+
+    assert [rspo for _, rspo in streamed] == [
+        rspo for segment in segments for rspo in segment
+    ]
+    assert streamed[4] == (2, 200)
+    assert fetcher.last_page == TOTAL_PAGES
+
+
+def test_streamed_pages_are_cached_and_timed(api_url: str, tmp_path: Path):
+    run_date = date(2025, 4, 1)  # pages are cached under the date the run started
+    fetched_cache = PageCache(tmp_path / "fetched")
+    fetcher = SchoolsAPIFetcher(
+        api_url, concurrency=4, page_cache=fetched_cache, run_date=run_date
+    )
+    _ = fetch_all(fetcher, max_schools=12)
+    streamed_cache = PageCache(tmp_path / "streamed")
+    fetcher = SchoolsAPIFetcher(api_url, page_cache=streamed_cache, run_date=run_date)
+    streamed = [school for _, school in fetcher.stream_schools(1)]
+
+    assert streamed_cache.fetch_dates() == ["2025-04-01"]
+    for page in range(1, TOTAL_PAGES + 1):
+        assert streamed_cache.load(page, "2025-04-01") == fetched_cache.load(
+            page, "2025-04-01"
+        )
+    assert fetcher.stats.requests == TOTAL_PAGES
+    assert fetcher.stats.ttfb >= TOTAL_PAGES * LATENCY
+    assert fetcher.stats.size > 0
+
+    replayed = [school for _, school in ReplayFetcher(streamed_cache).stream_schools(1)]
+    assert replayed == streamed
+
+
+def test_broken_streams_share_the_retry_budget(
+    api_url: str, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(RetrySettings, "INITIAL_DELAY", 0)
+    monkeypatch.setattr(RetrySettings, "MAX_RETRIES", 3)
+    monkeypatch.setattr(APISettings, "PAGE_LIMIT", 1)
+
+    # the page is requested again and schools yielded before the break are skipped
+    StubHydraHandler.requests, StubHydraHandler.broken_requests = 0, 2
+    fetcher = SchoolsAPIFetcher(api_url)
+    streamed = [int(school["numerRspo"]) for _, school in fetcher.stream_schools(1)]  # pyright: ignore[reportArgumentType]
+    assert streamed == [100, 101, 102, 103]
+    assert StubHydraHandler.requests == 3
+
+    # the page is given up after MAX_RETRIES requests in total
+    StubHydraHandler.requests, StubHydraHandler.broken_requests = 0, 3
+    with pytest.raises(SchoolsDataError):
+        _ = list(SchoolsAPIFetcher(api_url).stream_schools(1))
+    assert StubHydraHandler.requests == 3
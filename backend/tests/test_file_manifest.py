@@ -0,0 +1,89 @@
+from pathlib import Path
+
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.models.schools import Szkola
+from app.models.sync import ZaimportowanyPlik
+from data_import.core.config import ExamType
+from data_import.excel.db.file_manifest import FileManifest
+from data_import.excel.parse_cache import ParsedExcelCache
+
+
+def manifest(engine: Engine, force: bool = False) -> FileManifest:
+    return FileManifest(force=force, engine=engine)
+
+
+def test_unchanged_files_are_skipped(engine: Engine, tmp_path: Path):
+    file_path = tmp_path / "2024.xlsx"
+    _ = file_path.write_bytes(b"results of 2024")
+
+    with manifest(engine) as first_run:
+        assert first_run.should_import(ExamType.E8, 2024, file_path)
+        first_run.record(ExamType.E8, 2024, rows=10, results=25)
+        # passed on to the reader, which doesn't hash the file again
+        assert first_run.file_digests == {
+            file_path: ParsedExcelCache.file_digest(file_path)
+        }
+
+    with manifest(engine) as second_run:
+        assert not second_run.should_import(ExamType.E8, 2024, file_path)
+        assert second_run.should_import(ExamType.EM, 2024, file_path)
+        assert second_run.skipped == 1
+
+    with manifest(engine, force=True) as forced_run:
+        assert forced_run.should_import(ExamType.E8, 2024, file_path)
+
+    _ = file_path.write_bytes(b"corrected results of 2024")
+    with manifest(engine) as corrected_run:
+        assert corrected_run.should_import(ExamType.E8, 2024, file_path)
+        corrected_run.record(ExamType.E8, 2024, rows=10, results=26)
+
+    with Session(engine) as session:
+        [entry] = session.exec(select(ZaimportowanyPlik)).all()
+    assert (entry.typ_egzaminu, entry.rok, entry.liczba_wynikow) == ("E8", 2024, 26)
+
+
+def add_school(engine: Engine, rspo: int, version: int) -> None:
+    with Session(engine) as session:
+        session.add(
+            Szkola(
+                numer_rspo=rspo,
+                nazwa=f"Szkoła {rspo}",
+                regon=str(rspo),
+                kod_pocztowy="00-001",
+                geolokalizacja_latitude=52.0,
+                geolokalizacja_longitude=21.0,
+                wersja=version,
+                wersja_utworzenia=version,
+            )
+        )
+        session.commit()
+
+
+def test_files_with_unknown_schools_are_imported_after_new_schools(
+    engine: Engine, tmp_path: Path
+):
+    add_school(engine, 1, version=1)
+    complete_file = tmp_path / "2023.xlsx"
+    incomplete_file = tmp_path / "2024.xlsx"
+    _ = complete_file.write_bytes(b"results of 2023")
+    _ = incomplete_file.write_bytes(b"results of 2024")
+
+    with manifest(engine) as first_run:
+        assert first_run.should_import(ExamType.E8, 2023, complete_file)
+        first_run.record(ExamType.E8, 2023, rows=1, results=2)
+        assert first_run.should_import(ExamType.E8, 2024, incomplete_file)
+        first_run.record(ExamType.E8, 2024, rows=2, results=2, unknown_schools=1)
+
+    with manifest(engine) as unchanged_run:
+        assert not unchanged_run.should_import(ExamType.E8, 2024, incomplete_file)
+
+    add_school(engine, 2, version=2)
+    with manifest(engine) as second_run:
+        assert not second_run.should_import(ExamType.E8, 2023, complete_file)
+        assert second_run.should_import(ExamType.E8, 2024, incomplete_file)
+        second_run.record(ExamType.E8, 2024, rows=2, results=4, unknown_schools=0)
+
+    with manifest(engine) as third_run:
+        assert not third_run.should_import(ExamType.E8, 2024, incomplete_file)
@@ -0,0 +1,63 @@
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import Engine, insert, inspect
+from sqlmodel import Session, SQLModel, col, select
+
+from app.models.locations import Miejscowosc
+from app.models.schools import Szkola
+from data_import.api.db.decomposer import SchoolRow
+from data_import.api.db.fresh_loader import FreshLoader, copy_value
+from data_import.api.models import SzkolaAPIResponse
+
+
+def test_values_are_escaped_for_copy():
+    assert copy_value(None) == "\\N"
+    assert copy_value(True) == "t"
+    assert copy_value("a\tb\\c\nd") == "a\\tb\\\\c\\nd"
+    assert copy_value(datetime(2025, 4, 1, tzinfo=UTC)) == "2025-04-01T00:00:00+00:00"
+
+
+def test_fresh_load_assigns_ids_in_memory(
+    engine: Engine,
+    monkeypatch: pytest.MonkeyPatch,
+    recorded_schools: list[SzkolaAPIResponse],
+):
+    # SQLite has no COPY, rows are inserted instead
+    def copy(loader: FreshLoader, model: type[SQLModel], rows: list[SchoolRow]):
+        if rows:
+            _ = loader._ensure_session().connection().execute(insert(model), rows)  # pyright: ignore[reportPrivateUsage]
+
+    monkeypatch.setattr(FreshLoader, "_copy", copy)
+    monkeypatch.setattr(FreshLoader, "_reset_sequences", lambda _: None)
+    indexes = len(inspect(engine).get_indexes("szkola"))
+
+    with FreshLoader(engine=engine) as loader:
+        assert loader.prepare()
+        # only the unique index is kept during the load
+        kept = [index["name"] for index in inspect(engine).get_indexes("szkola")]
+        assert kept == ["ix_szkola_numer_rspo"]
+        assert loader.decompose_schools(recorded_schools[:2]) == []
+        assert loader.decompose_schools(recorded_schools) == []
+    assert str(loader.write_counts) == "4 inserted, 0 updated, 2 unchanged"
+    assert len(inspect(engine).get_indexes("szkola")) == indexes
+
+    with Session(engine) as session:
+        ids = session.exec(select(Szkola.id).order_by(col(Szkola.id))).all()
+        assert ids == [1, 2, 3, 4]
+        assert len(session.exec(select(Miejscowosc)).all()) == 2
+        school = session.exec(select(Szkola).where(Szkola.numer_rspo == 31577)).one()
+        assert school.miejscowosc.nazwa == "Warszawa"
+        assert len(school.ksztalcenie_zawodowe) == 2
+
+    with FreshLoader(engine=engine) as loader:
+        assert not loader.prepare()  # schools were already loaded
+
+
+def test_indexes_dropped_by_a_killed_load_are_restored(engine: Engine):
+    indexes = len(inspect(engine).get_indexes("szkola"))
+    loader = FreshLoader(engine=engine)
+    assert loader.prepare()  # killed before close() built the indexes again
+
+    FreshLoader.restore_indexes(engine)
+    assert len(inspect(engine).get_indexes("szkola")) == indexes
@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from data_import.api.exceptions import SchoolsDataError
+from data_import.api.fetcher import ReplayFetcher
+from data_import.api.page_cache import PageCache
+from data_import.api.types import APIResponse
+
+
+def test_pages_are_stored_once_per_content(tmp_path: Path, recorded_page: APIResponse):
+    cache = PageCache(tmp_path)
+
+    first = cache.store(1, recorded_page, fetch_date=date(2025, 4, 1))
+    second = cache.store(1, recorded_page, fetch_date=date(2025, 4, 2))
+
+    assert first == second
+    assert len(list((tmp_path / "objects").rglob("*.json.gz"))) == 1
+    assert cache.fetch_dates() == ["2025-04-01", "2025-04-02"]
+    assert cache.resolve_date(PageCache.LATEST) == "2025-04-02"
+    assert cache.load(1, "2025-04-01") == recorded_page
+    assert cache.load(2, "2025-04-01") is None
+
+
+def test_replay_fetcher_serves_cached_pages(tmp_path: Path, recorded_page: APIResponse):
+    cache = PageCache(tmp_path)
+    _ = cache.store(1, recorded_page, fetch_date=date(2025, 4, 1))
+
+    fetcher = ReplayFetcher(cache)
+    schools, next_page = fetcher.fetch_schools_segment(1)
+    assert schools == recorded_page["hydra:member"]
+    assert next_page is None
+
+    with pytest.raises(SchoolsDataError):
+        _ = fetcher.fetch_schools_page(2)
+
+
+def store_pages(cache_dir: Path, pages: range, data: APIResponse) -> None:
+    cache = PageCache(cache_dir)
+    for page in pages:
+        _ = cache.store(page, data, fetch_date=date(2025, 4, 1))
+
+
+def test_shards_store_pages_in_one_cache(tmp_path: Path, recorded_page: APIResponse):
+    shards = [range(first, first + 25) for first in range(1, 101, 25)]
+    with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        for result in [
+            executor.submit(store_pages, tmp_path, pages, recorded_page)
+            for pages in shards
+        ]:
+            result.result()
+
+    cache = PageCache(tmp_path)
+    assert all(
+        cache.load(page, "2025-04-01") == recorded_page for page in range(1, 101)
+    )
+    assert not list(tmp_path.rglob("*.tmp"))
@@ -0,0 +1,178 @@
+import copy
+from datetime import date
+from pathlib import Path
+from typing import cast
+
+import pytest
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.models.schools import Szkola
+from app.models.sync import UsunietaSzkola, WersjaDanych
+from data_import.api.checkpoint import CheckpointFile
+from data_import.api.db.decomposer import Decomposer
+from data_import.api.db.exceptions import SchoolProcessingError
+from data_import.api.fetcher import ReplayFetcher
+from data_import.api.models import SzkolaAPIResponse
+from data_import.api.page_cache import PageCache
+from data_import.api.pipeline import ImportPipeline
+from data_import.api.types import APIResponse, SchoolDict
+from data_import.core.config import APISettings
+
+
+def test_pipeline_persists_validated_schools(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, recorded_page: APIResponse
+):
+    members = cast(list[SchoolDict], recorded_page["hydra:member"])
+    invalid_school = copy.deepcopy(members[0])
+    del invalid_school["regon"]
+    members.append(invalid_school)
+    cache = PageCache(tmp_path)
+    _ = cache.store(1, recorded_page, fetch_date=date(2025, 4, 1))
+
+    persisted: list[SzkolaAPIResponse] = []
+
+    def decompose_schools(
+        _: Decomposer, schools: list[SzkolaAPIResponse], **_kwargs: object
+    ) -> list[SchoolProcessingError]:
+        persisted.extend(schools)
+        return []
+
+    monkeypatch.setattr(Decomposer, "decompose_schools", decompose_schools)
+    monkeypatch.setattr(Decomposer, "warm_up_caches", lambda _: None)
+
+    pipeline = ImportPipeline(ReplayFetcher(cache))
+    assert pipeline.run()
+
+    assert [school.numer_rspo for school in persisted] == [2045, 21305, 31577, 40123]
+    assert pipeline.total_processed == 4
+    assert pipeline.metrics["fetch"].schools == 5
+    assert pipeline.metrics["validate"].schools == 5
+    assert pipeline.metrics["persist"].schools == 4
+
+
+def test_pipeline_resumes_from_checkpoint(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, recorded_page: APIResponse
+):
+    view = cast(dict[str, str], recorded_page["hydra:view"])
+    cache = PageCache(tmp_path / "pages")
+    for number in (1, 2):
+        view["hydra:next"] = f"/api/placowki/?page={number + 1}"
+        view["hydra:last"] = "/api/placowki/?page=3"
+        _ = cache.store(number, recorded_page, fetch_date=date(2025, 4, 1))
+
+    persisted: list[SzkolaAPIResponse] = []
+
+    def decompose_schools(
+        _: Decomposer, schools: list[SzkolaAPIResponse], **_kwargs: object
+    ) -> list[SchoolProcessingError]:
+        persisted.extend(schools)
+        return []
+
+    fetch_segment = ReplayFetcher.fetch_schools_segment
+    monkeypatch.setattr(
+        ReplayFetcher,
+        "fetch_schools_segment",
+        lambda fetcher, start_page: fetch_segment(fetcher, start_page, max_schools=4),  # pyright: ignore[reportUnknownLambdaType, reportUnknownArgumentType]
+    )
+    monkeypatch.setattr(Decomposer, "decompose_schools", decompose_schools)
+    monkeypatch.setattr(Decomposer, "warm_up_caches", lambda _: None)
+    checkpoint_file = CheckpointFile(tmp_path / "checkpoint.json")
+
+    # page 3 is missing, so the import stops after two segments
+    pipeline = ImportPipeline(ReplayFetcher(cache), checkpoint_file=checkpoint_file)
+    assert not pipeline.run()
+    checkpoint = checkpoint_file.load()
+    assert checkpoint is not None
+    assert (checkpoint.next_page, checkpoint.segment) == (3, 3)
+    assert checkpoint.total_processed == 8
+
+    del view["hydra:next"]
+    _ = cache.store(3, recorded_page, fetch_date=date(2025, 4, 1))
+    persisted.clear()
+    pipeline = ImportPipeline(ReplayFetcher(cache), checkpoint_file=checkpoint_file)
+    pipeline.restore(checkpoint)
+    assert pipeline.run()
+
+    assert len(persisted) == 4  # only page 3 was imported again
+    assert pipeline.total_processed == 12
+    assert checkpoint_file.load() is None
+
+
+def test_pipeline_stops_when_validation_fails(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, recorded_page: APIResponse
+):
+    cache = PageCache(tmp_path)
+    _ = cache.store(1, recorded_page, fetch_date=date(2025, 4, 1))
+
+    def validate_schools_data(_: list[SchoolDict]) -> None:
+        raise RuntimeError("validation crashed")
+
+    monkeypatch.setattr(
+        Decomposer, "validate_schools_data", staticmethod(validate_schools_data)
+    )
+    monkeypatch.setattr(Decomposer, "warm_up_caches", lambda _: None)
+
+    pipeline = ImportPipeline(ReplayFetcher(cache))
+    assert not pipeline.run()  # returns instead of hanging on the full queues
+    assert (pipeline.failed_segment, pipeline.failed_page) == (1, 1)
+
+
+def test_streaming_pipeline_passes_small_batches(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, recorded_page: APIResponse
+):
+    cache = PageCache(tmp_path)
+    _ = cache.store(1, recorded_page, fetch_date=date(2025, 4, 1))
+
+    batches: list[list[int]] = []
+
+    def decompose_schools(
+        _: Decomposer, schools: list[SzkolaAPIResponse], **_kwargs: object
+    ) -> list[SchoolProcessingError]:
+        batches.append([school.numer_rspo for school in schools])
+        return []
+
+    monkeypatch.setattr(Decomposer, "decompose_schools", decompose_schools)
+    monkeypatch.setattr(Decomposer, "warm_up_caches", lambda _: None)
+    monkeypatch.setattr(APISettings, "STREAM_BATCH_SIZE", 3)
+
+    pipeline = ImportPipeline(ReplayFetcher(cache), streaming=True)
+    assert pipeline.run()
+    assert batches == [[2045, 21305, 31577], [40123]]
+    assert pipeline.total_processed == 4
+
+
+def test_full_import_deletes_schools_missing_from_rspo(
+    engine: Engine,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    recorded_page: APIResponse,
+    recorded_schools: list[SzkolaAPIResponse],
+):
+    removed = recorded_schools[0]
+    removed.numer_rspo, removed.regon = 99999, "999999999"
+    with Decomposer(engine=engine) as decomposer:
+        assert decomposer.decompose_schools([removed]) == []
+
+    cache = PageCache(tmp_path)
+    _ = cache.store(1, recorded_page, fetch_date=date(2025, 4, 1))
+    monkeypatch.setattr(APISettings, "STREAM_BATCH_SIZE", 2)
+    monkeypatch.setattr(APISettings, "MAX_DELETED_SHARE", 0.5)
+    pipeline = ImportPipeline(
+        ReplayFetcher(cache), streaming=True, delete_missing=True, engine=engine
+    )
+    assert pipeline.run()
+
+    assert pipeline.deleted == 1
+    with Session(engine) as session:
+        schools = session.exec(select(Szkola)).all()
+        [tombstone] = session.exec(select(UsunietaSzkola)).all()
+        versions = session.exec(select(WersjaDanych)).all()
+    rspo_numbers = sorted(school.numer_rspo for school in schools)
+    assert rspo_numbers == [2045, 21305, 31577, 40123]
+    assert tombstone.numer_rspo == 99999
+    # two segments of the run are stamped with one version, which also deleted the school
+    assert len(versions) == 2
+    run_version = versions[1].id
+    assert {school.wersja for school in schools} == {tombstone.wersja} == {run_version}
+    assert versions[1].zakonczono is not None
@@ -0,0 +1,128 @@
+from collections.abc import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine, select
+
+import main
+from app.core.database import add_missing_columns, get_session
+from app.models.locations import Gmina, Miejscowosc, Powiat, Wojewodztwo
+from app.models.schools import (
+    KategoriaUczniow,
+    StatusPublicznoprawny,
+    Szkola,
+    TypSzkoly,
+)
+from app.models.sync import UsunietaSzkola, WersjaDanych, utc_now
+from data_import.utils.db.session import DatabaseManagerBase
+
+
+def make_school(rspo: int, locality: Miejscowosc, version: int, created: int) -> Szkola:
+    return Szkola(
+        numer_rspo=rspo,
+        nazwa=f"Szkoła {rspo}",
+        regon=str(rspo),
+        kod_pocztowy="00-001",
+        geolokalizacja_latitude=52.0,
+        geolokalizacja_longitude=21.0,
+        typ=TypSzkoly(nazwa=f"Typ {rspo}"),
+        status_publicznoprawny=StatusPublicznoprawny(nazwa=f"Status {rspo}"),
+        kategoria_uczniow=KategoriaUczniow(nazwa=f"Kategoria {rspo}"),
+        miejscowosc=locality,
+        wersja=version,
+        wersja_utworzenia=created,
+    )
+
+
+@pytest.fixture
+def session(engine: Engine) -> Iterator[Session]:
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client(session: Session) -> Iterator[TestClient]:
+    main.app.dependency_overrides[get_session] = lambda: session
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+def test_school_changes_since_version(
+    engine: Engine, session: Session, client: TestClient
+):
+    voivodeship = Wojewodztwo(nazwa="mazowieckie", teryt="14")
+    county = Powiat(nazwa="Warszawa", teryt="1465", wojewodztwo=voivodeship)
+    borough = Gmina(nazwa="Warszawa", teryt="146501", powiat=county)
+    locality = Miejscowosc(nazwa="Warszawa", teryt="0918123", gmina=borough)
+    session.add_all(
+        [
+            WersjaDanych(id=1, zrodlo="decomposer", zakonczono=None),
+            WersjaDanych(id=2, zrodlo="scorer", zakonczono=None),
+            make_school(1, locality, version=1, created=1),
+            make_school(2, locality, version=2, created=1),
+            make_school(3, locality, version=2, created=2),
+            UsunietaSzkola(szkola_id=100, numer_rspo=100, wersja=2),
+        ]
+    )
+    session.commit()
+
+    response = client.get("/schools/changes", params={"since": 1})
+    assert response.status_code == 200
+    changes = response.json()
+    # both versions are unfinished, so the client must ask from version 0 again
+    assert changes["wersja"] == 0
+    assert [s["numer_rspo"] for s in changes["dodane"]] == [3]
+    assert [s["numer_rspo"] for s in changes["zmienione"]] == [2]
+    assert changes["usuniete"] == [100]
+
+    for version in session.exec(select(WersjaDanych)).all():
+        version.zakonczono = version.utworzono
+        session.add(version)
+    session.commit()
+
+    changes = client.get("/schools/changes", params={"since": 2}).json()
+    assert changes == {"wersja": 2, "dodane": [], "zmienione": [], "usuniete": []}
+
+    # a running import holds back newer versions however long it takes
+    session.add_all(
+        [
+            WersjaDanych(id=3, zrodlo="decomposer"),
+            WersjaDanych(id=4, zrodlo="scorer", zakonczono=utc_now()),
+        ]
+    )
+    session.commit()
+    assert client.get("/schools/changes", params={"since": 2}).json()["wersja"] == 2
+
+    # until the import is killed and the next one closes its version on startup
+    assert DatabaseManagerBase.close_abandoned_dataset_versions(engine) == 1
+    assert DatabaseManagerBase.close_abandoned_dataset_versions(engine) == 0
+    assert client.get("/schools/changes", params={"since": 2}).json()["wersja"] == 4
+
+
+def test_school_changes_rejects_negative_version(client: TestClient):
+    response = client.get("/schools/changes", params={"since": -1})
+    assert response.status_code == 422
+
+
+def test_version_columns_are_added_to_an_existing_database():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as connection:
+        _ = connection.execute(
+            text("CREATE TABLE szkola (id INTEGER PRIMARY KEY, nazwa VARCHAR)")
+        )
+        _ = connection.execute(text("INSERT INTO szkola (id, nazwa) VALUES (1, 'A')"))
+
+    add_missing_columns(engine)
+    add_missing_columns(engine)  # nothing to add the second time
+
+    with engine.connect() as connection:
+        row = connection.execute(
+            text(
+                "SELECT wersja, wersja_utworzenia, zaktualizowano, hash_danych FROM szkola"
+            )
+        ).one()
+        indexes = {index["name"] for index in inspect(connection).get_indexes("szkola")}
+    assert tuple(row) == (0, 0, None, None)
+    assert {"ix_szkola_wersja", "ix_szkola_wersja_utworzenia"} <= indexes
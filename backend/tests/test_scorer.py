@@ -0,0 +1,108 @@
+import logging
+
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, select
+
+from app.models.exam_results import Przedmiot, WynikE8
+from app.models.schools import Szkola
+from data_import.core.config import ScoreType
+from data_import.score.scorer import Scorer
+
+
+def add_results(engine: Engine) -> None:
+    with Session(engine) as session:
+        for rspo in (1, 2, 3):
+            session.add(
+                Szkola(
+                    id=rspo,
+                    numer_rspo=rspo,
+                    nazwa=f"Szkoła {rspo}",
+                    regon=str(rspo),
+                    kod_pocztowy="00-001",
+                    geolokalizacja_latitude=52.0,
+                    geolokalizacja_longitude=21.0,
+                )
+            )
+        for subject_id, name in enumerate(ScoreType.E8.subject_weights_map, start=1):
+            session.add(Przedmiot(id=subject_id, nazwa=name))
+        session.add(Przedmiot(id=4, nazwa="historia"))  # not weighted
+
+        results = [
+            # school, subject, year, students, median, average
+            (1, 1, 2023, 20, 60.0, 55.0),
+            (1, 1, 2024, 30, None, 70.0),  # no median, the average is used
+            (1, 2, 2024, 10, 40.0, 45.0),
+            (1, 3, 2024, 10, 80.0, 75.0),
+            (1, 4, 2024, 10, 100.0, 100.0),
+            (2, 2, 2024, 5, 50.0, 50.0),  # other subjects are missing
+            (3, 1, 2024, 0, 50.0, 50.0),  # no students
+        ]
+        for school_id, subject_id, year, students, median, average in results:
+            session.add(
+                WynikE8(
+                    szkola_id=school_id,
+                    przedmiot_id=subject_id,
+                    rok=year,
+                    liczba_zdajacych=students,
+                    mediana=median,
+                    wynik_sredni=average,
+                )
+            )
+        session.commit()
+
+
+def scores(engine: Engine) -> dict[int, tuple[float, int]]:
+    with Session(engine) as session:
+        schools = session.exec(select(Szkola)).all()
+        return {school.numer_rspo: (school.score, school.wersja) for school in schools}
+
+
+def score(engine: Engine) -> None:
+    with Scorer(ScoreType.E8, engine=engine) as scorer:
+        scorer.calculate_scores()
+
+
+def test_scores_are_weighted_means_of_subjects(
+    engine: Engine, caplog: pytest.LogCaptureFixture
+):
+    add_results(engine)
+    initial = scores(engine)
+    caplog.set_level(logging.INFO)
+    score(engine)
+    scored = scores(engine)
+
+    polish = (60.0 * 20 + 70.0 * 30) / 50
+    assert scored[1][0] == pytest.approx(polish * 0.3 + 40.0 * 0.4 + 80.0 * 0.3)
+    assert scored[2][0] == pytest.approx(50.0 * 0.4)
+    assert scored[3] == initial[3]  # the score is still 0, the version is kept
+    for rspo in (1, 2):
+        assert scored[rspo][1] > initial[rspo][1]  # a new dataset version
+    assert "Scores updated for 2 schools (1 unchanged)" in caplog.text
+
+    caplog.clear()
+    score(engine)  # nothing changed, versions are kept
+    assert scores(engine) == scored
+    assert "Scores updated for 0 schools (3 unchanged)" in caplog.text
+
+
+def test_missing_school_rolls_back_the_scores(engine: Engine):
+    add_results(engine)
+    initial = scores(engine)
+    with Scorer(ScoreType.E8, engine=engine) as scorer:
+        with pytest.raises(RuntimeError, match="expected 2"):
+            scorer._write_scores({1: 50.0, 99: 50.0})  # pyright: ignore[reportPrivateUsage]
+    assert scores(engine) == initial
+
+
+def test_scores_are_written_with_update_from_values():
+    scorer = Scorer(ScoreType.E8)
+    scorer._dataset_version = 7  # pyright: ignore[reportPrivateUsage]
+    statement = scorer._update_statement([(1, 60.0), (2, 20.0)], now=None)  # pyright: ignore[reportPrivateUsage, reportArgumentType]
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "UPDATE szkola SET score=nowe_wyniki.score" in sql
+    assert "FROM (VALUES" in sql
+    assert "AS nowe_wyniki (id, score)" in sql
+    assert "WHERE szkola.id = nowe_wyniki.id" in sql
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import Engine
+from sqlmodel import Session, col, select
+
+from app.models.locations import Wojewodztwo
+from data_import.api.db.decomposer import Decomposer
+from data_import.api.sharding import Shard, split_pages
+from data_import.main import parse_args
+
+
+def test_pages_are_split_into_contiguous_shards():
+    assert split_pages(1, 10, 3) == [
+        Shard(1, 1, 4),
+        Shard(2, 5, 8),
+        Shard(3, 9, 10),
+    ]
+    assert split_pages(1, 2, 4) == [Shard(1, 1, 1), Shard(2, 2, 2)]
+    # without hydra:last a single shard imports all pages, not only the first one
+    assert split_pages(3, None, 4) == [Shard(1, 3, None)]
+
+
+@pytest.mark.parametrize("flag", ["--resume", "--fresh", "--stream"])
+def test_single_process_flags_are_rejected_with_shards(flag: str):
+    _ = parse_args([flag])
+    with pytest.raises(SystemExit):
+        _ = parse_args(["--shards", "2", flag])
+
+
+def test_lookup_entity_created_by_another_shard_is_reused(engine: Engine):
+    with Session(engine) as session:
+        session.add(Wojewodztwo(nazwa="MAZOWIECKIE", teryt="14"))
+        session.commit()
+
+    decomposer = Decomposer(engine=engine)
+    # the other shard's entity is not cached, the insert conflicts with it
+    entity_id = decomposer._create_lookup_entity(  # pyright: ignore[reportPrivateUsage]
+        Wojewodztwo, col(Wojewodztwo.teryt), "14", nazwa="MAZOWIECKIE", teryt="14"
+    )
+
+    with Session(engine) as session:
+        assert session.exec(select(col(Wojewodztwo.id))).all() == [entity_id]
+    assert decomposer.lookup_cache.get(Wojewodztwo, "14") == entity_id
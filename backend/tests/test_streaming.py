@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+from data_import.api.streaming import HydraStream
+from data_import.api.types import APIResponse
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 256, 1 << 20])
+def test_members_are_decoded_from_any_chunks(
+    chunk_size: int, recorded_page: APIResponse
+):
+    # multi-byte characters of Polish names are split between chunks too
+    raw = json.dumps(recorded_page, ensure_ascii=False, indent=2).encode()
+    chunks = [raw[i : i + chunk_size] for i in range(0, len(raw), chunk_size)]
+
+    stream = HydraStream(chunks)
+    assert list(stream) == recorded_page["hydra:member"]
+    assert stream.metadata["hydra:view"] == recorded_page["hydra:view"]
+    assert stream.metadata["hydra:member"] == []
+
+
+def test_truncated_page_is_an_error(recorded_page_bytes: bytes):
+    with pytest.raises(ValueError):
+        _ = list(HydraStream([recorded_page_bytes[: len(recorded_page_bytes) // 2]]))
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import Engine
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, select
+
+from app.models.exam_results import Przedmiot, WynikE8
+from app.models.schools import Szkola
+from data_import.core.config import ExamType
+from data_import.excel.db.school_ids import SchoolIdMap
+from data_import.excel.db.table_splitter import TableSplitter
+
+RSPO = ("Unnamed: 0_level_0", "RSPO")
+
+
+def e8_sheet() -> pd.DataFrame:
+    """Parsed E8 sheet, as returned by ExcelReader"""
+    columns = pd.MultiIndex.from_tuples(  # pyright: ignore[reportUnknownMemberType]
+        [
+            RSPO,
+            ("matematyka", "liczba zdających"),
+            ("matematyka", "wynik średni (%)"),
+            ("matematyka", "mediana (%)"),
+            ("język polski", "liczba zdających"),
+            ("język polski", "wynik średni (%)"),
+            ("język polski", "modalna (%)"),
+        ]
+    )
+    rows = [
+        [1, 30, 55.5, 60.0, 31, 70.0, 75.0],
+        [2, 0, 40.0, 40.0, 12, None, None],  # no students, no score
+        [3, 10, 50.0, 50.0, 10, 50.0, 50.0],  # school not in the database
+        [None, 10, 50.0, 50.0, 10, 50.0, 50.0],  # no RSPO number
+        [4, 8, "-", 20.0, 8.5, 60.0, 60.0],  # values which are not numbers
+    ]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def add_schools(engine: Engine, rspo_numbers: list[int]) -> None:
+    with Session(engine) as session:
+        for rspo in rspo_numbers:
+            session.add(
+                Szkola(
+                    numer_rspo=rspo,
+                    nazwa=f"Szkoła {rspo}",
+                    regon=str(rspo),
+                    kod_pocztowy="00-001",
+                    geolokalizacja_latitude=52.0,
+                    geolokalizacja_longitude=21.0,
+                )
+            )
+        session.commit()
+
+
+def stored_results(engine: Engine) -> set[tuple[int, str, int, float | None]]:
+    with Session(engine) as session:
+        statement = (
+            select(Szkola.numer_rspo, Przedmiot.nazwa, WynikE8)
+            .join(Szkola, WynikE8.szkola_id == Szkola.id)  # pyright: ignore[reportArgumentType]
+            .join(Przedmiot, WynikE8.przedmiot_id == Przedmiot.id)  # pyright: ignore[reportArgumentType]
+        )
+        return {
+            (rspo, subject, result.liczba_zdajacych, result.wynik_sredni)
+            for rspo, subject, result in session.exec(statement).all()
+        }
+
+
+def split(engine: Engine, exam_data: pd.DataFrame | None = None) -> TableSplitter:
+    """Split a whole parsed sheet, given as a single chunk"""
+    with TableSplitter.for_chunks(ExamType.E8, 2024, engine=engine) as splitter:
+        assert splitter.split_exam_chunks(
+            [e8_sheet() if exam_data is None else exam_data]
+        )
+    return splitter
+
+
+def test_bulk_split_skips_invalid_results(engine: Engine):
+    add_schools(engine, [1, 2, 4])
+    splitter = split(engine)
+
+    # RSPO 2 has no students in matematyka and no score in jezyk_polski
+    assert stored_results(engine) == {
+        (1, "matematyka", 30, 55.5),
+        (1, "jezyk_polski", 31, 70.0),
+    }
+    assert splitter.added_results == 2
+    assert splitter.processed_count == 3
+    assert splitter.skipped_schools == 2  # RSPO 3 and the row without RSPO
+    assert splitter.unknown_schools == 1
+
+
+def test_bulk_split_upserts_imported_results(engine: Engine):
+    add_schools(engine, [1])
+    assert split(engine).added_results == 2
+
+    again = split(engine)
+    assert again.added_results == again.updated_results == 0
+    assert again.unchanged_results == 2
+
+    corrected = e8_sheet()
+    corrected.loc[0, ("matematyka", "wynik średni (%)")] = 56.0
+    splitter = split(engine, exam_data=corrected)
+    assert (splitter.added_results, splitter.updated_results) == (0, 1)
+    assert stored_results(engine) == {
+        (1, "matematyka", 30, 56.0),
+        (1, "jezyk_polski", 31, 70.0),
+    }
+
+
+def test_chunked_split_matches_whole_sheet_split(engine: Engine):
+    add_schools(engine, [1, 2, 4])
+    sheet = e8_sheet()
+    with TableSplitter.for_chunks(ExamType.E8, 2024, engine=engine) as splitter:
+        assert splitter.split_exam_chunks([sheet.head(2), sheet.tail(3)])
+
+    assert stored_results(engine) == {
+        (1, "matematyka", 30, 55.5),
+        (1, "jezyk_polski", 31, 70.0),
+    }
+    assert splitter.rows_count == 5
+    assert splitter.processed_count == 3
+    assert splitter.added_results == 2  # the second chunk has no results to add
+    assert (splitter.updated_results, splitter.unchanged_results) == (0, 0)
+
+    # counts add up over the chunks of a file imported again
+    with TableSplitter.for_chunks(ExamType.E8, 2024, engine=engine) as splitter:
+        assert splitter.split_exam_chunks([sheet.head(1), sheet.tail(4)])
+    assert splitter.added_results == 0
+    assert splitter.updated_results == 0
+    assert splitter.unchanged_results == 2
+
+
+def test_schools_split_between_chunks_are_counted_once(engine: Engine):
+    add_schools(engine, [1])
+    sheet = e8_sheet()
+    # rows of schools 1 and 3 (not in the database) in both chunks
+    sheet = pd.concat([sheet.iloc[[0, 2]], sheet.iloc[[0, 2]]], ignore_index=True)
+    with TableSplitter.for_chunks(ExamType.E8, 2024, engine=engine) as splitter:
+        assert splitter.split_exam_chunks([sheet.head(2), sheet.tail(2)])
+
+    assert splitter.rows_count == 4
+    assert splitter.processed_count == 1
+    assert splitter.unknown_schools == splitter.skipped_schools == 1
+
+
+def test_school_id_map_resolves_whole_columns(caplog: pytest.LogCaptureFixture):
+    school_ids = SchoolIdMap(np.array([30, 10, 20]), np.array([3, 1, 2]))
+
+    ids, found = school_ids.resolve(np.array([20, 5, 30, 40, 20]))
+
+    assert ids[found].tolist() == [2, 3, 2]
+    assert found.tolist() == [True, False, True, False, True]
+    _ = school_ids.resolve(np.array([5, 7]))
+    school_ids.log_unmatched()
+    assert "3 RSPO numbers of exam results have no school" in caplog.text
+    assert "5, 7, 40" in caplog.text
+
+    _, found = SchoolIdMap(np.array([]), np.array([])).resolve(np.array([1]))
+    assert found.tolist() == [False]
+
+
+def test_school_id_map_is_loaded_once_per_run(engine: Engine):
+    add_schools(engine, [1, 2])
+    with Session(engine) as session:
+        school_ids = SchoolIdMap.load(session)
+    add_schools(engine, [4])  # added after loading, so its results are skipped
+
+    with TableSplitter.for_chunks(
+        ExamType.E8, 2024, school_ids, engine=engine
+    ) as splitter:
+        assert splitter.split_exam_chunks([e8_sheet()])
+
+    assert splitter.processed_count == 2
+    assert school_ids.unmatched == {3, 4}
+
+
+def test_inserted_results_are_told_apart_by_xmax_on_postgresql():
+    splitter = TableSplitter(None, ExamType.E8, 2024)
+    statement = splitter._upsert_statement(["liczba_zdajacych"], postgres=True)  # pyright: ignore[reportPrivateUsage]
+
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (szkola_id, przedmiot_id, rok) DO UPDATE" in sql
+    assert sql.endswith("RETURNING xmax = 0")
@@ -0,0 +1,116 @@
+import time
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import pytest
+
+from data_import.api.exceptions import APIOverloadedError, APIRequestError
+from data_import.api.fetcher import SchoolsAPIFetcher
+from data_import.api.throttle import (
+    AdaptiveThrottle,
+    CircuitBreaker,
+    parse_retry_after,
+    shared_time,
+)
+from data_import.core.config import RetrySettings, ThrottleSettings
+
+
+def test_retry_after_is_parsed_from_seconds_and_dates():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_at = datetime.now(UTC) + timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == pytest.approx(
+        30, abs=2
+    )
+
+
+def test_rate_increases_additively_and_decreases_multiplicatively():
+    throttle = AdaptiveThrottle(initial_rate=10, min_rate=1, max_rate=12, increase=1)
+    for _ in range(10):  # a window of 10 requests at 10 requests/s
+        throttle.on_success()
+    assert throttle.rate == pytest.approx(11, abs=0.05)
+    for _ in range(30):
+        throttle.on_success()
+    assert throttle.rate == 12
+
+    assert throttle.on_overload(retry_after=0) == 0
+    assert throttle.rate == 6
+    for _ in range(5):
+        _ = throttle.on_overload(retry_after=0)
+    assert throttle.rate == 1
+
+
+def test_requests_are_paced_by_the_rate():
+    throttle = AdaptiveThrottle(initial_rate=20)
+    start = time.perf_counter()
+    for _ in range(5):
+        throttle.acquire()
+    assert time.perf_counter() - start >= 4 / 20
+
+
+def test_shards_share_the_rate_and_pauses():
+    paused_until, open_until = shared_time(), shared_time()
+    shards = [AdaptiveThrottle.shared_by(4, paused_until) for _ in range(4)]
+    assert sum(throttle.max_rate for throttle in shards) == ThrottleSettings.MAX_RATE
+
+    # an overload response of one shard pauses the others
+    _ = shards[0].on_overload(retry_after=0.2)
+    start = time.perf_counter()
+    shards[1].acquire()
+    assert time.perf_counter() - start >= 0.15
+
+    breakers = [CircuitBreaker(1, cooldown=60, open_until=open_until) for _ in range(2)]
+    breakers[0].record_failure()
+    assert breakers[1].is_open
+    breakers[1].record_failure()  # already open, not opened a second time
+    assert breakers[1].opened == 0
+
+
+def test_breaker_pauses_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=0.2, max_cooldown=0.3)
+    breaker.record_failure()
+    breaker.record_success()  # the count starts again
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+
+    start = time.perf_counter()
+    breaker.wait()
+    assert time.perf_counter() - start >= 0.15
+    breaker.record_failure()  # the first request after the pause failed again
+    assert breaker.opened == 2
+    assert breaker.open_time == pytest.approx(0.2 + 0.3)
+
+
+def test_overload_responses_do_not_use_up_retries(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(RetrySettings, "MAX_RETRIES", 2)
+    fetcher = SchoolsAPIFetcher(concurrency=1)
+    responses: list[int] = [503, 503, 503, 200]
+
+    def request() -> int:
+        status = responses.pop(0)
+        if status != 200:
+            raise APIOverloadedError(status, retry_after=0)
+        return status
+
+    assert fetcher._retrying(request) == 200  # pyright: ignore[reportPrivateUsage]
+    assert fetcher.throttle.overloads == 3
+
+
+def test_endless_overload_responses_give_up_the_request(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ThrottleSettings, "MAX_CONSECUTIVE_OVERLOADS", 3)
+    fetcher = SchoolsAPIFetcher(concurrency=1)
+    calls: list[int] = []
+
+    def request() -> int:
+        calls.append(503)
+        raise APIOverloadedError(503, retry_after=0)
+
+    with pytest.raises(APIRequestError):
+        _ = fetcher._retrying(request)  # pyright: ignore[reportPrivateUsage]
+    assert len(calls) == 3